@@ -0,0 +1,113 @@
+"""SQLite write throughput: default settings + per-row commits vs. WAL pragmas + one bulk UPDATE per cycle
+
+Several writer threads (like the background jobs and request threads) update
+the PnL of their share of the positions table while reader threads keep
+querying it. The baseline commits every row separately with SQLite's
+default journal; the tuned run uses configure_sqlite() and bulk_update().
+
+Run from the repo root:  python benchmarks/bench_sqlite.py [positions] [writers] [seconds]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from src.models.trading import Position
+from src.utils.storage import bulk_update, configure_sqlite
+
+
+def make_engine(path, tuned):
+    # timeout=0.5: ให้เห็น "database is locked" แทนที่จะรอนาน (ค่า default ของ sqlite3 คือ 5 วินาที)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 0.5})
+    if tuned:
+        configure_sqlite(engine)
+    Position.__table__.create(engine)
+    return engine
+
+
+def seed(engine, positions):
+    with Session(engine) as session:
+        session.add_all([
+            Position(symbol=f"C{i}USDT", timeframe="1h", position_type="LONG", entry_price=100.0)
+            for i in range(positions)
+        ])
+        session.commit()
+
+
+def writer(engine, ids, tuned, deadline, stats):
+    with Session(engine) as session:
+        while time.monotonic() < deadline:
+            rows = [{'id': pid, 'current_price': random.uniform(90, 110), 'current_pnl_percent': random.uniform(-10, 10)}
+                    for pid in ids]
+            try:
+                if tuned:
+                    # หนึ่งรอบ = หนึ่ง transaction
+                    bulk_update(session, Position, rows)
+                    session.commit()
+                    stats['commits'] += 1
+                    stats['rows'] += len(rows)
+                else:
+                    for row in rows:
+                        pos = session.get(Position, row['id'])
+                        pos.current_price = row['current_price']
+                        pos.current_pnl_percent = row['current_pnl_percent']
+                        session.commit()
+                        stats['commits'] += 1
+                        stats['rows'] += 1
+            except OperationalError:
+                session.rollback()
+                stats['locked'] += 1
+
+
+def reader(engine, deadline, stats):
+    with Session(engine) as session:
+        while time.monotonic() < deadline:
+            try:
+                session.execute(select(Position).where(Position.status == "ACTIVE")).all()
+                session.rollback()
+                stats['reads'] += 1
+            except OperationalError:
+                session.rollback()
+                stats['read_locked'] += 1
+
+
+def run(tuned, positions, writers, seconds, readers=2):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "bench.db"), tuned)
+        seed(engine, positions)
+        stats = {'commits': 0, 'rows': 0, 'locked': 0, 'reads': 0, 'read_locked': 0}
+        deadline = time.monotonic() + seconds
+        ids = list(range(1, positions + 1))
+        threads = [threading.Thread(target=writer, args=(engine, ids[i::writers], tuned, deadline, stats))
+                   for i in range(writers)]
+        threads += [threading.Thread(target=reader, args=(engine, deadline, stats)) for _ in range(readers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        engine.dispose()
+    return stats
+
+
+def main():
+    positions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    print(f"{positions} positions, {writers} writer threads, 2 reader threads, {seconds:.0f}s per run\n")
+    print(f"{'mode':<28}{'commits/s':>12}{'rows/s':>12}{'reads/s':>10}{'locked':>9}")
+    for label, tuned in (("default + per-row commit", False), ("WAL + bulk UPDATE/cycle", True)):
+        s = run(tuned, positions, writers, seconds)
+        print(f"{label:<28}{s['commits'] / seconds:>12.1f}{s['rows'] / seconds:>12.1f}"
+              f"{s['reads'] / seconds:>10.1f}{s['locked'] + s['read_locked']:>9}")
+
+
+if __name__ == "__main__":
+    main()
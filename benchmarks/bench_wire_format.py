@@ -0,0 +1,76 @@
+"""Bytes on the wire: JSON price_batch vs. compact delta frames (JSON and MessagePack)
+
+Simulates one client watching N symbols for a minute of 4 Hz flushes.
+
+Run from the repo root:  python benchmarks/bench_wire_format.py [symbols]
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.websocket.wire_format import DeltaEncoder, msgpack
+from src.websocket.websocket_server import _candle_payload, _price_payload
+
+
+def simulate(symbols, flushes=240, seed=42):
+    """Yield (prices, candles) for each flush, like ConflatingBroadcaster would"""
+    rng = np.random.default_rng(seed)
+    price = rng.uniform(0.1, 50000, len(symbols))
+    change = rng.uniform(-5, 5, len(symbols))
+    now = datetime(2024, 1, 1)
+    candles = {s: None for s in symbols}
+    for i in range(flushes):
+        now += timedelta(milliseconds=250)
+        price *= 1 + rng.normal(0, 0.0005, len(symbols))
+        change += rng.normal(0, 0.01, len(symbols))
+        candle_ts = int(now.timestamp()) // 60 * 60
+        prices, out_candles = [], []
+        for j, symbol in enumerate(symbols):
+            p = round(float(price[j]), 4)
+            c = candles[symbol]
+            if c is None or c['candle_timestamp'] != candle_ts:
+                c = candles[symbol] = {'open': p, 'high': p, 'low': p, 'candle_timestamp': candle_ts}
+            c['high'], c['low'] = max(c['high'], p), min(c['low'], p)
+            data = {
+                'price': p, 'change_24h': round(float(change[j]), 2), 'timestamp': now.isoformat(),
+                'open': c['open'], 'high': c['high'], 'low': c['low'], 'close': p,
+                'candle_timestamp': candle_ts, 'timeframe': '1m',
+            }
+            prices.append(_price_payload(symbol, data))
+            out_candles.append(_candle_payload(symbol, data))
+        yield prices, out_candles
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    symbols = [f"SYM{i}USDT" for i in range(n)]
+
+    sizes = {'json price_batch': 0, 'compact json': 0, 'compact msgpack': 0}
+    compact, binary = DeltaEncoder('compact'), DeltaEncoder('msgpack')
+    for prices, candles in simulate(symbols):
+        message = {'type': 'price_batch', 'data': {'prices': prices, 'candles': candles}}
+        sizes['json price_batch'] += len(json.dumps(message, separators=(',', ':')))
+
+        frame = compact.frame(prices=prices, candles=candles)
+        sizes['compact json'] += len(json.dumps(frame, separators=(',', ':')))
+
+        if msgpack is not None:
+            frame = binary.frame(prices=prices, candles=candles)
+            sizes['compact msgpack'] += len(binary.encode(frame))
+
+    base = sizes['json price_batch']
+    print(f"{n} symbols, 240 flushes (1 minute at 4 Hz)")
+    for name, size in sizes.items():
+        if size == 0:
+            print(f"  {name:<18} skipped (msgpack not installed)")
+            continue
+        print(f"  {name:<18} {size / 1024:10.1f} KiB   {base / size:5.2f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
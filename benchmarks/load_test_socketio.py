@@ -0,0 +1,134 @@
+"""Socket.IO load test: connection capacity and emit latency against a local server
+
+Opens N simulated dashboards (websocket transport), subscribes each to a
+symbol, then measures round-trip latency of ``latency_ping`` acks.
+
+Run from the repo root:
+    python benchmarks/load_test_socketio.py --clients 1000 --start-server
+    python benchmarks/load_test_socketio.py --url http://127.0.0.1:5000 --clients 200
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return f"p50 {p50:.1f} ms  p95 {p95:.1f} ms  p99 {p99:.1f} ms  max {max(values) * 1000:.1f} ms"
+
+
+class SimulatedClient:
+    def __init__(self, url, symbol):
+        self.url = url
+        self.symbol = symbol
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.updates = 0
+        self.sio.on('price_batch', self._on_update)
+        self.sio.on('rt', self._on_update)
+
+    async def _on_update(self, data):
+        self.updates += 1
+
+    async def connect(self):
+        started = time.perf_counter()
+        await self.sio.connect(self.url, transports=['websocket'], wait_timeout=30)
+        await self.sio.emit('subscribe_symbol', {'symbol': self.symbol})
+        return time.perf_counter() - started
+
+    async def ping(self):
+        started = time.perf_counter()
+        await self.sio.call('latency_ping', {'t': started}, timeout=30)
+        return time.perf_counter() - started
+
+
+async def run(args):
+    clients = [SimulatedClient(args.url, args.symbols[i % len(args.symbols)]) for i in range(args.clients)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def connect(client):
+        async with semaphore:
+            try:
+                return await client.connect()
+            except Exception as e:
+                return e
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(connect(c) for c in clients))
+    connect_wall = time.perf_counter() - started
+    connected = [c for c, r in zip(clients, results) if not isinstance(r, Exception)]
+    connect_times = [r for r in results if not isinstance(r, Exception)]
+    errors = [r for r in results if isinstance(r, Exception)]
+
+    print(f"connected {len(connected)}/{args.clients} in {connect_wall:.1f}s "
+          f"({len(connected) / connect_wall:.0f} conn/s)")
+    print(f"  connect   {percentiles(connect_times)}")
+    if errors:
+        print(f"  first error: {errors[0]!r}")
+
+    rtts = []
+    for _ in range(args.rounds):
+        round_results = await asyncio.gather(*(c.ping() for c in connected), return_exceptions=True)
+        rtts.extend(r for r in round_results if not isinstance(r, Exception))
+        await asyncio.sleep(args.interval)
+    print(f"  ping      {percentiles(rtts)}  ({len(rtts)} acks, {args.rounds} rounds)")
+
+    updates = sum(c.updates for c in connected)
+    print(f"  received  {updates} price events ({updates / max(len(connected), 1):.1f} per client)")
+
+    await asyncio.gather(*(c.sio.disconnect() for c in connected), return_exceptions=True)
+
+
+def wait_for_server(url, proc, timeout=60):
+    import urllib.request
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            urllib.request.urlopen(f"{url}/socket.io/?EIO=4&transport=polling", timeout=1)
+            return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError("server did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5055")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100, help="connects in flight at once")
+    parser.add_argument("--rounds", type=int, default=5, help="ping rounds across all clients")
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--symbols", nargs="+", default=["BTCUSDT", "ETHUSDT", "SOLUSDT"])
+    parser.add_argument("--start-server", action="store_true", help="launch src/serve.py for the test")
+    parser.add_argument("--with-services", action="store_true",
+                        help="with --start-server: also start Binance stream, jobs and Telegram bot")
+    args = parser.parse_args()
+
+    proc = None
+    if args.start_server:
+        port = args.url.rsplit(":", 1)[-1]
+        env = dict(os.environ, PORT=port, START_SERVICES="1" if args.with_services else "0")
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "src", "serve.py")], env=env)
+        wait_for_server(args.url, proc)
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
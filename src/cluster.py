@@ -0,0 +1,84 @@
+"""Run the app as several processes behind one port.
+
+    python src/cluster.py --workers 4 --port 5000
+
+* the IPC broker runs in this (master) process
+* one ingester process owns the Binance stream, background jobs and the
+  Telegram bot, and publishes through the broker
+* N pre-forked web workers (src/serve.py) accept connections from the
+  same listening socket and share Socket.IO rooms/emits via IPCManager
+
+Clients must use the websocket transport only (the dashboard does), since
+HTTP long-polling would need sticky sessions between workers.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import logging
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.websocket.ipc_broker import IPCBroker, parse_broker_url
+
+logger = logging.getLogger(__name__)
+
+SERVE = os.path.join(ROOT, "src", "serve.py")
+
+
+def spawn(role, env, pass_fds=()):
+    env = dict(env, PROCESS_ROLE=role)
+    return subprocess.Popen([sys.executable, SERVE], env=env, pass_fds=pass_fds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process Socket.IO server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", os.cpu_count() or 2)))
+    parser.add_argument("--broker", default=os.getenv("IPC_BROKER_URL", "ipc://127.0.0.1:5600"))
+    parser.add_argument("--no-ingester", action="store_true", help="web workers only (load testing)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    broker = IPCBroker(*parse_broker_url(args.broker))
+    broker.start()
+
+    listener = socket.create_server((args.host, args.port), backlog=2048)
+    listener.set_inheritable(True)
+
+    env = dict(os.environ, IPC_BROKER_URL=args.broker)
+    processes = []
+    if not args.no_ingester:
+        processes.append(spawn("ingester", env))
+    worker_env = dict(env, LISTEN_FD=str(listener.fileno()))
+    if args.no_ingester:
+        worker_env["START_SERVICES"] = "0"
+    for _ in range(args.workers):
+        processes.append(spawn("web", worker_env, pass_fds=(listener.fileno(),)))
+    logger.info(f"Cluster up on {args.host}:{args.port}: {args.workers} web workers, "
+                f"{'no' if args.no_ingester else 'one'} ingester, broker {args.broker}")
+
+    def shutdown(*_):
+        for proc in processes:
+            proc.terminate()
+        for proc in processes:
+            proc.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    while True:
+        for proc in processes:
+            if proc.poll() is not None:
+                logger.error(f"Process {proc.pid} exited with {proc.returncode}, shutting down")
+                shutdown()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import os
 import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from src.utils.startup_profiler import lazy_import, startup_profiler
 import asyncio
 from flask import Flask, send_from_directory
 from flask_cors import CORS
@@ -12,12 +13,14 @@ from src.routes.user import user_bp
 from src.routes.predict import predict_bp
 from src.routes.trading import trading_bp
 from src.routes.alerts import alerts_bp
-from src.models.trading import Position, Alert, SignalHistory
+from src.models.trading import Position, Alert, SignalHistory, ensure_indexes
 from src.tasks.background_tasks import start_background_tasks
 from src.websocket.websocket_server import init_websocket
 from src.utils.binance_websocket import get_binance_ws_client
-import threading
-from src.telegram_bot import build_bot
+from src.utils.offload import start_native_thread
+from src.utils.storage import configure_sqlite
+from src.websocket.market_relay import get_market_relay, socketio_kwargs
+startup_profiler.mark("import app modules")
 
 
 # ไม่จำเป็นต้องมีฟังก์ชันนี้แล้ว เพราะเราจะใช้ asyncio.run ในเธรด
@@ -29,7 +32,10 @@ app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'sta
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
 # Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# threading = dev server (main.py), gevent = production (serve.py)
+ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+# หลาย process: ใช้ message queue (IPC broker) ร่วมกัน ดู src/cluster.py
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, **socketio_kwargs())
 
 # Enable CORS for all routes
 CORS(app)
@@ -44,7 +50,10 @@ app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirnam
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
+    configure_sqlite(db.engine)
     db.create_all() # This will create all tables defined in db.Model subclasses
+    ensure_indexes()
+startup_profiler.mark("app + database setup")
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -64,6 +73,8 @@ def serve(path):
 
 def run_telegram_bot_background():
     try:
+        # telegram/httpx โหลดใน thread ของ bot เอง ไม่ถ่วง startup ของเว็บ
+        build_bot = lazy_import("src.telegram_bot").build_bot
         telegram_app = build_bot(socketio)  # ✅ ชื่อไม่ซ้ำกับ Flask app
         print("[DEBUG] เริ่ม Telegram Bot...")
 
@@ -97,11 +108,20 @@ def subscribe_position(position):
 #     except Exception as e:
 #         print(f"[ERROR] subscribe_existing_positions: {e}")
 
-if __name__ == '__main__':
+def start_services():
+    """Start the services of this process's role (all / ingester / web)"""
     with app.app_context():
         db.create_all()
+        ensure_indexes()
 
     init_websocket(socketio)
+    startup_profiler.mark("websocket handlers")
+    relay = get_market_relay()
+    if relay and relay.role == "web":
+        # web worker: ราคาและ position มาจาก ingester ผ่าน broker
+        relay.start_web_worker(socketio)
+        return
+
     binance_client = get_binance_ws_client(socketio)
     start_background_tasks(app, socketio)
     # subscribe_existing_positions()  # 🟢 เรียกก่อนรันแอป
@@ -111,11 +131,19 @@ if __name__ == '__main__':
     for symbol in common_symbols:
         binance_client.subscribe_symbol(symbol)
 
-    # ✅ ใช้ threading.Thread เพื่อสั่งรัน async function ใน background อย่างถูกต้อง
-    telegram_thread = threading.Thread(target=run_telegram_bot_background)
-    telegram_thread.daemon = True # ทำให้เธรดนี้หยุดทำงานเมื่อโปรแกรมหลักจบ
-    telegram_thread.start()
+    if relay:
+        # ingester: รับคำขอ subscribe จาก web worker
+        relay.start_ingester(binance_client, socketio)
+
+    # ✅ bot ใช้ asyncio ของตัวเอง ต้องอยู่บน OS thread จริง (แม้รันใต้ gevent)
+    start_native_thread(run_telegram_bot_background)
+    startup_profiler.mark("market services")
+
+if __name__ == '__main__':
+    start_services()
+    startup_profiler.mark_ready()
 
     # เริ่ม Flask + SocketIO
     # *** สำคัญ: ปิด debug และ reloader เพื่อหลีกเลี่ยงปัญหาเรื่อง process spawning ***
-    socketio.run(app, host='0.0.0.0', port=5000, debug=False, use_reloader=False, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    # production ใช้ python src/serve.py (gevent)
+    socketio.run(app, host='0.0.0.0', port=5000, debug=False, use_reloader=False, allow_unsafe_werkzeug=True)
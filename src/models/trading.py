@@ -1,5 +1,5 @@
 from src.models.user import db
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -33,6 +33,14 @@ class Alert(db.Model):
     triggered_at = Column(DateTime, default=datetime.utcnow)
     is_read = Column(Boolean, default=False)
 
+    # ทุก index ลงท้ายด้วย (triggered_at, id) ให้ตรงกับ keyset pagination
+    __table_args__ = (
+        Index('ix_alerts_triggered_at_id', 'triggered_at', 'id'),
+        Index('ix_alerts_position_triggered_at', 'position_id', 'triggered_at', 'id'),
+        Index('ix_alerts_type_triggered_at', 'alert_type', 'triggered_at', 'id'),
+        Index('ix_alerts_is_read_triggered_at', 'is_read', 'triggered_at', 'id'),
+    )
+
     def __repr__(self):
         return f"<Alert {self.alert_type} for Position {self.position_id}>"
 
@@ -46,7 +54,39 @@ class SignalHistory(db.Model):
     accuracy = Column(Float)
     predicted_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # ใช้ทั้งหาสัญญาณก่อนหน้า (ตรวจ reversal) และ /api/signals ที่กรองตามคู่เหรียญ
+        Index('ix_signal_history_symbol_tf_predicted_at', 'symbol', 'timeframe', 'predicted_at', 'id'),
+        Index('ix_signal_history_predicted_at_id', 'predicted_at', 'id'),
+    )
+
     def __repr__(self):
         return f"<Signal {self.symbol}-{self.timeframe}-{self.prediction}>"
 
 
+
+class TelegramOutbox(db.Model):
+    __tablename__ = 'telegram_outbox'
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(String(64), nullable=False)
+    text = Column(String(4096), nullable=False)
+    status = Column(String(10), default='PENDING', index=True)  # PENDING, SENT, FAILED
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(String(255))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<TelegramOutbox {self.id} {self.status} to {self.chat_id}>"
+
+
+def ensure_indexes():
+    """Create indexes declared on the models that are missing from existing tables.
+
+    ``create_all`` only creates indexes together with new tables, so
+    databases created before an index was added need this once.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
@@ -1,37 +1,44 @@
-import os
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from src.app import db, app
 from src.models.user import User
 
-from src.models.trading import Alert
+from src.models.trading import Alert, TelegramOutbox
+from src.utils import telegram_outbox
+from src.utils.telegram_outbox import enqueue_telegram_message
+from src.utils.pagination import keyset_page, page_size
 from datetime import datetime
-from dotenv import load_dotenv
-import requests
+from sqlalchemy import func
 
 alerts_bp = Blueprint("alerts", __name__)
 
-load_dotenv()
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
-def send_telegram_alert(message):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": message,
-        "parse_mode": "HTML"
-    }
-    try:
-        requests.post(url, json=payload, timeout=5)
-    except Exception as e:
-        print("Telegram send error:", e)
+def wake_telegram_sender():
+    """ให้ sender เบื้องหลังส่งข้อความที่เพิ่ง commit ลง outbox ทันที (ไม่บล็อก request)"""
+    if telegram_outbox.telegram_sender is not None:
+        telegram_outbox.telegram_sender.wake()
 
 @alerts_bp.route("/alerts", methods=["GET"])
 @cross_origin()
 def get_all_alerts():
+    """
+    ตัวอย่าง: /api/alerts?alert_type=REVERSAL&position_id=3&is_read=false&limit=50&cursor=...
+    หน้าถัดไปส่ง cursor จาก header X-Next-Cursor (ไม่มี header = หน้าสุดท้าย)
+    """
     try:
-        alerts = Alert.query.order_by(Alert.triggered_at.desc()).limit(50).all()
+        query = Alert.query
+        alert_type = request.args.get("alert_type")
+        if alert_type:
+            query = query.filter(Alert.alert_type == alert_type.upper())
+        position_id = request.args.get("position_id")
+        if position_id:
+            query = query.filter(Alert.position_id == int(position_id))
+        is_read = request.args.get("is_read")
+        if is_read:
+            query = query.filter(Alert.is_read == (is_read.lower() in ("1", "true", "yes")))
+
+        alerts, next_cursor = keyset_page(
+            query, (Alert.triggered_at, Alert.id), request.args.get("cursor"), page_size(request.args.get("limit"))
+        )
         output = []
         for alert in alerts:
             output.append({
@@ -42,8 +49,13 @@ def get_all_alerts():
                 "triggered_at": alert.triggered_at,
                 "is_read": alert.is_read
             })
-        return jsonify(output), 200
+        response = jsonify(output)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -110,13 +122,26 @@ def create_alert():
             is_read=False
         )
         db.session.add(alert)
+        # ข้อความ Telegram ลง outbox ใน transaction เดียวกับ alert: มี alert ก็ต้องมีข้อความ
+        queued = enqueue_telegram_message(f"🔔 แจ้งเตือนใหม่: {alert.message}")
         db.session.commit()
-
-        # ส่งข้อความไป Telegram
-        send_telegram_alert(f"🔔 แจ้งเตือนใหม่: {alert.message}")
+        if queued:
+            wake_telegram_sender()
 
         return jsonify({"success": True, "alert_id": alert.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+
+@alerts_bp.route("/alerts/outbox", methods=["GET"])
+@cross_origin()
+def telegram_outbox_stats():
+    """จำนวนข้อความใน Telegram outbox แยกตามสถานะ และสถิติของ sender"""
+    counts = dict(db.session.query(TelegramOutbox.status, func.count(TelegramOutbox.id))
+                  .group_by(TelegramOutbox.status).all())
+    sender = telegram_outbox.telegram_sender
+    return jsonify({
+        "counts": counts,
+        "sender": sender.get_stats() if sender else {"running": False},
+    }), 200
@@ -1,12 +1,22 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-import ccxt
-import pandas as pd
+import time
 from datetime import datetime
-from xgboost import XGBClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, insert, and_
+from src.app import db as app_db
 from src.models.trading import Position, Alert, SignalHistory
+from src.utils.candle_store import candle_store, timeframe_to_ms
+from src.utils.exchange_manager import get_exchange as get_shared_exchange
+from src.utils.mock_exchange import MockExchange
+from src.utils.model_registry import model_registry, fit_model, get_training_pool
+from src.utils.offload import run_blocking
+from src.utils.feature_engine import build_training_set
+from src.utils.symbols import to_ccxt_symbol
+from src.utils.risk_engine import risk_engine
+from src.utils.single_flight import CandleAlignedCache, SingleFlight
+from src.utils.pagination import keyset_page, page_size
+from src.utils.startup_profiler import lazy_import
 
 import numpy as np
 
@@ -85,161 +95,312 @@ db = MockDB()
 # Alert = MockAlert
 # Position = MockPosition
 
-# Mocking get_exchange since src directory is not provided
 def get_exchange(use_mock=False):
-    print("[MOCK] Using mock exchange")
-    return ccxt.binance()
+    """Shared exchange instance of the process (MockExchange when use_mock)"""
+    if use_mock:
+        return MockExchange()
+    return get_shared_exchange()
 
 predict_bp = Blueprint("predict", __name__)
 
+# คำขอคู่เดียวกันพร้อมกันคำนวณครั้งเดียว และใช้ผลซ้ำจนกว่าแท่งของ timeframe นั้นจะปิด
+predict_flight = SingleFlight()
+predict_cache = CandleAlignedCache()
+
+
 @predict_bp.route("/predict", methods=["POST"])
 @cross_origin()
 def predict_price():
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "body ต้องเป็น JSON object"}), 400
         symbol = data.get("symbol", "DOGE/USDT")
         timeframe = data.get("timeframe", "1h")
         
         # Validate inputs
         if not symbol or not timeframe:
             return jsonify({"error": "Symbol และ timeframe จำเป็นต้องระบุ"}), 400
-        
-        # Initialize exchange with fallback to mock
-        exchange = get_exchange(use_mock=False)  # Try real first, fallback to mock
-        
-        # Fetch historical data
+        if not isinstance(symbol, str) or not isinstance(timeframe, str):
+            return jsonify({"error": "symbol และ timeframe ต้องเป็นข้อความ"}), 400
         try:
-            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=720)
-        except ccxt.NetworkError as e:
-            return jsonify({"error": f"เกิดข้อผิดพลาดในการเชื่อมต่อ: {str(e)}"}), 500
-        except ccxt.ExchangeError as e:
-            return jsonify({"error": f"ไม่สามารถดึงข้อมูลสำหรับ {symbol} ได้: {str(e)}"}), 400
-        except Exception as e:
-            return jsonify({"error": f"เกิดข้อผิดพลาดในการดึงข้อมูล: {str(e)}"}), 500
-        
-        if len(ohlcv) < 50:
-            return jsonify({"error": "ข้อมูลไม่เพียงพอสำหรับการทำนาย"}), 400
-        
-        # Create DataFrame
-        df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"])
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-        
-        # Create features
-        df["return"] = df["close"].pct_change()
-        df["ma"] = df["close"].rolling(12).mean()
-        df["std"] = df["close"].rolling(12).std()
-        df["vol_avg"] = df["volume"].rolling(12).mean()
-        
-        # Create target (predict future price direction)
-        future_periods = 24 if timeframe == "1h" else (6 if timeframe == "4h" else 1)
-        df["future_close"] = df["close"].shift(-future_periods)
-        df["target"] = (df["future_close"] > df["close"]).astype(int)
-        
-        # Remove NaN values
-        df.dropna(inplace=True)
-        
-        if len(df) < 30:
-            return jsonify({"error": "ข้อมูลไม่เพียงพอหลังจากการประมวลผล"}), 400
-        
-        # Prepare features and target
-        features = ["close", "return", "ma", "std", "vol_avg"]
-        X = df[features]
-        y = df["target"]
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(X, y, shuffle=False, test_size=0.2)
-        
-        # Train model
-        model = XGBClassifier(random_state=42, n_estimators=100)
-        model.fit(X_train, y_train)
-        
-        # Calculate accuracy
-        y_pred = model.predict(X_test)
-        accuracy = accuracy_score(y_test, y_pred)
-        
-        # Make prediction for current data
-        current_data = df[features].iloc[-1:].values
-        prediction = model.predict(current_data)[0]
-        
-        # Get latest price
-        # latest_price = float(df["close"].iloc[-1])
-        ticker = exchange.fetch_ticker(symbol)
-        latest_price = float(ticker["last"])
-
-
-        # Save signal history
-        new_signal = SignalHistory(
-            symbol=symbol,
-            timeframe=timeframe,
-            prediction=int(prediction),
-            price=latest_price,
-            accuracy=float(accuracy),
-            predicted_at=datetime.utcnow()
+            timeframe_to_ms(timeframe)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # BTCUSDT, btc/usdt และ BTC/USDT ใช้ cache และการคำนวณเดียวกัน
+        symbol = to_ccxt_symbol(symbol)
+        key = (symbol, timeframe)
+        entry = predict_cache.get(key)
+        hit, shared = entry is not None, False
+        if entry is None:
+            def compute():
+                payload, status = _compute_prediction(symbol, timeframe)
+                if status != 200:
+                    return None, (payload, status)  # ไม่ cache ผลที่ผิดพลาด
+                return predict_cache.put(key, timeframe, payload), None
+
+            (entry, error), shared = predict_flight.do(key, compute)
+            if error:
+                return jsonify(error[0]), error[1]
+
+        payload, cached_at, expires_at = entry
+        return jsonify({
+            **payload,
+            "cache": {
+                "hit": hit,
+                "shared": shared,
+                "cached_at": datetime.fromtimestamp(cached_at).strftime("%Y-%m-%d %H:%M:%S"),
+                "expires_at": datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M:%S"),
+                "ttl": max(0, round(expires_at - time.time(), 1)),
+            },
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"เกิดข้อผิดพลาด: {str(e)}"}), 500
+
+
+def _compute_prediction(symbol, timeframe):
+    """Fetch, train/reuse model, predict and record the signal; returns (payload, status)"""
+    # Initialize exchange with fallback to mock
+    exchange = get_exchange(use_mock=False)  # Try real first, fallback to mock
+    ccxt = lazy_import("ccxt")
+    
+    # Fetch historical data
+    try:
+        # ใช้เฉพาะแท่งที่ปิดแล้ว เพื่อให้ใช้โมเดลซ้ำได้จนกว่าจะปิดแท่งใหม่
+        ohlcv = candle_store.get_closed(symbol, timeframe, limit=720)
+    except ccxt.NetworkError as e:
+        return {"error": f"เกิดข้อผิดพลาดในการเชื่อมต่อ: {str(e)}"}, 500
+    except ccxt.ExchangeError as e:
+        return {"error": f"ไม่สามารถดึงข้อมูลสำหรับ {symbol} ได้: {str(e)}"}, 400
+    except Exception as e:
+        return {"error": f"เกิดข้อผิดพลาดในการดึงข้อมูล: {str(e)}"}, 500
+    
+    if len(ohlcv) < 50:
+        return {"error": "ข้อมูลไม่เพียงพอสำหรับการทำนาย"}, 400
+    
+    # Create features and target (predict future price direction)
+    X, y = build_training_set(ohlcv, timeframe)
+    
+    if len(X) < 30:
+        return {"error": "ข้อมูลไม่เพียงพอหลังจากการประมวลผล"}, 400
+    
+    # Train model (reused until the next candle closes)
+    candle_time = int(ohlcv[-1][0])
+    model, accuracy, _ = model_registry.get_or_train(
+        symbol, timeframe, candle_time, lambda: run_blocking(fit_model, X, y)
+    )
+    
+    # Make prediction for current data
+    current_data = X[-1:]
+    prediction = model.predict(current_data)[0]
+    
+    # Get latest price
+    # latest_price = float(df["close"].iloc[-1])
+    ticker = exchange.fetch_ticker(symbol)
+    latest_price = float(ticker["last"])
+
+
+    # Save signal history
+    new_signal = SignalHistory(
+        symbol=symbol,
+        timeframe=timeframe,
+        prediction=int(prediction),
+        price=latest_price,
+        accuracy=float(accuracy),
+        predicted_at=datetime.utcnow()
+    )
+    db.session.add(new_signal)
+    db.session.commit()
+
+    # Check for signal reversal
+    last_signal = SignalHistory.query.filter_by(symbol=symbol, timeframe=timeframe)\
+                             .order_by(SignalHistory.predicted_at.desc(), SignalHistory.id.desc()).offset(1).first()
+
+    if last_signal and last_signal.prediction != prediction:
+        # Signal reversal detected
+        alert_message = f"สัญญาณเปลี่ยน! {symbol} {timeframe}: จาก {'LONG' if last_signal.prediction == 1 else 'SHORT'} เป็น {'LONG' if prediction == 1 else 'SHORT'}"
+        new_alert = Alert(
+            position_id=None, # This alert is not tied to a specific position yet
+            alert_type="REVERSAL",
+            message=alert_message,
+            triggered_at=datetime.utcnow()
         )
-        db.session.add(new_signal)
+        db.session.add(new_alert)
         db.session.commit()
 
-        # Check for signal reversal
-        last_signal = SignalHistory.query.filter_by(symbol=symbol, timeframe=timeframe)\
-                                 .order_by(SignalHistory.predicted_at.desc()).offset(1).first()
-
-        if last_signal and last_signal.prediction != prediction:
-            # Signal reversal detected
-            alert_message = f"สัญญาณเปลี่ยน! {symbol} {timeframe}: จาก {'LONG' if last_signal.prediction == 1 else 'SHORT'} เป็น {'LONG' if prediction == 1 else 'SHORT'}"
-            new_alert = Alert(
-                position_id=None, # This alert is not tied to a specific position yet
-                alert_type="REVERSAL",
-                message=alert_message,
-                triggered_at=datetime.utcnow()
-            )
-            db.session.add(new_alert)
-            db.session.commit()
-
-        # Update active positions and check for profit/loss targets
-        active_positions = Position.query.filter_by(symbol=symbol, timeframe=timeframe, status="ACTIVE").all()
-        for pos in active_positions:
-            pos.current_price = latest_price
-            pnl_percent = 0
-            if pos.position_type == "LONG":
-                pnl_percent = ((latest_price - pos.entry_price) / pos.entry_price) * 100
-            elif pos.position_type == "SHORT":
-                pnl_percent = ((pos.entry_price - latest_price) / pos.entry_price) * 100
-            pos.current_pnl_percent = pnl_percent
-
-            if pnl_percent >= pos.profit_target:
-                alert_message = f"ถึงเป้าหมายกำไร! Position ID: {pos.id}, {symbol} {timeframe}: กำไร {pnl_percent:.2f}%"
-                new_alert = Alert(
-                    position_id=pos.id,
-                    alert_type="PROFIT_TARGET",
-                    message=alert_message,
-                    triggered_at=datetime.utcnow()
-                )
-                db.session.add(new_alert)
-                pos.status = "CLOSED" # Close position when profit target is reached
-            elif pnl_percent <= -pos.loss_limit:
-                alert_message = f"ถึงขีดจำกัดขาดทุน! Position ID: {pos.id}, {symbol} {timeframe}: ขาดทุน {pnl_percent:.2f}%"
-                new_alert = Alert(
-                    position_id=pos.id,
-                    alert_type="LOSS_LIMIT",
-                    message=alert_message,
-                    triggered_at=datetime.utcnow()
-                )
-                db.session.add(new_alert)
-                pos.status = "CLOSED" # Close position when loss limit is reached
-            db.session.commit()
+    # Check profit/loss targets of active positions at the new price
+    # (events are persisted by the background position task)
+    risk_engine.evaluate(symbol, latest_price)
+
+    return {
+        "prediction": int(prediction),
+        "latest_price": latest_price,
+        "accuracy": float(accuracy),
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "symbol": symbol,
+        "timeframe": timeframe
+    }, 200
+
+MAX_BATCH_PAIRS = 100
+
+
+def _parse_pairs(items):
+    """รับได้ทั้ง [{"symbol": ..., "timeframe": ...}] และ [["BTC/USDT", "1h"]]"""
+    if not isinstance(items, list):
+        raise ValueError("pairs ต้องเป็น list")
+    pairs = []
+    for item in items:
+        if isinstance(item, dict):
+            symbol, timeframe = item.get("symbol"), item.get("timeframe", "1h")
+        elif isinstance(item, list) and len(item) == 2:
+            symbol, timeframe = item
+        else:
+            raise ValueError(f"แต่ละคู่ต้องเป็น object หรือ [symbol, timeframe]: {item!r}")
+        if not symbol or not timeframe:
+            raise ValueError("Symbol และ timeframe จำเป็นต้องระบุ")
+        if not isinstance(symbol, str) or not isinstance(timeframe, str):
+            raise ValueError(f"symbol และ timeframe ต้องเป็นข้อความ: {item!r}")
+        timeframe_to_ms(timeframe)
+        pair = (to_ccxt_symbol(symbol), timeframe)
+        if pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+
+def _load_training_set(symbol, timeframe):
+    ohlcv = candle_store.get_closed(symbol, timeframe, limit=720)
+    if len(ohlcv) < 50:
+        raise ValueError("ข้อมูลไม่เพียงพอสำหรับการทำนาย")
+    X, y = build_training_set(ohlcv, timeframe)
+    if len(X) < 30:
+        raise ValueError("ข้อมูลไม่เพียงพอหลังจากการประมวลผล")
+    return int(ohlcv[-1][0]), X, y
+
+
+def _latest_predictions(pairs):
+    """สัญญาณล่าสุดของแต่ละคู่ ใน query เดียว (ใช้ตรวจจับการกลับตัว)"""
+    symbols = {symbol for symbol, _ in pairs}
+    latest = app_db.session.query(
+        SignalHistory.symbol,
+        SignalHistory.timeframe,
+        func.max(SignalHistory.predicted_at).label("predicted_at"),
+    ).filter(SignalHistory.symbol.in_(symbols)).group_by(
+        SignalHistory.symbol, SignalHistory.timeframe
+    ).subquery()
+
+    rows = app_db.session.query(SignalHistory).join(latest, and_(
+        SignalHistory.symbol == latest.c.symbol,
+        SignalHistory.timeframe == latest.c.timeframe,
+        SignalHistory.predicted_at == latest.c.predicted_at,
+    )).all()
+    return {(row.symbol, row.timeframe): row.prediction for row in rows}
+
+
+def _save_signals(session, rows):
+    session.execute(insert(SignalHistory), rows)
+    session.commit()
+
+
+@predict_bp.route("/predict/batch", methods=["POST"])
+@cross_origin()
+def predict_batch():
+    """
+    ทำนายหลายคู่ในครั้งเดียว: {"pairs": [{"symbol": "BTC/USDT", "timeframe": "1h"}, ...]}
+    """
+    try:
+        data = request.get_json() or {}
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("body ต้องเป็น JSON object")
+            pairs = _parse_pairs(data.get("pairs") or [])
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"รูปแบบ pairs ไม่ถูกต้อง: {str(e)}"}), 400
+
+        if not pairs:
+            return jsonify({"error": "ต้องระบุ pairs อย่างน้อย 1 คู่"}), 400
+        if len(pairs) > MAX_BATCH_PAIRS:
+            return jsonify({"error": f"ระบุได้ไม่เกิน {MAX_BATCH_PAIRS} คู่ต่อครั้ง"}), 400
+
+        errors = []
+
+        # 1) ดึงแท่งเทียนพร้อมกัน (I/O bound -> thread)
+        datasets = {}
+        with ThreadPoolExecutor(max_workers=min(len(pairs), 8)) as io_pool:
+            futures = {pair: io_pool.submit(_load_training_set, *pair) for pair in pairs}
+            for pair, future in futures.items():
+                try:
+                    datasets[pair] = future.result()
+                except Exception as e:
+                    errors.append({"symbol": pair[0], "timeframe": pair[1], "error": str(e)})
+
+        # 2) train เฉพาะคู่ที่ยังไม่มีโมเดลของแท่งล่าสุด (CPU bound -> process pool)
+        models = {}
+        pending = {}
+        for pair, (candle_time, X, y) in datasets.items():
+            cached = model_registry.get(pair[0], pair[1], candle_time)
+            if cached:
+                models[pair] = (cached[0], cached[1], True)
+            else:
+                pending[pair] = get_training_pool().submit(fit_model, X, y, 1)
+
+        for pair, future in pending.items():
+            try:
+                model, accuracy = future.result()
+                model_registry.put(pair[0], pair[1], datasets[pair][0], model, accuracy)
+                models[pair] = (model, accuracy, False)
+            except Exception as e:
+                errors.append({"symbol": pair[0], "timeframe": pair[1], "error": str(e)})
+
+        if not models:
+            return jsonify({"results": [], "errors": errors}), 400
+
+        # 3) ราคาล่าสุดของทุกเหรียญใน request เดียว
+        exchange = get_exchange(use_mock=False)
+        tickers = exchange.fetch_tickers(sorted({symbol for symbol, _ in models}))
+
+        previous = _latest_predictions(models.keys())
+        predicted_at = datetime.utcnow()
+        rows, results = [], []
+        for (symbol, timeframe), (model, accuracy, cached) in models.items():
+            X = datasets[(symbol, timeframe)][1]
+            prediction = int(model.predict(X[-1:])[0])
+            ticker = tickers.get(symbol)
+            latest_price = float(ticker["last"]) if ticker and ticker.get("last") else float(X[-1][0])
+            last_prediction = previous.get((symbol, timeframe))
+
+            rows.append({
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "prediction": prediction,
+                "price": latest_price,
+                "accuracy": float(accuracy),
+                "predicted_at": predicted_at,
+            })
+            results.append({
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "prediction": prediction,
+                "latest_price": latest_price,
+                "accuracy": float(accuracy),
+                "reversal": last_prediction is not None and last_prediction != prediction,
+                "model_cached": cached,
+            })
+
+        # 4) บันทึก SignalHistory ทั้งหมดด้วย INSERT เดียว
+        # session จริง (ไม่ใช่ scoped proxy) เพราะอาจถูกเรียกจาก thread อื่น
+        run_blocking(_save_signals, app_db.session(), rows)
 
-        
         return jsonify({
-            "prediction": int(prediction),
-            "latest_price": latest_price,
-            "accuracy": float(accuracy),
+            "results": results,
+            "errors": errors,
             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "symbol": symbol,
-            "timeframe": timeframe
         })
-        
+
     except Exception as e:
-        db.session.rollback()
+        app_db.session.rollback()
         return jsonify({"error": f"เกิดข้อผิดพลาด: {str(e)}"}), 500
 
 def predict_coin(symbol, timeframe):
@@ -248,40 +409,22 @@ def predict_coin(symbol, timeframe):
     symbol = symbol.replace("_", "/").upper()
     print(f"[DEBUG] ✅ หลังแปลง: {symbol}")
     
-    import ccxt
-    exchange = ccxt.binance()
-    
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=720)
+    ohlcv = candle_store.get_closed(symbol, timeframe, limit=720)
 
     exchange = get_exchange(use_mock=False)
 
     if len(ohlcv) < 50:
         raise Exception("ข้อมูลไม่เพียงพอสำหรับการทำนาย")
 
-    df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"])
-    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-    df["return"] = df["close"].pct_change()
-    df["ma"] = df["close"].rolling(12).mean()
-    df["std"] = df["close"].rolling(12).std()
-    df["vol_avg"] = df["volume"].rolling(12).mean()
-    future_periods = 24 if timeframe == "1h" else (6 if timeframe == "4h" else 1)
-    df["future_close"] = df["close"].shift(-future_periods)
-    df["target"] = (df["future_close"] > df["close"]).astype(int)
-    df.dropna(inplace=True)
-    if len(df) < 30:
+    X, y = build_training_set(ohlcv, timeframe)
+    if len(X) < 30:
         raise Exception("ข้อมูลไม่เพียงพอหลังจากการประมวลผล")
 
-    features = ["close", "return", "ma", "std", "vol_avg"]
-    X = df[features]
-    y = df["target"]
-
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, shuffle=False, test_size=0.2)
-    model = XGBClassifier(random_state=42, n_estimators=100)
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    current_data = df[features].iloc[-1:].values
+    candle_time = int(ohlcv[-1][0])
+    model, accuracy, _ = model_registry.get_or_train(
+        symbol, timeframe, candle_time, lambda: run_blocking(fit_model, X, y)
+    )
+    current_data = X[-1:]
     prediction = model.predict(current_data)[0]
     ticker = exchange.fetch_ticker(symbol)
     latest_price = float(ticker["last"])
@@ -300,3 +443,44 @@ def predict_coin(symbol, timeframe):
     }
 
 
+@predict_bp.route("/signals", methods=["GET"])
+@cross_origin()
+def get_signals():
+    """
+    ประวัติสัญญาณ ใหม่สุดก่อน: /api/signals?symbol=BTC/USDT&timeframe=1h&limit=50&cursor=...
+    หน้าถัดไปส่ง cursor จาก header X-Next-Cursor (ไม่มี header = หน้าสุดท้าย)
+    """
+    try:
+        query = SignalHistory.query
+        symbol = request.args.get("symbol")
+        if symbol:
+            query = query.filter(SignalHistory.symbol == symbol)
+        timeframe = request.args.get("timeframe")
+        if timeframe:
+            query = query.filter(SignalHistory.timeframe == timeframe)
+
+        signals, next_cursor = keyset_page(
+            query, (SignalHistory.predicted_at, SignalHistory.id),
+            request.args.get("cursor"), page_size(request.args.get("limit"))
+        )
+        response = jsonify([
+            {
+                "id": signal.id,
+                "symbol": signal.symbol,
+                "timeframe": signal.timeframe,
+                "prediction": signal.prediction,
+                "recommendation": "LONG" if signal.prediction == 1 else "SHORT",
+                "price": signal.price,
+                "accuracy": signal.accuracy,
+                "predicted_at": signal.predicted_at.isoformat() if signal.predicted_at else None,
+            }
+            for signal in signals
+        ])
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -5,15 +5,26 @@ from src.models.user import User
 
 from src.models.trading import Position, Alert, SignalHistory
 from datetime import datetime
-import ccxt
 # from src.websocket.price_streaming import get_price_streaming_service
 from src.utils.binance_websocket import get_binance_ws_client
+from src.utils.candle_store import candle_store
+from src.utils.price_bus import price_bus
+from src.utils.symbols import normalize_symbol
+from src.tasks import scheduler as scheduler_module
+from src.utils.pagination import keyset_page, page_size
+from src.utils.rest_scheduler import get_rest_scheduler
+from src.utils.exchange_manager import get_exchange_manager
+from src.utils.startup_profiler import startup_profiler
+import numpy as np
 
 
 
 
 trading_bp = Blueprint("trading", __name__)
 
+DEFAULT_POSITIONS_PER_PAGE = 100
+MAX_POSITIONS_PER_PAGE = 500
+
 @trading_bp.route("/track-position", methods=["POST"])
 @cross_origin()
 def track_position():
@@ -52,41 +63,73 @@ def track_position():
 @trading_bp.route("/positions", methods=["GET"])
 @cross_origin()
 def get_positions():
+    """
+    ไม่ส่ง page/per_page: ทุก position (แบบเดิม)
+    ตัวอย่าง: /api/positions?status=ACTIVE&page=1&per_page=100
+    จำนวนทั้งหมดอยู่ใน header X-Total-Count
+    """
     try:
-        exchange = ccxt.binance()
-        positions = Position.query.order_by(Position.created_at.desc()).all()
-        output = []
-
-        for pos in positions:
-            # ดึงราคาจาก Binance แบบ real-time
-            ticker = exchange.fetch_ticker(pos.symbol)
-            current_price = ticker["last"]
-
-            # คำนวณกำไร/ขาดทุน
-            pnl_percent = 0
-            if pos.position_type == "LONG":
-                pnl_percent = ((current_price - pos.entry_price) / pos.entry_price) * 100
-            elif pos.position_type == "SHORT":
-                pnl_percent = ((pos.entry_price - current_price) / pos.entry_price) * 100
-
-            output.append({
+        status = request.args.get("status")
+        paged = "page" in request.args or "per_page" in request.args
+        page = max(int(request.args.get("page", 1)), 1)
+        per_page = min(max(int(request.args.get("per_page", DEFAULT_POSITIONS_PER_PAGE)), 1), MAX_POSITIONS_PER_PAGE)
+
+        query = Position.query
+        if status:
+            query = query.filter_by(status=status.upper())
+        query = query.order_by(Position.created_at.desc())
+        if paged:
+            total = query.count()
+            positions = query.offset((page - 1) * per_page).limit(per_page).all()
+        else:
+            positions = query.all()
+            total = len(positions)
+
+        # ราคาทุกเหรียญในหน้านี้: จาก price bus ถ้ายังสด ไม่งั้น fetch_tickers ครั้งเดียว
+        prices = price_bus.get_prices(pos.symbol for pos in positions)
+
+        # คำนวณกำไร/ขาดทุนทั้งหน้าในครั้งเดียว
+        entry = np.array([pos.entry_price for pos in positions], dtype=float)
+        current = np.array([
+            prices.get(normalize_symbol(pos.symbol)) or pos.current_price or pos.entry_price
+            for pos in positions
+        ], dtype=float)
+        side = np.array([
+            1.0 if pos.position_type == "LONG" else (-1.0 if pos.position_type == "SHORT" else 0.0)
+            for pos in positions
+        ])
+        # entry_price เป็น 0/NULL หรือไม่มีราคาเลย: PnL = 0 (inf/nan ทำให้ JSON ไม่ valid)
+        valid = (entry != 0) & np.isfinite(entry) & np.isfinite(current)
+        pnl = np.divide(side * (current - entry) * 100, entry, out=np.zeros_like(entry), where=valid)
+
+        output = [
+            {
                 "id": pos.id,
                 "symbol": pos.symbol,
                 "timeframe": pos.timeframe,
                 "position_type": pos.position_type,
                 "entry_price": pos.entry_price,
                 "entry_time": pos.entry_time,
-                "current_price": current_price,
-                "current_pnl_percent": pnl_percent,
+                "current_price": float(current[i]) if np.isfinite(current[i]) else None,
+                "current_pnl_percent": float(pnl[i]),
                 "status": pos.status,
                 "profit_target": pos.profit_target,
                 "loss_limit": pos.loss_limit,
                 "created_at": pos.created_at,
                 "updated_at": pos.updated_at
-            })
+            }
+            for i, pos in enumerate(positions)
+        ]
 
-        return jsonify(output), 200
+        response = jsonify(output)
+        response.headers["X-Total-Count"] = str(total)
+        if paged:
+            response.headers["X-Page"] = str(page)
+            response.headers["X-Per-Page"] = str(per_page)
+        return response, 200
 
+    except ValueError:
+        return jsonify({"error": "page และ per_page ต้องเป็นตัวเลข"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -96,8 +139,19 @@ def get_positions():
 @trading_bp.route("/position/<int:position_id>/alerts", methods=["GET"])
 @cross_origin()
 def get_position_alerts(position_id):
+    """
+    ไม่ส่ง limit/cursor: ทุก alert เก่าสุดก่อน (แบบเดิม)
+    ส่ง ?limit=&cursor=: ใหม่สุดก่อนทีละหน้า (cursor ถัดไปอยู่ใน header X-Next-Cursor)
+    """
     try:
-        alerts = Alert.query.filter_by(position_id=position_id).all()
+        query = Alert.query.filter_by(position_id=position_id)
+        if "limit" not in request.args and "cursor" not in request.args:
+            alerts, next_cursor = query.order_by(Alert.triggered_at, Alert.id).all(), None
+        else:
+            alerts, next_cursor = keyset_page(
+                query, (Alert.triggered_at, Alert.id),
+                request.args.get("cursor"), page_size(request.args.get("limit"))
+            )
         output = []
         for alert in alerts:
             output.append({
@@ -107,8 +161,13 @@ def get_position_alerts(position_id):
                 "triggered_at": alert.triggered_at.isoformat(),
                 "is_read": alert.is_read
             })
-        return jsonify(output), 200
+        response = jsonify(output)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -139,18 +198,12 @@ def price_history():
     try:
         symbol = request.args.get("symbol")
         limit = int(request.args.get("limit", 50))
-        timeframe = request.args.get("timeframe")
+        timeframe = request.args.get("timeframe", "1m")
 
         if not symbol:
             return jsonify({"error": "Missing symbol"}), 400
 
-        exchange = ccxt.binance()
-        if "/" not in symbol:
-            symbol_ccxt = symbol.replace("USDT", "/USDT")
-        else:
-            symbol_ccxt = symbol
-
-        ohlcv = exchange.fetch_ohlcv(symbol_ccxt, timeframe=timeframe, limit=limit)
+        ohlcv = candle_store.get_ohlcv(symbol, timeframe, limit=limit)
         result = [
             {
                 "timestamp": ts,
@@ -166,6 +219,28 @@ def price_history():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@trading_bp.route("/scheduler/stats", methods=["GET"])
+@cross_origin()
+def scheduler_stats():
+    """สถิติเวลาทำงานของแต่ละ background job"""
+    if scheduler_module.scheduler is None:
+        return jsonify({"running": False, "cycles": 0, "jobs": {}}), 200
+    return jsonify(scheduler_module.scheduler.get_stats()), 200
+
+@trading_bp.route("/exchange/stats", methods=["GET"])
+@cross_origin()
+def exchange_stats():
+    """คิวและเวลารอของ REST scheduler (แยกตาม lane) และสถานะ markets cache"""
+    stats = get_rest_scheduler().get_stats()
+    stats["exchange"] = get_exchange_manager().get_stats()
+    return jsonify(stats), 200
+
+@trading_bp.route("/startup/profile", methods=["GET"])
+@cross_origin()
+def startup_profile():
+    """เวลา startup แยกตามขั้นตอน และ library ที่โหลดแบบ lazy ภายหลัง"""
+    return jsonify(startup_profiler.report()), 200
+
 @trading_bp.route("/positions/<int:position_id>", methods=["DELETE"])
 @cross_origin()
 def delete_position(position_id):
@@ -0,0 +1,65 @@
+"""Production entry point: Flask-SocketIO on the gevent event loop.
+
+One process holds thousands of Socket.IO connections as greenlets instead
+of one OS thread each. Training and DB writes go through
+src.utils.offload so they run on native threads off the loop.
+
+    python src/serve.py                 # HOST=0.0.0.0 PORT=5000
+
+Run several of these behind one port with src/cluster.py.
+"""
+from gevent import monkey
+
+# ต้อง patch ก่อน import อย่างอื่นทั้งหมด
+# aggressive=False: คง select.epoll ไว้ให้ไลบรารีที่ import ตอนโหลด (httpx/trio ของ telegram)
+monkey.patch_all(aggressive=False)
+
+import os
+import sys
+import socket
+import logging
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SOCKETIO_ASYNC_MODE", "gevent")
+
+from src.main import app, socketio, start_services
+from src.utils.startup_profiler import startup_profiler
+from src.websocket.websocket_server import init_websocket
+from src.websocket.market_relay import PROCESS_ROLE
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", 5000))
+    if os.getenv("START_SERVICES", "1") != "0":
+        start_services()
+    else:
+        # เฉพาะ Socket.IO handler (ใช้ตอน load test)
+        init_websocket(socketio)
+
+    startup_profiler.mark_ready()
+
+    if PROCESS_ROLE == "ingester":
+        # ไม่รับ HTTP เอง ส่งทุกอย่างผ่าน broker
+        logger.info("Market data ingester running")
+        while True:
+            socketio.sleep(3600)
+
+    listen_fd = os.getenv("LISTEN_FD")
+    if listen_fd:
+        # pre-fork: socket ที่ cluster.py bind ไว้ ทุก worker accept จาก port เดียวกัน
+        from gevent import pywsgi
+        listener = socket.socket(fileno=int(listen_fd))
+        logger.info(f"Worker {os.getpid()} serving on shared socket {listener.getsockname()}")
+        pywsgi.WSGIServer(listener, app, log=None).serve_forever()
+        return
+
+    logger.info(f"Serving on {host}:{port} ({socketio.async_mode})")
+    socketio.run(app, host=host, port=port, debug=False, use_reloader=False, log_output=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,122 @@
-from flask import Flask
-from threading import Thread
-import time
-from src.app import db, app
-from src.models.user import User
+import os
+from src.app import db
 from src.models.trading import Position, Alert
 from datetime import datetime
-import ccxt
+from src.utils.price_bus import price_bus
+from src.utils.risk_engine import risk_engine
+from src.websocket.websocket_server import broadcast_alert
 from src.websocket.price_streaming import get_price_streaming_service
 from src.websocket.position_monitoring import get_position_monitoring_service
+from src.tasks.scheduler import get_scheduler
+from src.utils.offload import run_blocking
+from src.utils.storage import bulk_update
+from src.utils.telegram_outbox import get_telegram_sender
 
-def update_positions_task(app):
-    with app.app_context():
-        while True:
-            with app.app_context():
-                print("Running background task: Updating positions...")
-                active_positions = Position.query.filter_by(status="ACTIVE").all()
-                exchange = ccxt.binance({
-                    "sandbox": False,
-                    "rateLimit": 1200,
-                    "enableRateLimit": True,
-                })
-
-                for pos in active_positions:
-                    try:
-                        # 🔁 โหลดอีกรอบ เพื่อเช็คว่า object ยังมีอยู่
-                        fresh_pos = Position.query.get(pos.id)
-                        if fresh_pos is None:
-                            continue  # skip ถ้าโดนลบไปแล้ว
-
-                        ticker = exchange.fetch_ticker(fresh_pos.symbol)
-                        latest_price = ticker["last"]
-
-                        fresh_pos.current_price = latest_price
-                        pnl_percent = 0
-                        if fresh_pos.position_type == "LONG":
-                            pnl_percent = ((latest_price - fresh_pos.entry_price) / fresh_pos.entry_price) * 100
-                        elif fresh_pos.position_type == "SHORT":
-                            pnl_percent = ((fresh_pos.entry_price - latest_price) / fresh_pos.entry_price) * 100
-                        fresh_pos.current_pnl_percent = pnl_percent
-
-                        if pnl_percent >= fresh_pos.profit_target:
-                            alert_message = f"ถึงเป้าหมายกำไร! Position ID: {fresh_pos.id}, {fresh_pos.symbol} {fresh_pos.timeframe}: กำไร {pnl_percent:.2f}%"
-                            new_alert = Alert(
-                                position_id=fresh_pos.id,
-                                alert_type="PROFIT_TARGET",
-                                message=alert_message,
-                                triggered_at=datetime.utcnow()
-                            )
-                            db.session.add(new_alert)
-                            fresh_pos.status = "CLOSED"
-
-                        elif pnl_percent <= -fresh_pos.loss_limit:
-                            alert_message = f"ถึงขีดจำกัดขาดทุน! Position ID: {fresh_pos.id}, {fresh_pos.symbol} {fresh_pos.timeframe}: ขาดทุน {pnl_percent:.2f}%"
-                            new_alert = Alert(
-                                position_id=fresh_pos.id,
-                                alert_type="LOSS_LIMIT",
-                                message=alert_message,
-                                triggered_at=datetime.utcnow()
-                            )
-                            db.session.add(new_alert)
-                            fresh_pos.status = "CLOSED"
-
-                        db.session.commit()
-
-                    except Exception as e:
-                        print(f"Error updating position {pos.id if pos else 'unknown'}: {e}")
-                        db.session.rollback()
-
-                time.sleep(10) # Run every 60 seconds
+# รอบการทำงานของแต่ละ job (วินาที) ปรับได้ผ่าน environment
+JOB_INTERVALS = {
+    'update_positions': float(os.getenv("UPDATE_POSITIONS_INTERVAL", 10)),
+    'position_monitor': float(os.getenv("POSITION_MONITOR_INTERVAL", 5)),
+    'price_stream': float(os.getenv("PRICE_STREAM_INTERVAL", 2)),
+}
+JOB_JITTER = float(os.getenv("SCHEDULER_JITTER", 0.2))
+
+def persist_risk_events(events, socketio=None):
+    """ปิด position และสร้าง Alert สำหรับ event จาก risk engine (commit ครั้งเดียว)"""
+    if not events:
+        return []
+    positions = {
+        pos.id: pos
+        for pos in Position.query.filter(Position.id.in_([e['position_id'] for e in events])).all()
+    }
+    alerts = []
+    for event in events:
+        pos = positions.get(event['position_id'])
+        if pos is None or pos.status != "ACTIVE":
+            continue  # ถูกลบหรือปิดไปแล้ว
+
+        pnl_percent = event['pnl_percent']
+        pos.current_price = event['price']
+        pos.current_pnl_percent = pnl_percent
+        pos.status = "CLOSED"
+        if event['event'] == "PROFIT_TARGET":
+            alert_message = f"ถึงเป้าหมายกำไร! Position ID: {pos.id}, {pos.symbol} {pos.timeframe}: กำไร {pnl_percent:.2f}%"
+        else:
+            alert_message = f"ถึงขีดจำกัดขาดทุน! Position ID: {pos.id}, {pos.symbol} {pos.timeframe}: ขาดทุน {pnl_percent:.2f}%"
+        alert = Alert(
+            position_id=pos.id,
+            alert_type=event['event'],
+            message=alert_message,
+            triggered_at=datetime.utcnow()
+        )
+        db.session.add(alert)
+        alerts.append(alert)
+    run_blocking(db.session().commit)
+
+    if socketio:
+        for alert in alerts:
+            broadcast_alert(socketio, {
+                'alert_id': alert.id,
+                'position_id': alert.position_id,
+                'alert_type': alert.alert_type,
+                'message': alert.message,
+                'timestamp': alert.triggered_at.isoformat()
+            })
+    return alerts
+
+def update_positions(snapshot, socketio=None):
+    """Scheduler job: sync the risk engine with the DB and persist PnL / triggered events"""
+    print("Running background task: Updating positions...")
+    try:
+        active_positions = snapshot.active_positions
+        risk_engine.load(active_positions)
+
+        # ราคาจาก WebSocket (fallback REST ครั้งเดียวสำหรับเหรียญที่ข้อมูลเก่า)
+        prices = snapshot.prices()
+        for symbol, price in prices.items():
+            risk_engine.evaluate(symbol, price)
+
+        events = risk_engine.drain_events()
+        closing = {event['position_id'] for event in events}
+
+        # UPDATE เฉพาะ position ที่ราคาเปลี่ยน ด้วย executemany ครั้งเดียว (ตัวที่กำลังปิดให้ persist_risk_events เขียน)
+        pnl = risk_engine.position_pnl()
+        bulk_update(db.session, Position, [
+            {'id': pos.id, 'current_price': state['current_price'], 'current_pnl_percent': state['pnl_percent']}
+            for pos, state in ((pos, pnl.get(pos.id)) for pos in active_positions)
+            if state and pos.id not in closing
+            and (state['current_price'], state['pnl_percent']) != (pos.current_price, pos.current_pnl_percent)
+        ])
+
+        # event ที่สะสมจาก tick (และรอบนี้) บันทึกพร้อมกันใน transaction เดียวกัน
+        persist_risk_events(events, socketio)
+        run_blocking(db.session().commit)
+        # ack หลัง commit สำเร็จเท่านั้น ถ้าล้มเหลว event ยังค้างใน risk engine และเขียนใหม่รอบหน้า
+        risk_engine.ack_events(events)
+
+    except Exception as e:
+        print(f"Error updating positions: {e}")
+        db.session.rollback()
+        raise
 
 def start_background_tasks(app, socketio):
-    """Start all background tasks including WebSocket services"""
-    
-    # Start original background task
-    thread = Thread(target=update_positions_task, args=(app,))
-    thread.daemon = True
-    thread.start()
-    
-    # Start WebSocket services
+    """Register all periodic jobs on the shared scheduler and start it"""
+
+    # risk engine ประเมินทุก tick ที่เข้ามาใน price bus
+    price_bus.subscribe(risk_engine.on_price)
+
     price_service = get_price_streaming_service(app, socketio)
-    price_service.start()
-    
     position_service = get_position_monitoring_service(app, socketio)
-    position_service.start()
-    
-    print("All background tasks and WebSocket services started")
 
+    scheduler = get_scheduler(app)
+    scheduler.add_job('update_positions', lambda snapshot: update_positions(snapshot, socketio),
+                      JOB_INTERVALS['update_positions'], jitter=JOB_JITTER)
+    scheduler.add_job('position_monitor', position_service.run_once,
+                      JOB_INTERVALS['position_monitor'], jitter=JOB_JITTER)
+    scheduler.add_job('price_stream', price_service.run_once,
+                      JOB_INTERVALS['price_stream'], jitter=JOB_JITTER)
+    scheduler.start()
+
+    # ส่งข้อความใน Telegram outbox (ทุก process เขียน outbox ได้ แต่ส่งจากที่นี่ที่เดียว)
+    get_telegram_sender(app).start()
 
+    print("All background tasks and WebSocket services started")
@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+import logging
+from functools import cached_property
+from typing import Callable, Dict, Iterable, Optional
+
+from src.models.trading import Position
+from src.utils.price_bus import price_bus
+from src.utils.symbols import normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+
+class CycleSnapshot:
+    """Positions and prices shared by every job that runs in the same scheduler cycle.
+
+    Both are loaded lazily and at most once per cycle, so jobs that don't
+    need them pay nothing and jobs that do share one DB query and one
+    price lookup.
+    """
+
+    def __init__(self):
+        self.created_at = time.time()
+        self._prices: Dict[str, float] = {}
+
+    @cached_property
+    def active_positions(self):
+        return Position.query.filter_by(status="ACTIVE").all()
+
+    @cached_property
+    def symbols(self):
+        return {normalize_symbol(pos.symbol) for pos in self.active_positions}
+
+    def prices(self, extra_symbols: Iterable[str] = ()) -> Dict[str, float]:
+        """Prices of all active-position symbols (plus ``extra_symbols``) keyed by normalized symbol"""
+        wanted = self.symbols | {normalize_symbol(s) for s in extra_symbols}
+        missing = wanted - self._prices.keys()
+        if missing:
+            self._prices.update(price_bus.get_prices(missing))
+        return {s: self._prices[s] for s in wanted if s in self._prices}
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[CycleSnapshot], None], interval: float, jitter: float = 0.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.next_run = time.monotonic()
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.total_time = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.max_lag = 0.0
+        self.last_error: Optional[str] = None
+
+    def schedule_next(self, now: float):
+        delay = self.interval + random.uniform(-self.jitter, self.jitter)
+        self.next_run = now + max(delay, 0.0)
+
+    def stats(self) -> Dict:
+        return {
+            'interval': self.interval,
+            'jitter': self.jitter,
+            'runs': self.runs,
+            'failures': self.failures,
+            'overruns': self.overruns,
+            'last_duration': round(self.last_duration, 4),
+            'avg_duration': round(self.total_time / self.runs, 4) if self.runs else 0.0,
+            'max_duration': round(self.max_duration, 4),
+            'max_lag': round(self.max_lag, 4),
+            'last_error': self.last_error,
+        }
+
+
+class Scheduler:
+    """Single background thread running named periodic jobs.
+
+    Each wake-up runs every due job inside one app context against one
+    CycleSnapshot. A run longer than its job's interval counts as an
+    overrun and is logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.jobs: Dict[str, Job] = {}
+        self.running = False
+        self.thread = None
+        self.cycles = 0
+        self._wakeup = threading.Event()
+
+    def add_job(self, name: str, func: Callable[[CycleSnapshot], None], interval: float, jitter: float = 0.0):
+        self.jobs[name] = Job(name, func, interval, jitter)
+        self._wakeup.set()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            logger.info(f"Scheduler started with jobs: {', '.join(self.jobs)}")
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join()
+        logger.info("Scheduler stopped")
+
+    def get_stats(self) -> Dict:
+        return {
+            'running': self.running,
+            'cycles': self.cycles,
+            'jobs': {name: job.stats() for name, job in self.jobs.items()},
+        }
+
+    def _run(self):
+        while self.running:
+            now = time.monotonic()
+            due = [job for job in self.jobs.values() if job.next_run <= now]
+            if due:
+                self._run_cycle(due)
+
+            next_run = min((job.next_run for job in self.jobs.values()), default=time.monotonic() + 1)
+            self._wakeup.wait(max(next_run - time.monotonic(), 0.0))
+            self._wakeup.clear()
+
+    def _run_cycle(self, due):
+        self.cycles += 1
+        try:
+            with self.app.app_context():
+                snapshot = CycleSnapshot()
+                for job in due:
+                    self._run_job(job, snapshot)
+        except Exception as e:
+            logger.error(f"Scheduler cycle failed: {e}")
+            for job in due:
+                job.schedule_next(time.monotonic())
+
+    def _run_job(self, job: Job, snapshot: CycleSnapshot):
+        started = time.monotonic()
+        job.max_lag = max(job.max_lag, started - job.next_run)
+        try:
+            job.func(snapshot)
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Job {job.name} failed: {e}")
+        finally:
+            duration = time.monotonic() - started
+            job.runs += 1
+            job.last_duration = duration
+            job.total_time += duration
+            job.max_duration = max(job.max_duration, duration)
+            if duration > job.interval:
+                job.overruns += 1
+                logger.warning(f"Job {job.name} overran: {duration:.2f}s > {job.interval}s interval")
+            job.schedule_next(time.monotonic())
+
+
+# Global instance
+scheduler = None
+
+
+def get_scheduler(app=None):
+    global scheduler
+    if scheduler is None:
+        if app is None:
+            raise RuntimeError("app is required to initialize Scheduler")
+        scheduler = Scheduler(app)
+    return scheduler
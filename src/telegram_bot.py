@@ -1,5 +1,6 @@
 from telegram.ext import (
     ApplicationBuilder,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     ConversationHandler,
@@ -9,6 +10,8 @@ from telegram.ext import (
 from telegram import Update
 from dotenv import load_dotenv
 import os
+import asyncio
+import logging
 from src.routes.predict import predict_coin
 from src.routes.trading import create_position
 # telegram_bot.py
@@ -18,13 +21,101 @@ from sqlalchemy.exc import SQLAlchemyError
 from src.websocket.websocket_server import broadcast_clear_all,broadcast_clearalert_all
 from src.models.trading import Position, Alert, SignalHistory
 from src.app import db
+from src.utils.offload import native_executor
+from src.utils.rest_scheduler import interactive
 
+logger = logging.getLogger(__name__)
 
 ASK_POSITION, ASK_POSITION_DETAILS = range(2)
 
+# จำนวน thread สำหรับทำนาย และจำนวน update (ต่างแชท) ที่ทำพร้อมกัน
+PREDICT_WORKERS = int(os.getenv("TELEGRAM_PREDICT_WORKERS", 4))
+TELEGRAM_CONCURRENT_UPDATES = int(os.getenv("TELEGRAM_CONCURRENT_UPDATES", 64))
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats concurrently, but one at a time per chat.
+
+    ConversationHandler keeps its state per chat/user, so a chat's next
+    message (e.g. the "y" reply) must not run while its previous handler
+    is still awaiting.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks = {}  # chat_id -> [lock, จำนวน update ที่ใช้อยู่/รออยู่]
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            await coroutine
+            return
+        slot = self._chat_locks.setdefault(chat.id, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                await coroutine
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+class PredictionDispatcher:
+    """Runs predict_coin on worker threads and awaits it from the bot's event loop.
+
+    Concurrent requests for the same (symbol, timeframe) await one shared
+    in-flight computation. Requests of one chat are already serialized by
+    PerChatUpdateProcessor.
+    """
+
+    def __init__(self, max_workers: int = PREDICT_WORKERS):
+        self._executor = native_executor(max_workers, thread_name_prefix='telegram-predict')
+        self._inflight = {}
+
+    async def predict(self, symbol: str, timeframe: str) -> dict:
+        return await asyncio.shield(self._shared(symbol, timeframe))
+
+    def _shared(self, symbol: str, timeframe: str) -> asyncio.Future:
+        key = (symbol.replace("_", "/").upper(), timeframe)
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._submit(interactive(predict_coin), symbol, timeframe)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info(f"Joining in-flight prediction for {key}")
+        return future
+
+    def _submit(self, fn, *args) -> asyncio.Future:
+        # ไม่ใช้ run_in_executor: future ของ gevent threadpool ไม่ใช่ concurrent.futures.Future
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+
+        def done(worker_future):
+            def resolve():
+                if result.done():
+                    return
+                error = worker_future.exception()
+                if error is not None:
+                    result.set_exception(error)
+                else:
+                    result.set_result(worker_future.result())
+            loop.call_soon_threadsafe(resolve)
+
+        self._executor.submit(fn, *args).add_done_callback(done)
+        return result
+
 def build_bot(socketio):
     load_dotenv()
     token = os.getenv("TELEGRAM_BOT_TOKEN")
+    dispatcher = PredictionDispatcher()
 
     async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("พิมพ์ชื่อเหรียญ เช่น btc/usdt 1h เพื่อทำนายราคา")
@@ -65,7 +156,13 @@ def build_bot(socketio):
             )
 
         symbol, timeframe = parts
-        result = predict_coin(symbol, timeframe)
+        try:
+            # ทำนายใน worker thread ไม่บล็อก event loop ของ bot
+            result = await dispatcher.predict(symbol, timeframe)
+        except Exception as e:
+            logger.error(f"Prediction failed for {symbol} {timeframe}: {e}")
+            await update.message.reply_text(f"❌ ทำนายไม่สำเร็จ: {str(e)}")
+            return ConversationHandler.END
         msg = (
             f"ราคาล่าสุด: {result['price']}\n"
             f"ความแม่นยำ: {result['accuracy']}%\n"
@@ -129,7 +226,9 @@ def build_bot(socketio):
 
         return ConversationHandler.END
 
-    telegram_app = ApplicationBuilder().token(token).build()
+    # รับ update หลายแชทพร้อมกัน แต่ทีละ update ต่อแชท (state ของ ConversationHandler ไม่ชนกัน)
+    telegram_app = (ApplicationBuilder().token(token)
+                    .concurrent_updates(PerChatUpdateProcessor(TELEGRAM_CONCURRENT_UPDATES)).build())
     telegram_app.add_handler(CommandHandler('start', start))
 
     conv_handler = ConversationHandler(
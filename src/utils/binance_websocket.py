@@ -1,24 +1,28 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-import ccxt
 import websocket
 import json
 import threading
 import time
 import logging
+from collections import deque
 from typing import Dict, Callable, Optional
 from datetime import datetime
-
+from src.utils.symbols import normalize_symbol
+from src.utils.candle_aggregator import CandleAggregator
+from src.utils.price_bus import price_bus
+from src.websocket.market_relay import RemoteBinanceClient, get_market_relay
 
 
 logger = logging.getLogger(__name__)
 
+# Binance ตัด connection ที่ส่งข้อความเข้าเกิน 5 ข้อความ/วินาที (รวม ping/pong) เผื่อไว้ 1
+BINANCE_WS_MAX_MESSAGES_PER_SECOND = float(os.getenv("BINANCE_WS_MAX_MESSAGES_PER_SECOND", 4))
+# stream ที่สมัครเมื่อยังไม่มีใครขอ symbol ใดเลย
+DEFAULT_STREAM_SYMBOL = "BTCUSDT"
 
 
-def normalize_symbol(symbol: str) -> str:
-    return symbol.replace("/", "").upper()
-
 class BinanceWebSocketClient:
     """Binance WebSocket client for real-time price streaming"""
     
@@ -32,21 +36,26 @@ class BinanceWebSocketClient:
         self.max_reconnect_attempts = 5
         self.reconnect_delay = 5
         self.symbol_timeframes = {}  # <<== เพิ่มบรรทัดนี้
+        self._request_id = 0
+        # คำขอ SUBSCRIBE/UNSUBSCRIBE รอส่งตาม rate limit, คำขอติดกันแบบเดียวกันรวมเป็นข้อความเดียว
+        self._outbox = deque()
+        self._outbox_cond = threading.Condition()
+        self._sender = None
+        self._last_send = 0.0
+        self._closing = False
+        self._default_stream = False  # สมัคร DEFAULT_STREAM_SYMBOL ไว้โดยไม่มีใครขอ
+        self.candles = CandleAggregator()
 
-        # Binance WebSocket URL
-        self.base_url = "wss://stream.binance.com:9443/ws/"
+        # Binance combined-stream endpoint: เพิ่ม/ลบ stream ผ่านข้อความ SUBSCRIBE/UNSUBSCRIBE
+        # บน connection เดิม โดยไม่ต้อง reconnect
+        self.base_url = "wss://stream.binance.com:9443/stream"
 
         
     def connect(self):
         """Connect to Binance WebSocket"""
         try:
-            # Create stream URL for multiple symbols
-            if self.subscribed_symbols:
-                streams = [f"{symbol.lower()}@ticker" for symbol in self.subscribed_symbols]
-                stream_url = self.base_url + "/".join(streams)
-            else:
-                # Default stream for BTCUSDT
-                stream_url = self.base_url + "btcusdt@ticker"
+            self._closing = False
+            stream_url = self.base_url
             
             logger.info(f"Connecting to Binance WebSocket: {stream_url}")
             
@@ -72,6 +81,15 @@ class BinanceWebSocketClient:
         self.is_connected = True
         self.reconnect_attempts = 0
         logger.info("Connected to Binance WebSocket")
+
+        # สมัคร stream ทั้งหมดที่มีอยู่ (ทั้งตอนเชื่อมต่อครั้งแรกและหลัง reconnect)
+        # ยังไม่มีใครขอ symbol: สมัคร stream เริ่มต้นไว้ แต่ไม่นับเป็น symbol ที่สมัคร
+        # และยกเลิกเมื่อมี symbol แรก
+        self._default_stream = not self.subscribed_symbols
+        symbols = [DEFAULT_STREAM_SYMBOL] if self._default_stream else self.subscribed_symbols
+        with self._outbox_cond:
+            self._outbox.clear()  # คำขอค้างจาก connection เก่า สมัครใหม่ทั้งชุดด้านล่างแทน
+        self._send_request("SUBSCRIBE", self._streams_for(symbols))
         
         # Notify via SocketIO if available
         if self.socketio:
@@ -85,7 +103,24 @@ class BinanceWebSocketClient:
         """Handle incoming WebSocket messages"""
         from src.websocket.websocket_server import broadcast_price_update
         try:
-            data = json.loads(message)
+            payload = json.loads(message)
+
+            # คำตอบของ SUBSCRIBE/UNSUBSCRIBE: {"result": null, "id": 1}
+            if 'id' in payload and ('result' in payload or 'error' in payload):
+                if payload.get('error'):
+                    logger.error(f"Binance subscription request {payload['id']} failed: {payload['error']}")
+                return
+
+            # combined stream ห่อข้อมูลไว้ใน {"stream": ..., "data": {...}}
+            data = payload.get('data', payload)
+
+            # แท่งเทียนจาก kline stream เก็บไว้ใน memory
+            if data.get('e') == 'kline':
+                symbol = normalize_symbol(data['s'])
+                # kline ของ timeframe เก่าที่ยังมาถึงหลังสลับ ไม่ต้องสร้าง buffer ใหม่
+                if data['k'].get('i') == self.symbol_timeframes.get(symbol, "1m"):
+                    self.candles.update_from_kline(symbol, data['k'])
+                return
 
             # ตรวจสอบว่าเป็นอีเวนต์ ticker
             if 'e' in data and data['e'] == '24hrTicker':
@@ -106,6 +141,9 @@ class BinanceWebSocketClient:
                     'source': 'binance_ws'
                 }
 
+                # ราคาล่าสุดเข้าตารางกลาง ให้ทุก service อ่านแทนการเรียก REST
+                price_bus.publish(normalized_symbol, price, change_24h=change_24h, volume=volume)
+
                 # 🔁 เรียก callback ถ้ามี
                 if normalized_symbol in self.price_callbacks:
                     for callback in self.price_callbacks[normalized_symbol]:
@@ -117,14 +155,16 @@ class BinanceWebSocketClient:
                 # ✅ ส่งผ่าน SocketIO
                 if self.socketio:
                     timeframe = self.symbol_timeframes.get(normalized_symbol, "1m")
-                    candle_data = get_latest_candle(normalized_symbol, timeframe)
+                    # แท่งปัจจุบันมาจาก memory ไม่มีการเรียก REST ใน tick path
+                    candle_data = self.candles.update_from_price(normalized_symbol, timeframe, price) or {}
                     # print(f"[DEBUG] Broadcasting price update for {normalized_symbol} with timeframe {timeframe}")
                     broadcast_price_update(self.socketio, normalized_symbol, {
                         **price_data,
-                        'open': candle_data['open'],
-                        'high': candle_data['high'],
-                        'low': candle_data['low'],
-                        'close': candle_data['close'],
+                        'open': candle_data.get('open'),
+                        'high': candle_data.get('high'),
+                        'low': candle_data.get('low'),
+                        'close': candle_data.get('close'),
+                        'candle_timestamp': candle_data.get('timestamp'),
                         'timeframe': timeframe,
                     })
 
@@ -150,6 +190,8 @@ class BinanceWebSocketClient:
         """Handle WebSocket connection close"""
         self.is_connected = False
         logger.warning(f"Binance WebSocket closed: {close_status_code} - {close_msg}")
+        if self._closing:
+            return
         
         if self.socketio:
             self.socketio.emit('binance_status', {
@@ -185,6 +227,11 @@ class BinanceWebSocketClient:
     
     def subscribe_symbol(self, symbol: str, timeframe: Optional[str] = "1m", callback: Optional[Callable] = None):
         symbol_key = normalize_symbol(symbol)
+        timeframe = timeframe or "1m"
+        if self._default_stream:
+            self._release_default_stream()
+        is_new = symbol_key not in self.subscribed_symbols
+        old_timeframe = self.symbol_timeframes.get(symbol_key)
         self.subscribed_symbols.add(symbol_key)
         self.symbol_timeframes[symbol_key] = timeframe
         # print(f"[DEBUG] subscribe_symbol called for {symbol_key} with timeframe {timeframe}")
@@ -196,31 +243,95 @@ class BinanceWebSocketClient:
 
         logger.info(f"Subscribed to {symbol_key} with timeframe {timeframe}")
 
-        # Reconnect with new subscription
-        if self.is_connected:
-            self.disconnect()
-            time.sleep(1)
-            self.connect()
+        # เพิ่ม stream บน connection เดิม stream อื่นไม่สะดุด
+        if self.is_connected and is_new:
+            self._send_request("SUBSCRIBE", self._streams_for([symbol_key]))
+        elif self.is_connected and old_timeframe != timeframe:
+            # เปลี่ยน timeframe -> สลับเฉพาะ kline stream
+            self._send_request("SUBSCRIBE", [f"{symbol_key.lower()}@kline_{timeframe}"])
+            if old_timeframe:
+                self._send_request("UNSUBSCRIBE", [f"{symbol_key.lower()}@kline_{old_timeframe}"])
+        if old_timeframe and old_timeframe != timeframe:
+            self.candles.discard(symbol_key, old_timeframe)
 
 
     
     def unsubscribe_symbol(self, symbol: str):
-        symbol_upper = symbol.upper()
+        symbol_upper = normalize_symbol(symbol)
+        if symbol_upper not in self.subscribed_symbols:
+            return
         self.subscribed_symbols.discard(symbol_upper)
         
         self.price_callbacks.pop(symbol_upper, None)
+        streams = self._streams_for([symbol_upper])
         self.symbol_timeframes.pop(symbol_upper, None)  # ลบ timeframe ด้วย
+        self.candles.discard(symbol_upper)
         
         logger.info(f"Unsubscribed from {symbol_upper}")
         
         if self.is_connected:
-            self.disconnect()
-            time.sleep(1)
-            self.connect()
+            self._send_request("UNSUBSCRIBE", streams)
+
+    def _release_default_stream(self):
+        """Unsubscribe the default stream once a symbol has actually been requested"""
+        self._default_stream = False
+        if DEFAULT_STREAM_SYMBOL not in self.subscribed_symbols:
+            self.candles.discard(DEFAULT_STREAM_SYMBOL)
+        if self.is_connected:
+            self._send_request("UNSUBSCRIBE", self._streams_for([DEFAULT_STREAM_SYMBOL]))
+
+    def _streams_for(self, symbols) -> list:
+        streams = []
+        for symbol in symbols:
+            timeframe = self.symbol_timeframes.get(symbol, "1m")
+            streams.append(f"{symbol.lower()}@ticker")
+            streams.append(f"{symbol.lower()}@kline_{timeframe}")
+        return streams
+
+    def _send_request(self, method: str, streams: list):
+        """Queue a live SUBSCRIBE/UNSUBSCRIBE request; sent in order within Binance's message rate limit"""
+        if not streams:
+            return
+        with self._outbox_cond:
+            if self._outbox and self._outbox[-1][0] == method:
+                pending = self._outbox[-1][1]
+                pending.extend(stream for stream in streams if stream not in pending)
+            else:
+                self._outbox.append((method, list(streams)))
+            if self._sender is None:
+                self._sender = threading.Thread(target=self._send_loop, daemon=True)
+                self._sender.start()
+            self._outbox_cond.notify()
+
+    def _send_loop(self):
+        interval = 1.0 / BINANCE_WS_MAX_MESSAGES_PER_SECOND
+        while True:
+            with self._outbox_cond:
+                while not self._outbox:
+                    self._outbox_cond.wait()
+                wait = self._last_send + interval - time.monotonic()
+                if wait > 0:
+                    # ระหว่างรอ คำขอใหม่ยังรวมเข้าข้อความสุดท้ายได้
+                    self._outbox_cond.wait(wait)
+                    continue
+                method, streams = self._outbox.popleft()
+                self._last_send = time.monotonic()
+                self._request_id += 1
+                request = {'method': method, 'params': streams, 'id': self._request_id}
+
+            if not self.ws or not self.is_connected:
+                continue  # _on_open สมัครใหม่ทั้งหมดเมื่อต่อได้
+            try:
+                self.ws.send(json.dumps(request))
+                logger.debug(f"Sent {method} {streams} (id={request['id']})")
+            except Exception as e:
+                # ถ้าส่งไม่ได้ _on_open จะสมัครใหม่ทั้งหมดหลัง reconnect
+                logger.error(f"Failed to send {method} for {streams}: {e}")
 
     
     def disconnect(self):
         """Disconnect from WebSocket"""
+        self._closing = True
         self.is_connected = False
         if self.ws:
             self.ws.close()
@@ -241,6 +352,11 @@ _binance_ws_client = None
 def get_binance_ws_client(socketio=None):
     global _binance_ws_client
     if _binance_ws_client is None:
+        relay = get_market_relay()
+        if relay and relay.role == "web":
+            # web worker ไม่ต่อ Binance เอง ส่งคำขอ subscribe ไปที่ ingester
+            _binance_ws_client = RemoteBinanceClient(relay)
+            return _binance_ws_client
         if socketio is None:
             raise RuntimeError("SocketIO is required to initialize BinanceWebSocketClient")
         _binance_ws_client = BinanceWebSocketClient(socketio)
@@ -250,22 +366,3 @@ def get_binance_ws_client(socketio=None):
 if __name__ == "__main__":
     from src.websocket.websocket_server import broadcast_price_update
     print("✅ Import OK")
-
-def get_latest_candle(symbol, timeframe):
-    exchange = ccxt.binance()
-    # Binance ใช้รูปแบบ BTC/USDT
-    if not "/" in symbol:
-        symbol_ccxt = symbol.replace("USDT", "/USDT")
-    else:
-        symbol_ccxt = symbol
-    ohlcv = exchange.fetch_ohlcv(symbol_ccxt, timeframe=timeframe, limit=1)
-    ts, open_, high, low, close, vol = ohlcv[0]
-    return {
-        'symbol': symbol,
-        'open': open_,
-        'high': high,
-        'low': low,
-        'close': close,
-        'timestamp': int(ts // 1000),
-        'timeframe': timeframe,
-    }
\ No newline at end of file
@@ -0,0 +1,72 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+class CandleAggregator:
+    """Current and recent candles per (symbol, timeframe), fed by Binance kline events.
+
+    Each key has a fixed-size ring buffer (``deque(maxlen=...)``); the last
+    element is the candle still forming. Reads never touch the network.
+    """
+
+    def __init__(self, max_candles: int = 200):
+        self.max_candles = max_candles
+        self._buffers: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+
+    def update_from_kline(self, symbol: str, kline: dict) -> dict:
+        """Apply a kline payload (the ``k`` object of a kline event)"""
+        candle = {
+            'symbol': symbol,
+            'open': float(kline['o']),
+            'high': float(kline['h']),
+            'low': float(kline['l']),
+            'close': float(kline['c']),
+            'volume': float(kline['v']),
+            'timestamp': int(kline['t'] // 1000),  # เวลาเปิดแท่ง (วินาที)
+            'timeframe': kline['i'],
+            'closed': bool(kline.get('x', False)),
+        }
+        with self._lock:
+            buffer = self._buffer((symbol, candle['timeframe']))
+            if buffer and buffer[-1]['timestamp'] == candle['timestamp']:
+                buffer[-1] = candle
+            elif not buffer or buffer[-1]['timestamp'] < candle['timestamp']:
+                buffer.append(candle)
+        return dict(candle)
+
+    def update_from_price(self, symbol: str, timeframe: str, price: float) -> Optional[dict]:
+        """Fold a ticker price into the forming candle so candles move with every tick"""
+        with self._lock:
+            buffer = self._buffers.get((symbol, timeframe))
+            if not buffer or buffer[-1]['closed']:
+                return None
+            candle = buffer[-1]
+            candle['close'] = price
+            candle['high'] = max(candle['high'], price)
+            candle['low'] = min(candle['low'], price)
+            return dict(candle)
+
+    def latest(self, symbol: str, timeframe: str) -> Optional[dict]:
+        with self._lock:
+            buffer = self._buffers.get((symbol, timeframe))
+            return dict(buffer[-1]) if buffer else None
+
+    def recent(self, symbol: str, timeframe: str, limit: int = 50) -> List[dict]:
+        with self._lock:
+            buffer = self._buffers.get((symbol, timeframe))
+            if not buffer:
+                return []
+            return [dict(c) for c in list(buffer)[-limit:]]
+
+    def discard(self, symbol: str, timeframe: Optional[str] = None):
+        """Drop the buffers of ``symbol`` (only ``timeframe``'s when given)"""
+        with self._lock:
+            for key in [k for k in self._buffers if k[0] == symbol and timeframe in (None, k[1])]:
+                del self._buffers[key]
+
+    def _buffer(self, key: Tuple[str, str]) -> deque:
+        if key not in self._buffers:
+            self._buffers[key] = deque(maxlen=self.max_candles)
+        return self._buffers[key]
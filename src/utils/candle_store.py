@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.exchange_manager import get_exchange
+from src.utils.symbols import normalize_symbol, to_ccxt_symbol
+
+logger = logging.getLogger(__name__)
+
+# แต่ละแถวเก็บเป็น float64 6 ค่า: timestamp(ms), open, high, low, close, volume
+ROW_FIELDS = 6
+ROW_BYTES = ROW_FIELDS * 8
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'candles')
+
+_TIMEFRAME_UNITS_MS = {
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+    'M': 30 * 24 * 60 * 60 * 1000,
+}
+# 1970-01-01 เป็นวันพฤหัส แต่แท่ง 1w ของ Binance เปิดวันจันทร์ (1970-01-05)
+_WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000
+
+
+def _parse_timeframe(timeframe: str) -> Tuple[int, str]:
+    try:
+        amount, unit = int(timeframe[:-1]), timeframe[-1]
+    except (ValueError, IndexError, TypeError):
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    if unit not in _TIMEFRAME_UNITS_MS or amount <= 0:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return amount, unit
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Nominal length of a ccxt timeframe such as '15m' or '4h' in milliseconds (a month counts 30 days).
+
+    Candle boundaries are not multiples of this for weeks and months; use
+    ``candle_open_ms``/``candle_close_ms`` for those.
+    """
+    amount, unit = _parse_timeframe(timeframe)
+    return amount * _TIMEFRAME_UNITS_MS[unit]
+
+
+def _month_start_ms(months: int) -> int:
+    year, month = divmod(months, 12)
+    return int(datetime(1970 + year, month + 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def candle_open_ms(timeframe: str, ts_ms: int) -> int:
+    """Open time (UTC, ms) of the candle that contains ``ts_ms``, aligned like Binance"""
+    amount, unit = _parse_timeframe(timeframe)
+    if unit == 'M':
+        dt = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+        months = (dt.year - 1970) * 12 + dt.month - 1
+        return _month_start_ms(months - months % amount)
+    tf_ms = amount * _TIMEFRAME_UNITS_MS[unit]
+    offset = _WEEK_OFFSET_MS if unit == 'w' else 0
+    return (ts_ms - offset) // tf_ms * tf_ms + offset
+
+
+def candle_close_ms(timeframe: str, ts_ms: int) -> int:
+    """Close time (= next open, UTC, ms) of the candle that contains ``ts_ms``"""
+    amount, unit = _parse_timeframe(timeframe)
+    if unit == 'M':
+        dt = datetime.fromtimestamp(candle_open_ms(timeframe, ts_ms) / 1000, tz=timezone.utc)
+        return _month_start_ms((dt.year - 1970) * 12 + dt.month - 1 + amount)
+    return candle_open_ms(timeframe, ts_ms) + amount * _TIMEFRAME_UNITS_MS[unit]
+
+
+class CandleStore:
+    """Append-only on-disk OHLCV store keyed by (symbol, timeframe).
+
+    Closed candles are appended to a memory-mapped binary file per key and
+    never fetched again; only candles newer than the last stored timestamp
+    are requested from the exchange. The still-open candle is kept in memory
+    and refreshed at most every ``refresh_interval`` seconds. A key whose
+    full load returned fewer candles than asked for has no older history on
+    the exchange, so it is synced incrementally from then on.
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, exchange_factory=None,
+                 max_fetch: int = 1000, refresh_interval: float = 5.0, max_rows: int = 100_000):
+        self.base_dir = base_dir or DEFAULT_DIR
+        self.max_fetch = max_fetch
+        self.refresh_interval = refresh_interval
+        self.max_rows = max_rows
+        self._exchange_factory = exchange_factory or get_exchange
+        self._exchange = None
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        # key -> (open candle row or None, fetched_at)
+        self._open_candles: Dict[Tuple[str, str], Tuple[Optional[list], float]] = {}
+        # key ที่ exchange ไม่มีแท่งเก่ากว่าที่เก็บไว้แล้ว (โหลดเต็มได้น้อยกว่าที่ขอ)
+        self._exhausted = set()
+        # key -> memmap ของไฟล์ ใช้ซ้ำจนกว่าไฟล์จะเปลี่ยนขนาด
+        self._maps: Dict[Tuple[str, str], np.memmap] = {}
+
+    @property
+    def exchange(self):
+        if self._exchange is None:
+            self._exchange = self._exchange_factory()
+        return self._exchange
+
+    def get_ohlcv(self, symbol: str, timeframe: str, limit: int = 720) -> List[list]:
+        """Return up to ``limit`` candles (oldest first) in ccxt's fetch_ohlcv layout"""
+        symbol = to_ccxt_symbol(symbol)
+        key = (symbol, timeframe)
+        with self._lock_for(key):
+            self._sync(key, limit)
+            open_candle, _ = self._open_candles.get(key, (None, 0))
+            keep = limit - 1 if open_candle else limit
+            # อ่าน memmap ภายใต้ล็อก: thread อื่นอาจเขียนไฟล์ใหม่และปิด map นี้
+            rows = self._read(key)[-keep:].tolist() if keep > 0 else []
+
+        for row in rows:
+            row[0] = int(row[0])
+        if open_candle:
+            rows.append(list(open_candle))
+        return rows[-limit:]
+
+    def get_closed(self, symbol: str, timeframe: str, limit: int = 720) -> np.ndarray:
+        """Return the last ``limit`` closed candles as an (n, 6) float64 array"""
+        symbol = to_ccxt_symbol(symbol)
+        key = (symbol, timeframe)
+        with self._lock_for(key):
+            self._sync(key, limit + 1)
+            return np.array(self._read(key)[-limit:])
+
+    # ------------------------------------------------------------------
+    # sync
+    # ------------------------------------------------------------------
+    def _sync(self, key: Tuple[str, str], limit: int):
+        symbol, timeframe = key
+        tf_ms = timeframe_to_ms(timeframe)
+        now_ms = int(time.time() * 1000)
+        fetch_limit = min(limit, self.max_fetch)
+
+        closed = self._read(key)
+        stored = len(closed)
+        last_ts = int(closed[-1, 0]) if stored else None
+        del closed  # ไม่ถือ view ของ map ไว้ระหว่างที่ไฟล์อาจถูกเขียนใหม่
+        open_candle, fetched_at = self._open_candles.get(key, (None, 0))
+
+        if stored and (stored >= fetch_limit - 1 or key in self._exhausted):
+            candle_still_open = open_candle is not None and candle_close_ms(timeframe, open_candle[0]) > now_ms
+            if candle_still_open and time.time() - fetched_at < self.refresh_interval:
+                return
+
+            missing = (now_ms - last_ts) // tf_ms
+            if missing <= self.max_fetch:
+                # แท่งถัดไปหลัง last_ts (เดือนยาวไม่เท่ากัน จึงไม่บวก tf_ms)
+                since = candle_close_ms(timeframe, last_ts)
+                rows = self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=self.max_fetch)
+                self._store_rows(key, rows, now_ms, timeframe, last_ts=last_ts)
+                return
+
+        # ยังไม่มีข้อมูล / ข้อมูลน้อยกว่าที่ขอ / หายไปนานเกินไป -> โหลดใหม่ทั้งชุด
+        rows = self.exchange.fetch_ohlcv(symbol, timeframe, limit=fetch_limit)
+        if len(rows) < fetch_limit:
+            self._exhausted.add(key)
+        else:
+            self._exhausted.discard(key)
+        self._store_rows(key, rows, now_ms, timeframe, last_ts=None)
+
+    def _store_rows(self, key, rows, now_ms, timeframe, last_ts=None):
+        closed_rows = [r for r in rows if candle_close_ms(timeframe, r[0]) <= now_ms]
+        open_rows = [r for r in rows if candle_close_ms(timeframe, r[0]) > now_ms]
+
+        if last_ts is None:
+            self._write(key, closed_rows, append=False)
+        else:
+            self._write(key, [r for r in closed_rows if r[0] > last_ts], append=True)
+
+        self._open_candles[key] = (open_rows[-1] if open_rows else None, time.time())
+        logger.debug(f"Synced {key}: +{len(closed_rows)} closed candles")
+
+    # ------------------------------------------------------------------
+    # storage
+    # ------------------------------------------------------------------
+    def _path(self, key: Tuple[str, str]) -> str:
+        symbol, timeframe = key
+        return os.path.join(self.base_dir, f"{normalize_symbol(symbol)}_{timeframe}.bin")
+
+    def _read(self, key: Tuple[str, str]) -> np.ndarray:
+        path = self._path(key)
+        if not os.path.exists(path):
+            self._close(key)
+            return np.empty((0, ROW_FIELDS))
+
+        size = os.path.getsize(path)
+        rows = size // ROW_BYTES
+        data = self._maps.get(key)
+        if data is not None and len(data) == rows and not size % ROW_BYTES:
+            return data
+
+        self._close(key)
+        if size % ROW_BYTES:
+            # เขียนไม่ครบจากการปิดโปรแกรมกลางคัน ตัดแถวที่ไม่สมบูรณ์ทิ้ง
+            logger.warning(f"Truncating partial row in {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(rows * ROW_BYTES)
+        if rows == 0:
+            return np.empty((0, ROW_FIELDS))
+
+        if rows > self.max_rows:
+            with open(path, 'rb') as f:
+                f.seek((rows - self.max_rows) * ROW_BYTES)
+                tail = np.frombuffer(f.read(), dtype=np.float64)
+            self._write(key, tail, append=False)
+            rows = self.max_rows
+
+        data = self._maps[key] = np.memmap(path, dtype=np.float64, mode='r', shape=(rows, ROW_FIELDS))
+        return data
+
+    def _close(self, key: Tuple[str, str]):
+        """Unmap the cached map of ``key``; callers only use it under the key's lock"""
+        data = self._maps.pop(key, None)
+        if data is not None and data._mmap is not None:
+            data._mmap.close()
+
+    def _write(self, key: Tuple[str, str], rows, append: bool):
+        if not append:
+            os.makedirs(self.base_dir, exist_ok=True)
+        elif len(rows) == 0:
+            return
+
+        data = np.asarray(rows, dtype=np.float64).reshape(-1, ROW_FIELDS)
+        path = self._path(key)
+        if append:
+            with open(path, 'ab') as f:
+                f.write(data.tobytes())
+        else:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data.tobytes())
+            # ปิด map ของไฟล์เดิมก่อนแทนที่ (Windows แทนที่ไฟล์ที่ยัง map อยู่ไม่ได้)
+            self._close(key)
+            os.replace(tmp_path, path)
+
+    def _lock_for(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+
+# Global instance
+candle_store = CandleStore()
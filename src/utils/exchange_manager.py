@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, Optional
+
+from src.utils.rest_scheduler import ScheduledExchange, get_rest_scheduler
+from src.utils.startup_profiler import lazy_import
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_ID = os.getenv("EXCHANGE_ID", "binance")
+MARKETS_CACHE_DIR = os.getenv(
+    "MARKETS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "database", "markets"),
+)
+MARKETS_CACHE_TTL = float(os.getenv("MARKETS_CACHE_TTL", 24 * 3600))
+
+
+class ExchangeManager:
+    """One ccxt exchange instance shared by the whole process.
+
+    The instance keeps its HTTP session (and connection pool) for the
+    lifetime of the process and loads markets once. Market metadata is
+    saved to ``<cache_dir>/<exchange_id>.json``; on startup it is loaded
+    from there straight away, and refreshed from the exchange in the
+    background when older than ``markets_ttl``.
+    """
+
+    def __init__(self, exchange_id: str = EXCHANGE_ID, cache_dir: str = MARKETS_CACHE_DIR,
+                 markets_ttl: float = MARKETS_CACHE_TTL, config: Optional[dict] = None):
+        self.exchange_id = exchange_id
+        self.cache_path = os.path.join(cache_dir, f"{exchange_id}.json")
+        self.markets_ttl = markets_ttl
+        self.config = {"enableRateLimit": True, **(config or {})}
+        self._exchange = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.markets_source: Optional[str] = None  # 'disk' | 'exchange'
+        self.markets_loaded_at: Optional[float] = None
+        self.market_loads = 0
+
+    @property
+    def exchange(self):
+        if self._exchange is None:
+            with self._lock:
+                if self._exchange is None:
+                    # ccxt โหลดตอนต้องใช้ exchange ครั้งแรก
+                    exchange = getattr(lazy_import("ccxt"), self.exchange_id)(self.config)
+                    self._prime_markets(exchange)
+                    self._exchange = exchange
+        return self._exchange
+
+    def load_markets(self, reload: bool = False) -> Dict:
+        """Markets of the shared instance; ``reload=True`` fetches them from the exchange and re-saves the cache"""
+        exchange = self.exchange
+        if reload or not exchange.markets:
+            self._fetch_markets(exchange)
+        return exchange.markets
+
+    def get_stats(self) -> Dict:
+        return {
+            'exchange': self.exchange_id,
+            'created': self._exchange is not None,
+            'markets': len(self._exchange.markets or {}) if self._exchange is not None else 0,
+            'markets_source': self.markets_source,
+            'markets_age': round(time.time() - self.markets_loaded_at, 1) if self.markets_loaded_at else None,
+            'market_loads': self.market_loads,
+        }
+
+    def _prime_markets(self, exchange):
+        cached = self._read_cache()
+        if cached is None:
+            try:
+                self._fetch_markets(exchange)
+            except Exception as e:
+                # ccxt จะลอง load_markets เองอีกครั้งตอนเรียก API ครั้งถัดไป
+                logger.warning(f"Loading {self.exchange_id} markets failed: {e}")
+            return
+        exchange.set_markets(cached['markets'], cached.get('currencies'))
+        self.markets_source = 'disk'
+        self.markets_loaded_at = cached['saved_at']
+        if time.time() - cached['saved_at'] > self.markets_ttl:
+            self._refresh_in_background(exchange)
+
+    def _refresh_in_background(self, exchange):
+        if self._refreshing:
+            return
+        self._refreshing = True
+
+        def refresh():
+            try:
+                self._fetch_markets(exchange)
+            except Exception as e:
+                logger.warning(f"Refreshing {self.exchange_id} markets failed, keeping cached copy: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _fetch_markets(self, exchange):
+        exchange.load_markets(reload=True)
+        self.market_loads += 1
+        self.markets_source = 'exchange'
+        self.markets_loaded_at = time.time()
+        self._write_cache(exchange)
+
+    def _read_cache(self) -> Optional[dict]:
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            if cached.get('markets'):
+                return cached
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable markets cache {self.cache_path}: {e}")
+        return None
+
+    def _write_cache(self, exchange):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    'saved_at': self.markets_loaded_at,
+                    'markets': exchange.markets,
+                    'currencies': exchange.currencies,
+                }, f)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not save markets cache {self.cache_path}: {e}")
+
+
+# Global instance
+exchange_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_exchange_manager() -> ExchangeManager:
+    global exchange_manager
+    with _manager_lock:
+        if exchange_manager is None:
+            exchange_manager = ExchangeManager()
+        return exchange_manager
+
+
+def get_exchange():
+    """The process-wide ccxt exchange; its REST calls go through the shared RestScheduler"""
+    return ScheduledExchange(get_exchange_manager().exchange, get_rest_scheduler())
@@ -0,0 +1,129 @@
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+
+# ลำดับคอลัมน์ต้องตรงกับที่ใช้ตอน train โมเดล
+FEATURES = ["close", "return", "ma", "std", "vol_avg"]
+WINDOW = 12
+
+
+def future_periods_for(timeframe: str) -> int:
+    """How many candles ahead the target looks for a given timeframe"""
+    return 24 if timeframe == "1h" else (6 if timeframe == "4h" else 1)
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum of the trailing ``window`` values at each index (NaN until the window fills)"""
+    out = np.full(len(values), np.nan)
+    if len(values) < window:
+        return out
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    out[window - 1:] = csum[window:] - csum[:-window]
+    return out
+
+
+def compute_features(ohlcv, window: int = WINDOW) -> np.ndarray:
+    """Compute the FEATURES columns for every row of an (n, 6) OHLCV array.
+
+    Rolling mean/std/volume use running sums instead of pandas ``rolling()``;
+    std is the sample std (ddof=1), matching pandas. Rows without a full
+    window are NaN.
+    """
+    data = np.asarray(ohlcv, dtype=np.float64)
+    close = data[:, 4]
+    volume = data[:, 5]
+
+    ret = np.full(len(close), np.nan)
+    ret[1:] = close[1:] / close[:-1] - 1.0
+
+    # เลื่อนค่าด้วยราคาแรก ลด cancellation ตอนคำนวณ variance จาก sum of squares
+    shifted = close - close[0] if len(close) else close
+    sum_x = _rolling_sum(shifted, window)
+    sum_x2 = _rolling_sum(shifted * shifted, window)
+    ma = sum_x / window + (close[0] if len(close) else 0.0)
+    var = (sum_x2 - sum_x * sum_x / window) / (window - 1)
+    std = np.sqrt(np.maximum(var, 0.0))
+
+    vol_avg = _rolling_sum(volume, window) / window
+
+    return np.column_stack((close, ret, ma, std, vol_avg))
+
+
+def build_training_set(ohlcv, timeframe: str, window: int = WINDOW) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (X, y) where y is 1 if close rises ``future_periods_for(timeframe)`` candles later.
+
+    Rows with incomplete features or no future close are dropped, so
+    ``X[-1:]`` is the most recent row the model can be evaluated on.
+    """
+    features = compute_features(ohlcv, window)
+    close = features[:, 0]
+    periods = future_periods_for(timeframe)
+
+    end = len(close) - periods
+    start = window - 1
+    if end <= start:
+        return np.empty((0, len(FEATURES))), np.empty(0, dtype=int)
+
+    X = features[start:end]
+    y = (close[start + periods:end + periods] > close[start:end]).astype(int)
+    return X, y
+
+
+class FeatureState:
+    """Incremental version of compute_features: O(1) per appended candle"""
+
+    # รวมผลใหม่ทุก ๆ N แท่ง กัน floating-point error สะสมจากการบวกลบต่อเนื่อง
+    RESUM_EVERY = 1024
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.closes = deque(maxlen=window)
+        self.volumes = deque(maxlen=window)
+        self.prev_close: Optional[float] = None
+        self.sum_close = 0.0
+        self.sum_close_sq = 0.0
+        self.sum_volume = 0.0
+        self._appends = 0
+
+    @classmethod
+    def from_ohlcv(cls, ohlcv, window: int = WINDOW) -> "FeatureState":
+        state = cls(window)
+        for row in np.asarray(ohlcv, dtype=np.float64)[-(window + 1):]:
+            state.append(row[4], row[5])
+        return state
+
+    def append(self, close: float, volume: float) -> np.ndarray:
+        """Add one closed candle and return its feature row"""
+        close = float(close)
+        volume = float(volume)
+        if len(self.closes) == self.window:
+            old_close = self.closes[0]
+            self.sum_close -= old_close
+            self.sum_close_sq -= old_close * old_close
+            self.sum_volume -= self.volumes[0]
+
+        self.closes.append(close)
+        self.volumes.append(volume)
+        self.sum_close += close
+        self.sum_close_sq += close * close
+        self.sum_volume += volume
+        self.prev_close = close
+
+        self._appends += 1
+        if self._appends % self.RESUM_EVERY == 0:
+            self.sum_close = sum(self.closes)
+            self.sum_close_sq = sum(c * c for c in self.closes)
+            self.sum_volume = sum(self.volumes)
+
+        return self.current()
+
+    def current(self) -> np.ndarray:
+        n = self.window
+        if len(self.closes) < n:
+            return np.array([self.prev_close, np.nan, np.nan, np.nan, np.nan])
+
+        ma = self.sum_close / n
+        var = max((self.sum_close_sq - self.sum_close * ma) / (n - 1), 0.0)
+        ret = self.closes[-1] / self.closes[-2] - 1.0
+        return np.array([self.closes[-1], ret, ma, np.sqrt(var), self.sum_volume / n])
@@ -1,7 +1,7 @@
-import ccxt
 import random
 import time
 from datetime import datetime
+from src.utils.exchange_manager import get_exchange as get_shared_exchange
 
 class MockExchange:
     """Mock exchange for testing when Binance API is not available"""
@@ -65,21 +65,7 @@ class MockExchange:
         return ohlcv_data
 
 def get_exchange(use_mock=False):
-    """Get exchange instance - mock or real"""
+    """Get exchange instance - mock or the shared real one"""
     if use_mock:
         return MockExchange()
-    else:
-        try:
-            exchange = ccxt.binance({
-                "sandbox": False,
-                "rateLimit": 1200,
-                "enableRateLimit": True,
-            })
-            # Test connection
-            exchange.fetch_ticker('BTC/USDT')
-            return exchange
-        except Exception as e:
-            print(f"Binance API error: {e}")
-            print("Falling back to mock exchange...")
-            return MockExchange()
-
+    return get_shared_exchange()
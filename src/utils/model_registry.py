@@ -0,0 +1,155 @@
+import os
+import threading
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from src.utils.offload import blocking_executor, gevent_patched
+from src.utils.startup_profiler import lazy_import
+
+logger = logging.getLogger(__name__)
+
+
+def fit_model(X, y, n_jobs: Optional[int] = None) -> Tuple["XGBClassifier", float]:
+    """Train the direction classifier and score it on the last 20% of rows"""
+    # sklearn/xgboost (~1 วินาที) โหลดตอน train ครั้งแรก ไม่ใช่ตอน start server
+    model_selection = lazy_import("sklearn.model_selection")
+    metrics = lazy_import("sklearn.metrics")
+    xgboost = lazy_import("xgboost")
+
+    X_train, X_test, y_train, y_test = model_selection.train_test_split(X, y, shuffle=False, test_size=0.2)
+    model = xgboost.XGBClassifier(random_state=42, n_estimators=100, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    accuracy = metrics.accuracy_score(y_test, model.predict(X_test))
+    return model, float(accuracy)
+
+
+def estimate_model_bytes(model) -> int:
+    """Approximate in-memory size of a fitted XGBoost model"""
+    try:
+        return len(model.get_booster().save_raw())
+    except Exception:
+        return 1024 * 1024
+
+
+class ModelRegistry:
+    """LRU cache of fitted models keyed by (symbol, timeframe, last closed candle time).
+
+    A model is only retrained when a new candle closes for its
+    (symbol, timeframe); older entries for the same pair are dropped on
+    insert. Entries are evicted least-recently-used first once either
+    ``max_entries`` or ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, dict]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._train_locks: Dict[Hashable, list] = {}  # pair -> [lock, จำนวน thread ที่ใช้อยู่/รออยู่]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, symbol: str, timeframe: str, candle_time: int):
+        key = (symbol, timeframe, candle_time)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['model'], entry['accuracy']
+
+    def put(self, symbol: str, timeframe: str, candle_time: int, model, accuracy: float):
+        key = (symbol, timeframe, candle_time)
+        size = estimate_model_bytes(model)
+        with self._lock:
+            # โมเดลของแท่งเก่าใช้ไม่ได้แล้ว ลบทิ้งทันที
+            for old_key in [k for k in self._entries if k[:2] == key[:2] and k != key]:
+                self._remove(old_key)
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = {'model': model, 'accuracy': accuracy, 'bytes': size}
+            self._total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                evicted, _ = next(iter(self._entries.items()))
+                self._remove(evicted)
+                logger.debug(f"Evicted model {evicted}")
+
+    def get_or_train(self, symbol: str, timeframe: str, candle_time: int,
+                     train_fn: Callable[[], Tuple[object, float]]) -> Tuple[object, float, bool]:
+        """Return (model, accuracy, cache_hit), training at most once per key"""
+        cached = self.get(symbol, timeframe, candle_time)
+        if cached:
+            return cached[0], cached[1], True
+
+        with self._training((symbol, timeframe)):
+            # อาจมี thread อื่น train เสร็จระหว่างรอ lock
+            cached = self.get(symbol, timeframe, candle_time)
+            if cached:
+                return cached[0], cached[1], True
+
+            with self._lock:
+                self.misses += 1
+            model, accuracy = train_fn()
+            self.put(symbol, timeframe, candle_time, model, accuracy)
+            logger.info(f"Trained model for {symbol} {timeframe} @ {candle_time}")
+            return model, accuracy, False
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry['bytes']
+
+    @contextmanager
+    def _training(self, pair):
+        """Hold the pair's training lock; the lock is dropped when no thread uses it any more"""
+        with self._lock:
+            slot = self._train_locks.setdefault(pair, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._train_locks[pair]
+
+
+# Global instance
+model_registry = ModelRegistry()
+
+_training_pool = None
+_training_pool_lock = threading.Lock()
+
+
+def get_training_pool(max_workers: Optional[int] = None) -> Executor:
+    """Shared process pool for CPU-bound training (created on first use)"""
+    global _training_pool
+    if gevent_patched():
+        # ใต้ gevent ตัวจัดการของ process pool จะกลายเป็น greenlet ที่บล็อก loop -> ใช้ native thread แทน
+        return blocking_executor()
+    with _training_pool_lock:
+        if _training_pool is None or getattr(_training_pool, '_broken', False):
+            # ไม่ใช้ fork เพราะ process หลักมี thread ของ websocket/background task อยู่แล้ว
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            ctx = multiprocessing.get_context(method)
+            if method == 'forkserver':
+                ctx.set_forkserver_preload([__name__])
+            _training_pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), mp_context=ctx)
+            logger.info(f"Started training pool ({method})")
+        return _training_pool
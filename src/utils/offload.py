@@ -0,0 +1,69 @@
+import os
+import threading
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def gevent_patched() -> bool:
+    """True when running under the gevent server (serve.py monkey-patches the stdlib)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def native_executor(max_workers: int, thread_name_prefix: str = '') -> Executor:
+    """Thread pool whose workers are real OS threads, even when threading is monkey-patched"""
+    if gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+
+def blocking_executor() -> Executor:
+    """Shared executor for work that must not run on the event loop.
+
+    Under gevent this is gevent's ThreadPoolExecutor, which always uses
+    native OS threads and whose futures wait cooperatively; otherwise a
+    regular ThreadPoolExecutor.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv("BLOCKING_WORKERS", os.cpu_count() or 4))
+            _executor = native_executor(workers, thread_name_prefix='blocking')
+        return _executor
+
+
+def on_event_loop() -> bool:
+    """True when called from the OS thread running the gevent hub (the web server)"""
+    if not gevent_patched():
+        return False
+    from gevent import monkey
+    get_native_id = monkey.get_original('_thread', 'get_native_id')
+    return get_native_id() == threading.main_thread().native_id
+
+
+def run_blocking(fn: Callable, *args, **kwargs):
+    """Call ``fn`` on a native worker thread when on the gevent loop, or inline otherwise"""
+    if not on_event_loop():
+        return fn(*args, **kwargs)
+    return blocking_executor().submit(fn, *args, **kwargs).result()
+
+
+def start_native_thread(target: Callable, *args):
+    """Start a long-running daemon on a real OS thread, even when threading is monkey-patched"""
+    if gevent_patched():
+        from gevent import monkey
+        start_new_thread = monkey.get_original('_thread', 'start_new_thread')
+        return start_new_thread(target, args)
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
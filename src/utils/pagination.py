@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Opaque cursor for the sort key of the last row of a page"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("cursor ไม่ถูกต้อง")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("cursor ไม่ถูกต้อง")
+    return [
+        datetime.fromisoformat(v) if v is not None and col.type.python_type is datetime else v
+        for col, v in zip(columns, values)
+    ]
+
+
+def page_size(value: Optional[str]) -> int:
+    return min(max(int(value or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+
+
+def keyset_page(query, columns: Sequence, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """Newest-first page of ``query`` ordered by ``columns`` (unique together, e.g. ``(created_at, id)``).
+
+    Rows after ``cursor`` are found with a row-value comparison that an
+    index on the same columns answers directly, so every page costs the
+    same no matter how deep it is. Returns ``(rows, next_cursor)``;
+    ``next_cursor`` is None on the last page.
+    """
+    if cursor:
+        query = query.filter(tuple_(*columns) < tuple_(*decode_cursor(cursor, columns)))
+    rows = query.order_by(*[col.desc() for col in columns]).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], col.key) for col in columns])
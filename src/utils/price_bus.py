@@ -0,0 +1,128 @@
+import threading
+import time
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+from src.utils.exchange_manager import get_exchange
+from src.utils.symbols import normalize_symbol, to_ccxt_symbol
+
+logger = logging.getLogger(__name__)
+
+
+class PriceBus:
+    """Thread-safe latest-price table with pub/sub, fed by the Binance WebSocket client.
+
+    Every publish bumps a per-symbol sequence number. Readers get the last
+    tick from memory; ``get_price``/``get_prices`` only fall back to a REST
+    ``fetch_ticker(s)`` call when the entry is missing or older than
+    ``max_age`` seconds.
+    """
+
+    def __init__(self, max_age: float = 5.0, exchange_factory=None):
+        self.max_age = max_age
+        self._exchange_factory = exchange_factory or get_exchange
+        self._exchange = None
+        self._prices: Dict[str, dict] = {}
+        self._subscribers: Dict[int, tuple] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+    @property
+    def exchange(self):
+        if self._exchange is None:
+            self._exchange = self._exchange_factory()
+        return self._exchange
+
+    def publish(self, symbol: str, price: float, change_24h: Optional[float] = None,
+                volume: Optional[float] = None, source: str = 'binance_ws',
+                timestamp: Optional[float] = None) -> int:
+        """Store a new price and notify subscribers; returns the symbol's sequence number"""
+        symbol = normalize_symbol(symbol)
+        with self._lock:
+            previous = self._prices.get(symbol)
+            entry = {
+                'symbol': symbol,
+                'price': float(price),
+                'change_24h': change_24h if change_24h is not None else (previous or {}).get('change_24h'),
+                'volume': volume if volume is not None else (previous or {}).get('volume'),
+                'timestamp': timestamp or time.time(),
+                'seq': (previous['seq'] + 1) if previous else 1,
+                'source': source,
+            }
+            self._prices[symbol] = entry
+            callbacks = [cb for sym, cb in self._subscribers.values() if sym is None or sym == symbol]
+
+        for callback in callbacks:
+            try:
+                callback(dict(entry))
+            except Exception as e:
+                logger.error(f"Error in price bus subscriber for {symbol}: {e}")
+        return entry['seq']
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[dict]:
+        """Latest entry for ``symbol`` (with its ``age`` in seconds), or None if missing/stale"""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            entry = self._prices.get(normalize_symbol(symbol))
+            if entry is None:
+                return None
+            entry = dict(entry)
+        entry['age'] = time.time() - entry['timestamp']
+        return entry if entry['age'] <= max_age else None
+
+    def get_price(self, symbol: str, max_age: Optional[float] = None, fallback: bool = True) -> Optional[float]:
+        entry = self.get(symbol, max_age)
+        if entry:
+            return entry['price']
+        if not fallback:
+            return None
+        try:
+            ticker = self.exchange.fetch_ticker(to_ccxt_symbol(symbol))
+            self.publish(symbol, ticker['last'], change_24h=ticker.get('percentage'), source='rest')
+            return float(ticker['last'])
+        except Exception as e:
+            logger.error(f"Error fetching fallback price for {symbol}: {e}")
+            return None
+
+    def get_prices(self, symbols: Iterable[str], max_age: Optional[float] = None,
+                   fallback: bool = True) -> Dict[str, float]:
+        """Prices keyed by normalized symbol; stale ones are refreshed with one fetch_tickers call"""
+        prices, stale = {}, []
+        for symbol in {normalize_symbol(s) for s in symbols}:
+            entry = self.get(symbol, max_age)
+            if entry:
+                prices[symbol] = entry['price']
+            else:
+                stale.append(symbol)
+
+        if stale and fallback:
+            try:
+                tickers = self.exchange.fetch_tickers([to_ccxt_symbol(s) for s in stale])
+                for ticker in tickers.values():
+                    if ticker.get('last') is None:
+                        continue
+                    symbol = normalize_symbol(ticker['symbol'])
+                    self.publish(symbol, ticker['last'], change_24h=ticker.get('percentage'), source='rest')
+                    prices[symbol] = float(ticker['last'])
+            except Exception as e:
+                logger.error(f"Error fetching fallback prices for {stale}: {e}")
+        return prices
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {symbol: dict(entry) for symbol, entry in self._prices.items()}
+
+    def subscribe(self, callback: Callable[[dict], None], symbol: Optional[str] = None) -> int:
+        """Call ``callback(entry)`` on every publish (for one symbol, or all when None)"""
+        with self._lock:
+            self._next_token += 1
+            self._subscribers[self._next_token] = (normalize_symbol(symbol) if symbol else None, callback)
+            return self._next_token
+
+    def unsubscribe(self, token: int):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+
+# Global instance
+price_bus = PriceBus()
@@ -1,25 +1,47 @@
+import json
+import os
 import requests
 import time
 import logging
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from src.utils.price_bus import price_bus
+from src.utils.offload import native_executor
+from src.utils.rest_scheduler import current_lane, get_rest_scheduler
+from src.utils.swr_cache import SWRCache
+from src.utils.symbols import normalize_symbol
 
 logger = logging.getLogger(__name__)
 
+BINANCE_API = "https://api.binance.com/api/v3"
+COINGECKO_API = "https://api.coingecko.com/api/v3"
+PRICE_REQUEST_TIMEOUT = float(os.getenv("PRICE_REQUEST_TIMEOUT", 5))
+PRICE_FETCH_TIMEOUT = float(os.getenv("PRICE_FETCH_TIMEOUT", 5))
+# Binance ยังไม่ตอบภายในเวลานี้ -> ยิง CoinGecko คู่ขนาน
+PRICE_HEDGE_DELAY = float(os.getenv("PRICE_HEDGE_DELAY", 0.5))
+PRICE_CACHE_SIZE = int(os.getenv("PRICE_CACHE_SIZE", 1024))
+PRICE_REFRESH_MIN = float(os.getenv("PRICE_REFRESH_MIN", 2))
+PRICE_REFRESH_MAX = float(os.getenv("PRICE_REFRESH_MAX", 60))
+# เก่ากว่านี้ไม่ส่งให้ผู้เรียน ดึงใหม่ทันที
+PRICE_MAX_STALE = float(os.getenv("PRICE_MAX_STALE", 300))
+
 class RealTimePriceService:
     """Real-time price service with multiple sources and fallback"""
     
     def __init__(self, socketio=None):
         self.socketio = socketio
-        self.price_cache = {}
-        self.last_update = {}
+        # ราคาเก่าส่งกลับทันที แล้วให้ thread เบื้องหลัง refresh ตามความถี่ที่ถูกอ่าน
+        self.cache = SWRCache(self._fetch_prices, max_entries=PRICE_CACHE_SIZE,
+                              min_interval=PRICE_REFRESH_MIN, max_interval=PRICE_REFRESH_MAX,
+                              max_stale=PRICE_MAX_STALE, name='price-cache')
         
-        # Price sources in order of preference
-        self.price_sources = [
-            ('binance', self._get_binance_price),
-            ('coingecko', self._get_coingecko_price),
-            ('mock', self._get_mock_price)
-        ]
+        # ทุก source ใช้ keep-alive session เดียวกัน, ยิงพร้อมกันได้ผ่าน executor
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8))
+        self._executor = native_executor(4, thread_name_prefix='price-fetch')
+        self.hedges = 0
         
         # Symbol mapping for different APIs
         self.symbol_mapping = {
@@ -50,60 +72,73 @@ class RealTimePriceService:
     
     def get_current_price(self, symbol: str) -> Tuple[Optional[float], str]:
         """Get current price from multiple sources with fallback"""
-        
-        # Check cache first (valid for 5 seconds)
-        if symbol in self.price_cache:
-            cache_time = self.last_update.get(symbol, 0)
-            if time.time() - cache_time < 5:
-                return self.price_cache[symbol], 'cache'
-        
-        # Try each price source
-        for source_name, source_func in self.price_sources:
-            try:
-                price = source_func(symbol)
-                if price:
-                    # Update cache
-                    self.price_cache[symbol] = price
-                    self.last_update[symbol] = time.time()
-                    logger.info(f"Got price for {symbol}: {price} from {source_name}")
-                    return price, source_name
-            except Exception as e:
-                logger.warning(f"Failed to get price from {source_name}: {e}")
-                continue
-        
-        logger.error(f"Failed to get price for {symbol} from all sources")
-        return None, 'none'
-    
-    def _get_binance_price(self, symbol: str) -> Optional[float]:
-        """Get price from Binance API"""
-        binance_symbol = self.symbol_mapping['binance'].get(symbol)
-        if not binance_symbol:
-            return None
-            
-        url = f"https://api.binance.com/api/v3/ticker/price?symbol={binance_symbol}"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return float(data['price'])
-        else:
+        result = self.get_multiple_prices([symbol]).get(symbol)
+        if result is None:
+            logger.error(f"Failed to get price for {symbol} from all sources")
+            return None, 'none'
+        return result['price'], result['source']
+
+    def _binance_symbol(self, symbol: str) -> str:
+        return self.symbol_mapping['binance'].get(symbol) or normalize_symbol(symbol)
+
+    def _fetch_binance_bulk(self, symbols: List[str], lane: int) -> Dict[str, float]:
+        """All prices in one ticker/price request (all-market request if a symbol is unknown to Binance)"""
+        by_id = {self._binance_symbol(s): s for s in symbols}
+        url = f"{BINANCE_API}/ticker/price"
+        get_rest_scheduler().acquire(4, lane)
+        response = self.session.get(url, params={'symbols': json.dumps(sorted(by_id), separators=(',', ':'))},
+                                    timeout=PRICE_REQUEST_TIMEOUT)
+        if response.status_code == 400:
+            # symbol ที่ Binance ไม่รู้จักทำให้ทั้ง request ล้ม -> ดึงทุกคู่แล้วกรองเอง
+            get_rest_scheduler().acquire(4, lane)
+            response = self.session.get(url, timeout=PRICE_REQUEST_TIMEOUT)
+        if response.status_code != 200:
             raise Exception(f"Binance API error: {response.status_code}")
-    
-    def _get_coingecko_price(self, symbol: str) -> Optional[float]:
-        """Get price from CoinGecko API"""
-        coingecko_id = self.symbol_mapping['coingecko'].get(symbol)
-        if not coingecko_id:
-            return None
-            
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={coingecko_id}&vs_currencies=usd"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return float(data[coingecko_id]['usd'])
-        else:
+        return {by_id[item['symbol']]: float(item['price']) for item in response.json() if item['symbol'] in by_id}
+
+    def _fetch_coingecko_bulk(self, symbols: List[str]) -> Dict[str, float]:
+        """Prices of all mapped symbols in one simple/price request"""
+        by_id = {self.symbol_mapping['coingecko'][s]: s for s in symbols if s in self.symbol_mapping['coingecko']}
+        if not by_id:
+            return {}
+        response = self.session.get(f"{COINGECKO_API}/simple/price",
+                                    params={'ids': ','.join(sorted(by_id)), 'vs_currencies': 'usd'},
+                                    timeout=PRICE_REQUEST_TIMEOUT)
+        if response.status_code != 200:
             raise Exception(f"CoinGecko API error: {response.status_code}")
-    
+        return {by_id[cg_id]: float(data['usd']) for cg_id, data in response.json().items()
+                if cg_id in by_id and 'usd' in data}
+
+    def _fetch_hedged(self, symbols: List[str]) -> Dict[str, Tuple[float, str]]:
+        """Binance first; CoinGecko joins for the missing symbols if Binance is slow, fails or lacks some"""
+        lane = current_lane()
+        results: Dict[str, Tuple[float, str]] = {}
+        pending = {self._executor.submit(self._fetch_binance_bulk, symbols, lane): 'binance'}
+        hedged = False
+        deadline = time.monotonic() + PRICE_FETCH_TIMEOUT
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining if hedged else min(PRICE_HEDGE_DELAY, remaining),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    for symbol, price in future.result().items():
+                        results.setdefault(symbol, (price, source))
+                except Exception as e:
+                    logger.warning(f"Failed to get prices from {source}: {e}")
+
+            missing = [s for s in symbols if s not in results]
+            if not missing:
+                break
+            if not hedged:
+                hedged = True
+                self.hedges += 1
+                pending[self._executor.submit(self._fetch_coingecko_bulk, missing)] = 'coingecko'
+        return results
+
     def _get_mock_price(self, symbol: str) -> Optional[float]:
         """Get mock price with slight random variation"""
         import random
@@ -121,21 +156,39 @@ class RealTimePriceService:
         
         return round(price, 8)
     
+    def _fetch_prices(self, symbols: List[str]) -> Dict[str, Tuple[float, str]]:
+        """SWRCache loader: one hedged bulk fetch, real prices only"""
+        # symbol ที่ดึงไม่ได้ไม่ใส่ค่า -> cache เก็บราคาจริงตัวเดิมไว้และลองใหม่รอบหน้า
+        return self._fetch_hedged(symbols)
+
     def get_multiple_prices(self, symbols: list) -> Dict[str, dict]:
-        """Get prices for multiple symbols"""
+        """Get prices for multiple symbols with their age in seconds and whether they are stale"""
         results = {}
-        
+        timestamp = datetime.now().isoformat()
+        missing = []
         for symbol in symbols:
-            price, source = self.get_current_price(symbol)
-            if price:
-                results[symbol] = {
-                    'price': price,
-                    'source': source,
-                    'timestamp': datetime.now().isoformat()
-                }
-        
+            # ราคาสดจาก Binance WebSocket ก่อน
+            entry = price_bus.get(symbol)
+            if entry:
+                results[symbol] = {'price': entry['price'], 'source': entry['source'], 'timestamp': timestamp,
+                                   'age': round(entry['age'], 3), 'stale': False}
+            else:
+                missing.append(symbol)
+
+        for symbol, cached in self.cache.get_many(missing).items():
+            price, source = cached['value']
+            results[symbol] = {'price': price, 'source': source, 'timestamp': timestamp,
+                               'age': cached['age'], 'stale': cached['stale']}
+
+        # ยังไม่เคยมีราคาจริงเลย: ใช้ mock เฉพาะคำตอบนี้ ไม่เก็บลง cache
+        for symbol in missing:
+            if symbol not in results:
+                price = self._get_mock_price(symbol)
+                if price:
+                    results[symbol] = {'price': price, 'source': 'mock', 'timestamp': timestamp,
+                                       'age': None, 'stale': True}
         return results
-    
+
     def broadcast_price_updates(self, symbols: list):
         """Broadcast price updates via WebSocket"""
         if not self.socketio:
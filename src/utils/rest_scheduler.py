@@ -0,0 +1,275 @@
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from flask import has_request_context
+
+from src.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Binance spot: 6000 weight ต่อนาทีต่อ IP ใช้ไม่เกิน budget นี้ (เผื่อ process อื่น/เว็บ)
+REST_WEIGHT_PER_MINUTE = float(os.getenv("REST_WEIGHT_PER_MINUTE", 4800))
+# ส่วนของ budget ที่ background job แตะไม่ได้ (กันไว้ให้ request ของผู้ใช้)
+REST_INTERACTIVE_RESERVE = float(os.getenv("REST_INTERACTIVE_RESERVE", 0.2))
+REST_RATE_LIMIT_COOLDOWN = float(os.getenv("REST_RATE_LIMIT_COOLDOWN", 10))
+
+INTERACTIVE = 0
+BACKGROUND = 1
+LANES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+# น้ำหนัก request ของ Binance ต่อ method ของ ccxt
+METHOD_WEIGHTS = {
+    'fetch_ticker': 2,
+    'fetch_ohlcv': 2,
+    'fetch_order_book': 5,
+    'fetch_trades': 25,
+    'fetch_balance': 20,
+    'load_markets': 20,
+}
+DEFAULT_WEIGHT = 5
+DEDUP_METHODS = {'fetch_ticker', 'fetch_tickers', 'fetch_ohlcv'}
+
+_priority = contextvars.ContextVar('rest_priority', default=None)
+
+
+def current_lane() -> int:
+    """Explicit rest_priority(), else INTERACTIVE inside a Flask request and BACKGROUND elsewhere"""
+    lane = _priority.get()
+    if lane is not None:
+        return lane
+    return INTERACTIVE if has_request_context() else BACKGROUND
+
+
+@contextmanager
+def rest_priority(lane: int):
+    token = _priority.set(lane)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def interactive(fn: Callable) -> Callable:
+    """Wrap ``fn`` so the exchange calls it makes use the interactive lane (e.g. on a worker thread)"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with rest_priority(INTERACTIVE):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def request_weight(method: str, args: tuple, kwargs: dict) -> float:
+    if method == 'fetch_tickers':
+        symbols = args[0] if args else kwargs.get('symbols')
+        if not symbols:
+            return 80
+        return 2 if len(symbols) <= 20 else (40 if len(symbols) <= 100 else 80)
+    return METHOD_WEIGHTS.get(method, DEFAULT_WEIGHT)
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class _LaneStats:
+    def __init__(self):
+        self.queued = 0
+        self.max_queued = 0
+        self.requests = 0
+        self.deduplicated = 0
+        self.weight = 0.0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'requests': self.requests,
+            'deduplicated': self.deduplicated,
+            'weight': self.weight,
+            'avg_wait': round(self.total_wait / self.requests, 4) if self.requests else 0.0,
+            'max_wait': round(self.max_wait, 4),
+        }
+
+
+class RestScheduler:
+    """Token bucket of exchange request weight shared by every REST call of the process.
+
+    Callers wait on their own thread until the bucket holds the call's
+    weight. Waiters are served strictly by lane, then arrival order, and
+    background calls may not dip into the last ``interactive_reserve``
+    of the bucket. Identical in-flight fetch_ticker(s)/fetch_ohlcv calls
+    of the same lane run once (an interactive call never waits behind a
+    background flight). The bucket is corrected from the
+    ``x-mbx-used-weight-1m`` header of each response and emptied for a
+    cooldown after a rate-limit error.
+    """
+
+    def __init__(self, weight_per_minute: float = REST_WEIGHT_PER_MINUTE,
+                 interactive_reserve: float = REST_INTERACTIVE_RESERVE,
+                 cooldown: float = REST_RATE_LIMIT_COOLDOWN):
+        self.capacity = weight_per_minute
+        self.refill_rate = weight_per_minute / 60.0
+        self.reserve = {INTERACTIVE: 0.0, BACKGROUND: weight_per_minute * interactive_reserve}
+        self.cooldown = cooldown
+        self._tokens = weight_per_minute
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+        self._flight = SingleFlight()
+        self.lanes = {lane: _LaneStats() for lane in LANES}
+        self.rate_limited = 0
+
+    def call(self, exchange, method: str, *args, **kwargs):
+        """Run ``exchange.<method>(*args, **kwargs)`` within the weight budget"""
+        lane = current_lane()
+        fn = functools.partial(self._execute, exchange, method, lane, args, kwargs)
+        if method not in DEDUP_METHODS:
+            return fn()
+        # รวมเฉพาะใน lane เดียวกัน: flight ของ background ต้องรอ reserve ซึ่ง interactive ไม่ต้องรอ
+        key = (lane, id(exchange), method, _freeze(args), _freeze(kwargs))
+        result, shared = self._flight.do(key, fn)
+        if shared:
+            with self._cond:
+                self.lanes[lane].deduplicated += 1
+        return result
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            self._refill()
+            return {
+                'capacity': self.capacity,
+                'tokens': round(self._tokens, 1),
+                'blocked_for': round(max(self._blocked_until - time.monotonic(), 0.0), 1),
+                'rate_limited': self.rate_limited,
+                'lanes': {name: self.lanes[lane].as_dict() for lane, name in LANES.items()},
+            }
+
+    def _execute(self, exchange, method, lane, args, kwargs):
+        import ccxt  # โหลดแล้วโดย exchange ที่ส่งเข้ามา
+
+        self.acquire(request_weight(method, args, kwargs), lane)
+        try:
+            result = getattr(exchange, method)(*args, **kwargs)
+        except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
+            with self._cond:
+                self.rate_limited += 1
+                self._tokens = 0.0
+                self._blocked_until = time.monotonic() + self.cooldown
+            logger.warning(f"Exchange rate limit hit on {method}, pausing REST calls for {self.cooldown}s")
+            raise
+        return result
+
+    def acquire(self, weight: float, lane: Optional[int] = None):
+        """Block until ``weight`` may be spent; for REST calls made without ccxt"""
+        lane = current_lane() if lane is None else lane
+        stats = self.lanes[lane]
+        started = time.monotonic()
+        with self._cond:
+            entry = (lane, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            stats.queued += 1
+            stats.max_queued = max(stats.max_queued, stats.queued)
+            try:
+                while True:
+                    self._refill()
+                    now = time.monotonic()
+                    if self._waiting[0] != entry:
+                        self._cond.wait()
+                        continue
+                    if now < self._blocked_until:
+                        self._cond.wait(self._blocked_until - now)
+                        continue
+                    # ขอเกินความจุ (เช่น budget ต่ำมาก) ก็ให้ผ่านเมื่อ bucket เต็ม
+                    needed = min(weight + self.reserve[lane], self.capacity)
+                    if self._tokens >= needed:
+                        self._tokens -= weight
+                        break
+                    self._cond.wait((needed - self._tokens) / self.refill_rate)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                stats.queued -= 1
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            stats.requests += 1
+            stats.weight += weight
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def attach(self, exchange):
+        """Read ``x-mbx-used-weight-1m`` from every REST response of ``exchange``"""
+        if getattr(exchange, '_rest_scheduler', None) is self or not hasattr(exchange, 'on_rest_response'):
+            return
+        original = exchange.on_rest_response
+
+        # hook ของ ccxt ถูกเรียกใน thread ของ call นั้นพร้อม header ของ response นั้นเอง
+        # (last_response_headers ของ exchange ที่ใช้ร่วมกันถูก thread อื่นเขียนทับได้)
+        def on_rest_response(code, reason, url, method, response_headers, *args):
+            self._sync_used_weight(response_headers)
+            return original(code, reason, url, method, response_headers, *args)
+
+        exchange.on_rest_response = on_rest_response
+        exchange._rest_scheduler = self
+
+    def _sync_used_weight(self, headers):
+        headers = headers or {}
+        used = next((v for k, v in headers.items() if k.lower() == 'x-mbx-used-weight-1m'), None)
+        if used is None:
+            return
+        try:
+            remaining = self.capacity - float(used)
+        except ValueError:
+            return
+        with self._cond:
+            self._refill()
+            self._tokens = max(min(self._tokens, remaining), 0.0)
+
+
+class ScheduledExchange:
+    """ccxt exchange whose fetch_*/create_*/cancel_* calls go through a RestScheduler"""
+
+    def __init__(self, exchange, scheduler: RestScheduler):
+        self._exchange = exchange
+        self._scheduler = scheduler
+        scheduler.attach(exchange)
+
+    def __getattr__(self, name):
+        attr = getattr(self._exchange, name)
+        if callable(attr) and name.startswith(('fetch_', 'create_', 'cancel_')):
+            return functools.partial(self._scheduler.call, self._exchange, name)
+        return attr
+
+
+# Global instance
+rest_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_rest_scheduler() -> RestScheduler:
+    global rest_scheduler
+    with _scheduler_lock:
+        if rest_scheduler is None:
+            rest_scheduler = RestScheduler()
+        return rest_scheduler
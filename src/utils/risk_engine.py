@@ -0,0 +1,285 @@
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.utils.symbols import normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+PROFIT_TARGET, LOSS_LIMIT = "PROFIT_TARGET", "LOSS_LIMIT"
+
+
+class _TriggerIndex:
+    """Trigger prices of one side/kind kept sorted, with the position slot of each"""
+
+    def __init__(self, prices: np.ndarray, slots: np.ndarray):
+        order = np.argsort(prices, kind='stable')
+        self.prices = prices[order]
+        self.slots = slots[order]
+
+    def rising(self, prev: Optional[float], price: float) -> np.ndarray:
+        """Slots whose trigger lies in (prev, price] — fires when price moves up through it"""
+        lo = 0 if prev is None else np.searchsorted(self.prices, prev, side='right')
+        hi = np.searchsorted(self.prices, price, side='right')
+        return self.slots[lo:hi] if hi > lo else self.slots[:0]
+
+    def falling(self, prev: Optional[float], price: float) -> np.ndarray:
+        """Slots whose trigger lies in [price, prev) — fires when price moves down through it"""
+        lo = np.searchsorted(self.prices, price, side='left')
+        hi = len(self.prices) if prev is None else np.searchsorted(self.prices, prev, side='left')
+        return self.slots[lo:hi] if hi > lo else self.slots[:0]
+
+
+class _SymbolBook:
+    """Active positions of one symbol plus sorted take-profit/stop indexes per side"""
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+        self.ids = np.array([r['id'] for r in rows], dtype=np.int64)
+        self.entry = np.array([r['entry_price'] for r in rows], dtype=np.float64)
+        self.side = np.array([
+            1.0 if r['position_type'] == "LONG" else (-1.0 if r['position_type'] == "SHORT" else 0.0)
+            for r in rows
+        ])
+        target = np.array([r['profit_target'] for r in rows], dtype=np.float64)
+        limit = np.array([r['loss_limit'] for r in rows], dtype=np.float64)
+        self.timeframes = [r['timeframe'] for r in rows]
+        self.types = [r['position_type'] for r in rows]
+        self.alive = np.ones(len(rows), dtype=bool)
+        # slot ที่เพิ่งเพิ่มเข้ามา ยังไม่เคยถูกตรวจกับราคา -> ตรวจเต็มใน evaluate ครั้งถัดไป
+        self.fresh = np.ones(len(rows), dtype=bool)
+        self.slot_of = {r['id']: slot for slot, r in enumerate(rows)}
+        self.dead = 0
+        self.prev_price: Optional[float] = None  # None = ยังไม่เคยประเมิน ตรวจทุกตัวในรอบแรก
+        self.last_price: Optional[float] = None
+
+        # entry_price เป็น 0/NULL: คำนวณ PnL และราคาเป้าหมายไม่ได้ ไม่ถูก trigger
+        self.priced = np.isfinite(self.entry) & (self.entry > 0)
+        slots = np.arange(len(rows))
+        long_ = (self.side > 0) & self.priced
+        short = (self.side < 0) & self.priced
+        # ราคาเป้าหมายแบบ absolute: LONG กำไรเมื่อราคาขึ้น, SHORT กำไรเมื่อราคาลง
+        self.long_take_profit = self._index(self.entry * (1 + target / 100), slots, long_)
+        self.long_stop = self._index(self.entry * (1 - limit / 100), slots, long_)
+        self.short_take_profit = self._index(self.entry * (1 - target / 100), slots, short)
+        self.short_stop = self._index(self.entry * (1 + limit / 100), slots, short)
+
+    @staticmethod
+    def _index(levels: np.ndarray, slots: np.ndarray, mask: np.ndarray) -> _TriggerIndex:
+        # profit_target/loss_limit เป็น NULL -> NaN ซึ่ง sort ไปท้าย index และหลุดเข้าช่วงที่ slice ได้
+        mask = mask & np.isfinite(levels)
+        return _TriggerIndex(levels[mask], slots[mask])
+
+    def crossed(self, price: float) -> Dict[int, str]:
+        """Slots crossed between prev_price and price (all levels for fresh slots), mapped to their event type"""
+        hits = self._between(self.prev_price, price)
+        if self.prev_price is not None and self.fresh.any():
+            for slot, kind in self._between(None, price).items():
+                if self.fresh[slot]:
+                    hits.setdefault(slot, kind)
+        self.fresh[:] = False
+        return {slot: kind for slot, kind in hits.items() if self.alive[slot]}
+
+    def _between(self, prev: Optional[float], price: float) -> Dict[int, str]:
+        hits: Dict[int, str] = {}
+        if prev is None or price >= prev:
+            for slot in self.long_take_profit.rising(prev, price):
+                hits[int(slot)] = PROFIT_TARGET
+            for slot in self.short_stop.rising(prev, price):
+                hits.setdefault(int(slot), LOSS_LIMIT)
+        if prev is None or price <= prev:
+            for slot in self.short_take_profit.falling(prev, price):
+                hits[int(slot)] = PROFIT_TARGET
+            for slot in self.long_stop.falling(prev, price):
+                hits.setdefault(int(slot), LOSS_LIMIT)
+        return hits
+
+    def kill(self, position_id: int):
+        slot = self.slot_of.get(position_id)
+        if slot is not None and self.alive[slot]:
+            self.alive[slot] = False
+            self.dead += 1
+
+    def pnl(self, price: float) -> np.ndarray:
+        return np.divide(self.side * (price - self.entry) * 100, self.entry,
+                         out=np.zeros_like(self.entry), where=self.priced)
+
+
+class RiskEngine:
+    """Profit-target / loss-limit detection for all tracked positions.
+
+    Each symbol keeps the absolute take-profit and stop prices of its
+    positions in sorted arrays (separately for LONG and SHORT). A tick only
+    binary-searches the range between the previous and the current price,
+    so the cost depends on how many positions trigger, not on how many are
+    open. Triggered positions are reported once; their events stay pending
+    until the consumer persists them and calls ``ack_events()``, so
+    ``drain_events()`` hands out unacknowledged events again after a failed
+    write.
+    """
+
+    # rebuild book เมื่อ position ที่ trigger แล้วเกินครึ่ง
+    COMPACT_RATIO = 0.5
+
+    def __init__(self):
+        self._books: Dict[str, _SymbolBook] = {}
+        self._rows: Dict[int, dict] = {}  # position id -> row ที่อยู่ใน book
+        self._triggered = set()  # id ที่ trigger แล้วแต่ DB ยังไม่ปิด
+        self._events: 'OrderedDict[int, dict]' = OrderedDict()  # position id -> event ที่ยังไม่ ack
+        self._lock = threading.Lock()
+
+    def load(self, positions: Iterable):
+        """Sync the books with the ACTIVE positions (ORM objects or dicts).
+
+        Only positions that were added, removed or edited since the last
+        call change: removed ones are marked dead, added ones are merged
+        into their symbol's book and checked against the current price on
+        the next tick. Books of unchanged symbols keep their state.
+        """
+        rows: Dict[int, dict] = {}
+        for pos in positions:
+            row = pos if isinstance(pos, dict) else self._row(pos)
+            rows[row['id']] = row
+
+        with self._lock:
+            # id ที่ DB ปิดไปแล้ว (หรือถูกลบ) ไม่ต้องจำอีก และ event ของมันไม่ต้องเขียนซ้ำ
+            self._triggered &= rows.keys()
+            for position_id in [pid for pid in self._events if pid not in rows]:
+                del self._events[position_id]
+
+            # ถูกปิด/ลบ หรือแก้ไข (เช่นเปลี่ยนเป้า) -> เอาตัวเดิมออก
+            changed_symbols = set()
+            for position_id, old in list(self._rows.items()):
+                if rows.get(position_id) != old:
+                    del self._rows[position_id]
+                    symbol = normalize_symbol(old['symbol'])
+                    book = self._books.get(symbol)
+                    if book is not None:
+                        book.kill(position_id)
+                        changed_symbols.add(symbol)
+
+            added: Dict[str, List[dict]] = {}
+            for position_id, row in rows.items():
+                if position_id in self._rows or position_id in self._triggered:
+                    continue
+                self._rows[position_id] = row
+                added.setdefault(normalize_symbol(row['symbol']), []).append(row)
+
+            for symbol, new_rows in added.items():
+                self._rebuild(symbol, new_rows)
+            for symbol in changed_symbols - added.keys():
+                book = self._books.get(symbol)
+                if book is not None and book.dead > len(book.ids) * self.COMPACT_RATIO:
+                    self._rebuild(symbol)
+
+    def evaluate(self, symbol: str, price: float) -> List[dict]:
+        symbol = normalize_symbol(symbol)
+        price = float(price)
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return []
+
+            hits = book.crossed(price)
+            book.prev_price = price
+            book.last_price = price
+            if not hits:
+                return []
+
+            slots = np.fromiter(hits.keys(), dtype=np.int64, count=len(hits))
+            pnl = book.pnl(price)[slots]
+            events = []
+            for slot, pnl_percent in zip(slots.tolist(), pnl.tolist()):
+                position_id = int(book.ids[slot])
+                events.append({
+                    'position_id': position_id,
+                    'symbol': symbol,
+                    'timeframe': book.timeframes[slot],
+                    'event': hits[slot],
+                    'price': price,
+                    'pnl_percent': pnl_percent,
+                })
+                self._triggered.add(position_id)
+
+            # position ที่ trigger แล้วจะถูกปิด ไม่ต้องรายงานซ้ำ
+            book.alive[slots] = False
+            book.dead += len(slots)
+            if book.dead > len(book.ids) * self.COMPACT_RATIO:
+                self._rebuild(symbol)
+
+            for event in events:
+                self._events[event['position_id']] = event
+            return events
+
+    def on_price(self, entry: dict):
+        """Price bus subscriber"""
+        try:
+            self.evaluate(entry['symbol'], entry['price'])
+        except Exception as e:
+            logger.error(f"Risk evaluation failed for {entry.get('symbol')}: {e}")
+
+    def drain_events(self) -> List[dict]:
+        """Pending events, oldest first; they stay pending until ``ack_events()``"""
+        with self._lock:
+            return list(self._events.values())
+
+    def ack_events(self, events: Iterable[dict]):
+        """Forget events whose positions have been closed in the DB"""
+        with self._lock:
+            for event in events:
+                self._events.pop(event['position_id'], None)
+
+    def position_pnl(self) -> Dict[int, dict]:
+        """Last evaluated price and PnL% per open position id (computed on demand)"""
+        result = {}
+        with self._lock:
+            for symbol, book in self._books.items():
+                if book.last_price is None:
+                    continue
+                pnl = book.pnl(book.last_price)
+                for slot in np.nonzero(book.alive)[0].tolist():
+                    position_id = int(book.ids[slot])
+                    result[position_id] = {
+                        'position_id': position_id,
+                        'symbol': symbol,
+                        'timeframe': book.timeframes[slot],
+                        'position_type': book.types[slot],
+                        'entry_price': float(book.entry[slot]),
+                        'current_price': book.last_price,
+                        'pnl_percent': float(pnl[slot]),
+                    }
+        return result
+
+    def _rebuild(self, symbol: str, added: List[dict] = ()):
+        """Replace ``symbol``'s book with its live rows plus ``added``, keeping its price state"""
+        old = self._books.get(symbol)
+        live = np.nonzero(old.alive)[0].tolist() if old is not None else []
+        rows = [old.rows[i] for i in live] + list(added)
+        if not rows:
+            self._books.pop(symbol, None)
+            return
+        book = _SymbolBook(rows)
+        if old is not None:
+            book.fresh[:len(live)] = old.fresh[live]
+            book.prev_price = old.prev_price
+            book.last_price = old.last_price
+        self._books[symbol] = book
+
+    @staticmethod
+    def _row(pos) -> dict:
+        return {
+            'id': pos.id,
+            'symbol': pos.symbol,
+            'timeframe': pos.timeframe,
+            'position_type': pos.position_type,
+            'entry_price': pos.entry_price,
+            'profit_target': pos.profit_target,
+            'loss_limit': pos.loss_limit,
+        }
+
+
+# Global instance
+risk_engine = RiskEngine()
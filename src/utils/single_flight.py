@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller runs ``fn``; callers arriving while it is in flight
+    block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], object]) -> Tuple[object, bool]:
+        """Return (result, shared); ``shared`` is True for callers that joined an in-flight call"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def next_candle_close(timeframe: str, now: Optional[float] = None) -> float:
+    """Epoch seconds at which the candle currently forming for ``timeframe`` closes"""
+    # import ตอนใช้: candle_store -> exchange_manager -> rest_scheduler -> single_flight
+    from src.utils.candle_store import candle_close_ms
+
+    now_ms = int((time.time() if now is None else now) * 1000)
+    return candle_close_ms(timeframe, now_ms) / 1000
+
+
+class CandleAlignedCache:
+    """Values keyed by (symbol, timeframe, ...) that expire when the timeframe's current candle closes"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[object, float, float]]:
+        """(value, cached_at, expires_at) or None when missing/expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, timeframe: str, value) -> Tuple[object, float, float]:
+        now = time.time()
+        entry = (value, now, next_candle_close(timeframe, now))
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # ลบที่หมดอายุก่อน ถ้ายังเต็มลบตัวที่หมดอายุเร็วสุด
+                self._entries = {k: e for k, e in self._entries.items() if e[2] > now}
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[min(self._entries, key=lambda k: self._entries[k][2])]
+            self._entries[key] = entry
+        return entry
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
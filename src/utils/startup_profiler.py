@@ -0,0 +1,117 @@
+"""Where the time between process start and serving goes.
+
+Entry points call ``mark(name)`` after each startup step; a mark covers the
+time since the previous one and counts the modules imported during it.
+Heavy libraries are loaded with ``lazy_import`` on first use of the
+feature that needs them, which records how long that first load took.
+
+    STARTUP_PROFILE=1 python src/serve.py      # log the report once serving
+    GET /api/startup/profile                   # the same report as JSON
+
+For a per-module breakdown of one step use ``python -X importtime``.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+
+def _process_start_time() -> float:
+    """Wall-clock start of this process (Linux /proc, 10 ms resolution), else now"""
+    try:
+        with open("/proc/self/stat") as f:
+            # field 22 = starttime (clock ticks since boot); comm อาจมีช่องว่าง จึงตัดหลัง ')'
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.time() - max(age, 0.0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.process_start = _process_start_time()
+        self.phases: List[Dict] = []
+        self.lazy_imports: List[Dict] = []
+        self.ready_at: Optional[float] = None
+        self._last_mark = self.process_start
+        self._last_modules = 0
+        self._lock = threading.Lock()
+        # ช่วงก่อน profiler ถูก import: interpreter + import ของ entry point จนถึงบรรทัดนี้
+        self.mark("interpreter + early imports")
+
+    def elapsed(self) -> float:
+        return time.time() - self.process_start
+
+    def mark(self, name: str):
+        """End the current startup phase"""
+        now = time.time()
+        modules = len(sys.modules)
+        with self._lock:
+            self.phases.append({
+                'phase': name,
+                'seconds': round(now - self._last_mark, 4),
+                'modules_imported': modules - self._last_modules,
+            })
+            self._last_mark = now
+            self._last_modules = modules
+
+    def mark_ready(self):
+        """Startup is over: the server is about to accept connections"""
+        self.mark("until serving")
+        self.ready_at = self.elapsed()
+        if STARTUP_PROFILE:
+            print(self.format_report())
+        else:
+            logger.info(f"Ready to serve {self.ready_at:.2f}s after process start")
+
+    def lazy_import(self, name: str):
+        """``importlib.import_module`` that records the first (cold) load of ``name``"""
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        started = time.perf_counter()
+        modules = len(sys.modules)
+        module = importlib.import_module(name)
+        with self._lock:
+            self.lazy_imports.append({
+                'module': name,
+                'seconds': round(time.perf_counter() - started, 4),
+                'modules_imported': len(sys.modules) - modules,
+                'at': round(self.elapsed(), 2),
+            })
+        return module
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                'ready_after': round(self.ready_at, 4) if self.ready_at is not None else None,
+                'phases': list(self.phases),
+                'lazy_imports': list(self.lazy_imports),
+                'modules_loaded': len(sys.modules),
+            }
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = [f"Startup profile: ready after {report['ready_after']}s, {report['modules_loaded']} modules"]
+        for phase in report['phases']:
+            lines.append(f"  {phase['phase']:<32}{phase['seconds']:>8.3f}s  {phase['modules_imported']:>5} modules")
+        for item in report['lazy_imports']:
+            lines.append(f"  lazy {item['module']:<27}{item['seconds']:>8.3f}s  {item['modules_imported']:>5} modules"
+                         f"  (at {item['at']}s)")
+        return "\n".join(lines)
+
+
+# Global instance
+startup_profiler = StartupProfiler()
+
+
+def lazy_import(name: str):
+    return startup_profiler.lazy_import(name)
@@ -0,0 +1,163 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+from src.utils.offload import start_native_thread
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at', 'last_read', 'read_interval', 'next_refresh')
+
+    def __init__(self, value, now: float, interval: float):
+        self.value = value
+        self.fetched_at = now
+        self.last_read = now
+        self.read_interval = interval
+        self.next_refresh = now + interval
+
+
+class SWRCache:
+    """Bounded LRU cache that serves stale values while a background thread refreshes them.
+
+    ``fetch_many(keys)`` returns ``{key: value}`` for the keys it could
+    load. Reads of cached keys never wait on the network: a value older
+    than its refresh interval is returned as is and refreshed in the
+    background. Only missing keys, or values older than ``max_stale``, are
+    fetched on the caller's thread. Each key's refresh interval follows
+    how often it is read (an EWMA of the time between reads, or the time
+    since the last read when longer, clamped to ``[min_interval,
+    max_interval]``); keys not read for ``idle_after``
+    seconds stop being refreshed and age out of the LRU.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[Hashable]], Dict[Hashable, object]], max_entries: int = 1024,
+                 min_interval: float = 2.0, max_interval: float = 60.0, max_stale: float = 300.0,
+                 idle_after: float = 600.0, name: str = 'swr-cache'):
+        self.fetch_many = fetch_many
+        self.max_entries = max_entries
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_stale = max_stale
+        self.idle_after = idle_after
+        self.name = name
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.running = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, dict]:
+        """``{key: {'value', 'age', 'stale'}}`` for every key that is cached or could be fetched"""
+        now = time.time()
+        results, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or now - entry.fetched_at > self.max_stale:
+                    missing.append(key)
+                    continue
+                self._record_read(key, entry, now)
+                results[key] = self._view(entry, now)
+
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            for key, entry in self._store(self.fetch_many(missing)).items():
+                results[key] = self._view(entry, time.time())
+        self._ensure_running()
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'evictions': self.evictions,
+            }
+
+    def _view(self, entry: _Entry, now: float) -> dict:
+        age = max(now - entry.fetched_at, 0.0)
+        return {'value': entry.value, 'age': round(age, 3), 'stale': age > self._interval(entry, now)}
+
+    def _interval(self, entry: _Entry, now: float) -> float:
+        # key ที่ไม่ถูกอ่านนานแล้ว refresh ห่างขึ้นเรื่อยๆ ตามเวลาที่ไม่มีคนอ่าน
+        wanted = max(entry.read_interval, now - entry.last_read)
+        return min(max(wanted, self.min_interval), self.max_interval)
+
+    def _record_read(self, key, entry: _Entry, now: float):
+        # EWMA ของช่วงห่างระหว่างการอ่าน: อ่านบ่อย -> refresh บ่อย
+        entry.read_interval = 0.7 * entry.read_interval + 0.3 * (now - entry.last_read)
+        entry.last_read = now
+        interval = self._interval(entry, now)
+        entry.next_refresh = min(entry.next_refresh, entry.fetched_at + interval)
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if now - entry.fetched_at > interval:
+            self.stale_hits += 1
+            self._wakeup.set()
+
+    def _store(self, values: Dict[Hashable, object]) -> Dict[Hashable, _Entry]:
+        now = time.time()
+        stored = {}
+        with self._lock:
+            for key, value in values.items():
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = _Entry(value, now, self.min_interval)
+                else:
+                    entry.value = value
+                    entry.fetched_at = now
+                entry.next_refresh = now + self._interval(entry, now)
+                self._entries.move_to_end(key)
+                stored[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return stored
+
+    def _ensure_running(self):
+        if not self.running:
+            with self._lock:
+                if self.running:
+                    return
+                self.running = True
+            start_native_thread(self._run)
+            logger.info(f"{self.name} refresher started")
+
+    def _run(self):
+        while self.running:
+            now = time.time()
+            with self._lock:
+                due = [key for key, entry in self._entries.items()
+                       if entry.next_refresh <= now and now - entry.last_read < self.idle_after]
+                upcoming = [entry.next_refresh for entry in self._entries.values()
+                            if now - entry.last_read < self.idle_after]
+            if due:
+                refreshed = {}
+                try:
+                    refreshed = self._store(self.fetch_many(due))
+                except Exception as e:
+                    logger.warning(f"{self.name} refresh of {len(due)} keys failed: {e}")
+                with self._lock:
+                    self.refreshes += len(refreshed)
+                    # key ที่ดึงไม่สำเร็จ ลองใหม่รอบหน้า (ไม่วนถี่)
+                    retry_at = time.time() + self.min_interval
+                    for key in due:
+                        if key not in refreshed and key in self._entries:
+                            self._entries[key].next_refresh = retry_at
+                continue
+
+            timeout: Optional[float] = min(upcoming) - now if upcoming else None
+            self._wakeup.wait(self.max_interval if timeout is None else max(timeout, 0.05))
+            self._wakeup.clear()
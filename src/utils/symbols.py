@@ -0,0 +1,11 @@
+def normalize_symbol(symbol: str) -> str:
+    """BTC/USDT -> BTCUSDT (รูปแบบที่ใช้ใน DB และ Binance WebSocket)"""
+    return symbol.replace("/", "").upper()
+
+
+def to_ccxt_symbol(symbol: str) -> str:
+    """BTCUSDT -> BTC/USDT (รูปแบบที่ ccxt ต้องการ)"""
+    symbol = symbol.upper()
+    if "/" in symbol:
+        return symbol
+    return symbol.replace("USDT", "/USDT")
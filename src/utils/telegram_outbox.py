@@ -0,0 +1,261 @@
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from src.app import db
+from src.models.trading import TelegramOutbox
+from src.utils.offload import start_native_thread
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+
+# Telegram: ~1 ข้อความ/วินาทีต่อแชท และ ~30 ข้อความ/วินาทีรวมทั้งบอท
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1.0))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_SEND_TIMEOUT = float(os.getenv("TELEGRAM_SEND_TIMEOUT", 10))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 200))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 2.0))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 300))
+
+MAX_MESSAGE_LENGTH = 4096
+MESSAGE_SEPARATOR = "\n\n"
+
+
+def enqueue_telegram_message(text: str, chat_id: Optional[str] = None) -> List[TelegramOutbox]:
+    """Add a message to the outbox in the current session; it is sent after the caller commits.
+
+    Text longer than one Telegram message is stored as several rows, split
+    at line breaks, so no HTML tag or entity is cut in half.
+    """
+    chat_id = chat_id or TELEGRAM_CHAT_ID
+    if not chat_id:
+        logger.warning("TELEGRAM_CHAT_ID is not set, dropping Telegram message")
+        return []
+    messages = [TelegramOutbox(chat_id=str(chat_id), text=part) for part in _split_text(text)]
+    db.session.add_all(messages)
+    return messages
+
+
+def _split_text(text: str) -> List[str]:
+    """Chunks of at most MAX_MESSAGE_LENGTH characters, cut after a newline where possible"""
+    parts = []
+    while len(text) > MAX_MESSAGE_LENGTH:
+        cut = text.rfind("\n", 0, MAX_MESSAGE_LENGTH) + 1
+        if cut <= 0:
+            # บรรทัดเดียวยาวเกิน: ตัดก่อน tag/entity ที่ยังไม่ปิด
+            cut = MAX_MESSAGE_LENGTH
+            head = text[:cut]
+            opened = max(head.rfind("<"), head.rfind("&"))
+            if opened > 0 and opened > max(head.rfind(">"), head.rfind(";")):
+                cut = opened
+        parts.append(text[:cut])
+        text = text[cut:]
+    parts.append(text)
+    return parts
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+class TelegramSender:
+    """Delivers the telegram_outbox table in the background.
+
+    Pending rows of the same chat are merged into as few messages as fit
+    Telegram's length limit and sent over one pooled HTTP session, at most
+    one message per chat per TELEGRAM_CHAT_INTERVAL and TELEGRAM_GLOBAL_RATE
+    messages per second overall. Failures are retried with exponential
+    backoff (429 honours ``retry_after``); rows are marked FAILED after
+    OUTBOX_MAX_ATTEMPTS or on a permanent 4xx error. When a merged message
+    gets a permanent 4xx, its rows are resent one by one so only the row
+    that is still rejected fails.
+    """
+
+    def __init__(self, app, token: Optional[str] = TELEGRAM_BOT_TOKEN):
+        self.app = app
+        self.token = token
+        self.running = False
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._bucket = _TokenBucket(TELEGRAM_GLOBAL_RATE)
+        self._chat_ready_at: Dict[str, float] = {}
+        self._solo = set()  # id ของ row ที่อยู่ใน batch ที่ถูกปฏิเสธ -> ส่งทีละ row เพื่อหาตัวที่เสีย
+        self._wakeup = threading.Event()
+        self.requests_sent = 0
+        self.messages_sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self.running:
+            return
+        if not self.token:
+            logger.warning("TELEGRAM_BOT_TOKEN is not set, Telegram outbox sender not started")
+            return
+        self.running = True
+        start_native_thread(self._run)
+        logger.info("Telegram outbox sender started")
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def wake(self):
+        """Deliver newly committed messages now instead of at the next poll"""
+        self._wakeup.set()
+
+    def get_stats(self) -> Dict:
+        return {
+            'running': self.running,
+            'requests_sent': self.requests_sent,
+            'messages_sent': self.messages_sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'rate_limited': self.rate_limited,
+            'last_error': self.last_error,
+        }
+
+    def _run(self):
+        while self.running:
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Telegram outbox cycle failed: {e}")
+            self._wakeup.wait(OUTBOX_POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def run_once(self) -> int:
+        """Send one merged message to every chat that is due; returns the number of outbox rows delivered"""
+        rows = TelegramOutbox.query.filter(
+            TelegramOutbox.status == 'PENDING',
+            TelegramOutbox.next_attempt_at <= datetime.utcnow(),
+        ).order_by(TelegramOutbox.id).limit(OUTBOX_BATCH_SIZE).all()
+
+        by_chat: Dict[str, List[TelegramOutbox]] = OrderedDict()
+        for row in rows:
+            by_chat.setdefault(row.chat_id, []).append(row)
+
+        delivered = 0
+        for chat_id, chat_rows in by_chat.items():
+            if self._chat_ready_at.get(chat_id, 0) > time.monotonic():
+                continue
+            batch = self._merge(chat_rows)
+            self._bucket.acquire()
+            delivered += self._deliver(chat_id, batch)
+            db.session.commit()
+        return delivered
+
+    def _merge(self, rows: List[TelegramOutbox]) -> List[TelegramOutbox]:
+        """Leading rows whose texts fit in one message; rows of a rejected batch go alone"""
+        if rows[0].id in self._solo:
+            return rows[:1]
+        batch, length = [], 0
+        for row in rows:
+            extra = len(row.text) + (len(MESSAGE_SEPARATOR) if batch else 0)
+            if batch and (row.id in self._solo or length + extra > MAX_MESSAGE_LENGTH):
+                break
+            batch.append(row)
+            length += extra
+        return batch
+
+    def _deliver(self, chat_id: str, batch: List[TelegramOutbox]) -> int:
+        text = MESSAGE_SEPARATOR.join(row.text for row in batch)
+        self._chat_ready_at[chat_id] = time.monotonic() + TELEGRAM_CHAT_INTERVAL
+        retry_after, permanent = None, False
+        try:
+            response = self.session.post(
+                f"https://api.telegram.org/bot{self.token}/sendMessage",
+                json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
+                timeout=TELEGRAM_SEND_TIMEOUT,
+            )
+            self.requests_sent += 1
+            if response.ok:
+                now = datetime.utcnow()
+                for row in batch:
+                    row.status = 'SENT'
+                    row.sent_at = now
+                    row.attempts += 1
+                    self._solo.discard(row.id)
+                self.messages_sent += len(batch)
+                return len(batch)
+
+            body = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+            error = f"HTTP {response.status_code}: {body.get('description', response.text[:100])}"
+            if response.status_code == 429:
+                self.rate_limited += 1
+                retry_after = float(body.get('parameters', {}).get('retry_after', 1))
+                self._chat_ready_at[chat_id] = time.monotonic() + retry_after
+            else:
+                permanent = 400 <= response.status_code < 500
+        except requests.RequestException as e:
+            error = str(e)
+
+        self.last_error = error
+        logger.warning(f"Telegram send to {chat_id} failed: {error}")
+        now = datetime.utcnow()
+        if permanent and len(batch) > 1:
+            # ข้อความเดียวที่เสียทำให้ทั้ง batch ถูกปฏิเสธ: ส่งใหม่ทีละ row ในรอบถัดไป
+            # ไม่นับ attempt เพราะยังไม่รู้ว่า row ไหนผิด
+            for row in batch:
+                row.last_error = error[:255]
+                self._solo.add(row.id)
+            self.retries += len(batch)
+            return 0
+        for row in batch:
+            row.last_error = error[:255]
+            if retry_after is not None:
+                # โดน rate limit ไม่นับเป็นความพยายามที่ล้มเหลว
+                row.next_attempt_at = now + timedelta(seconds=retry_after)
+                continue
+            row.attempts += 1
+            if permanent or row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                row.status = 'FAILED'
+                self.failed += 1
+                self._solo.discard(row.id)
+            else:
+                delay = min(OUTBOX_BACKOFF_BASE ** row.attempts, OUTBOX_BACKOFF_MAX)
+                row.next_attempt_at = now + timedelta(seconds=delay)
+                self.retries += 1
+        return 0
+
+
+# Global instance
+telegram_sender = None
+
+
+def get_telegram_sender(app=None):
+    global telegram_sender
+    if telegram_sender is None:
+        if app is None:
+            raise RuntimeError("app is required to initialize TelegramSender")
+        telegram_sender = TelegramSender(app)
+    return telegram_sender
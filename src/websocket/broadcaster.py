@@ -0,0 +1,156 @@
+import threading
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+from src.websocket.wire_format import COMPACT_EVENT
+
+logger = logging.getLogger(__name__)
+
+
+class ConflatingBroadcaster:
+    """Coalesces per-symbol price/candle updates and flushes them as one ``price_batch`` event.
+
+    Only the newest price and candle of each symbol are kept between
+    flushes, so a burst of ticks costs one emit. Flushes happen at most
+    ``max_rate`` times per second; each client receives a single event with
+    the symbols it subscribed to that changed since the last flush.
+    ``recipients()`` returns ``sid -> (symbols, encoder)``; clients with a
+    DeltaEncoder get a compact frame instead of ``price_batch``. Updates
+    whose emit failed are queued again for the next flush unless a newer
+    update of the same symbol has arrived meanwhile.
+    """
+
+    def __init__(self, socketio, recipients: Callable[[], Dict[str, tuple]], max_rate: float = 4.0):
+        self.socketio = socketio
+        self.recipients = recipients
+        self.max_rate = max_rate
+        self.running = False
+        self._pending: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.conflated = 0
+        self.flushes = 0
+        self.emits = 0
+        self.requeued = 0
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.socketio.start_background_task(self._run)
+            logger.info(f"Price broadcaster started ({self.max_rate} Hz)")
+
+    def stop(self):
+        self.running = False
+
+    def publish(self, symbol: str, price: Optional[dict] = None, candle: Optional[dict] = None):
+        """Queue the latest price and/or candle of ``symbol`` for the next flush"""
+        with self._lock:
+            self.updates += 1
+            entry = self._pending.get(symbol)
+            if entry is None:
+                entry = self._pending[symbol] = {}
+            else:
+                self.conflated += 1
+            if price is not None:
+                entry['price'] = price
+            if candle is not None:
+                entry['candle'] = candle
+
+    def flush(self) -> int:
+        """Emit pending updates; returns the number of emits"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        failed = set()
+        try:
+            emits = self._send(pending, failed)
+        except Exception:
+            self._requeue(pending, pending.keys())
+            raise
+        if failed:
+            self._requeue(pending, failed)
+        self.flushes += 1
+        self.emits += emits
+        return emits
+
+    def _send(self, pending: Dict[str, dict], failed: set) -> int:
+        """Emit ``pending`` to every recipient; symbols of failed emits are added to ``failed``"""
+        # จัดกลุ่ม client ที่ได้ชุด symbol เดียวกัน สร้าง payload ครั้งเดียวต่อกลุ่ม
+        groups: Dict[frozenset, list] = {}
+        emits = 0
+        for sid, (symbols, encoder) in self.recipients().items():
+            changed = frozenset(symbols & pending.keys())
+            if not changed:
+                continue
+            if encoder is None:
+                groups.setdefault(changed, []).append(sid)
+                continue
+
+            # compact client: delta ต่อ client
+            frame = encoder.frame(
+                prices=[pending[s]['price'] for s in changed if 'price' in pending[s]],
+                candles=[pending[s]['candle'] for s in changed if 'candle' in pending[s]],
+            )
+            if not frame:
+                continue
+            if self._emit(COMPACT_EVENT, encoder.encode(frame), sid):
+                emits += 1
+            else:
+                # client ไม่ได้รับ delta นี้ -> รอบหน้าส่งเต็ม
+                encoder.reset()
+                failed |= changed
+
+        for symbols, sids in groups.items():
+            message = {
+                'type': 'price_batch',
+                'data': {
+                    'prices': [pending[s]['price'] for s in symbols if 'price' in pending[s]],
+                    'candles': [pending[s]['candle'] for s in symbols if 'candle' in pending[s]],
+                }
+            }
+            if self._emit('price_batch', message, sids):
+                emits += 1
+            else:
+                failed |= symbols
+        return emits
+
+    def _requeue(self, pending: Dict[str, dict], symbols):
+        """Put back updates that were not delivered; newer updates published meanwhile win"""
+        with self._lock:
+            for symbol in symbols:
+                entry = self._pending.setdefault(symbol, {})
+                for kind, payload in pending[symbol].items():
+                    entry.setdefault(kind, payload)
+                self.requeued += 1
+
+    def _emit(self, event, message, to) -> bool:
+        try:
+            # client อยู่ใน process นี้เท่านั้น ไม่ต้องส่งผ่าน message queue
+            self.socketio.emit(event, message, to=to, ignore_queue=True)
+            return True
+        except Exception as e:
+            logger.error(f"Error emitting {event}: {e}")
+            return False
+
+    def get_stats(self) -> Dict:
+        return {
+            'max_rate': self.max_rate,
+            'updates': self.updates,
+            'conflated': self.conflated,
+            'flushes': self.flushes,
+            'emits': self.emits,
+            'requeued': self.requeued,
+        }
+
+    def _run(self):
+        interval = 1.0 / self.max_rate
+        while self.running:
+            started = time.monotonic()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error in price broadcaster: {e}")
+            self.socketio.sleep(max(interval - (time.monotonic() - started), 0.0))
@@ -0,0 +1,241 @@
+"""Minimal in-repo message broker for running several Socket.IO processes.
+
+The broker is a TCP topic fan-out on localhost: peers subscribe to topics
+and every frame published on a topic is forwarded to all of its
+subscribers. Frames are length-prefixed MessagePack (plain data only, never
+pickle), so a peer can at worst send bad data; the broker still has no
+authentication and should listen on a trusted interface (127.0.0.1 by
+default).
+
+``IPCManager`` plugs the broker into python-socketio as a client manager
+(same role as RedisManager/KombuManager), so emits and room operations
+reach clients connected to any worker.
+
+    python -m src.websocket.ipc_broker          # IPC_BROKER_URL=ipc://127.0.0.1:5600
+"""
+import os
+import socket
+import struct
+import threading
+import time
+import logging
+from typing import Dict, Iterable, Iterator, Set, Tuple
+
+import msgpack
+from socketio import PubSubManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROKER_URL = "ipc://127.0.0.1:5600"
+_HEADER = struct.Struct(">I")
+# ext type ของ tuple: emit หลาย argument ของ Socket.IO ส่งเป็น tuple ต้องไม่กลายเป็น list
+_EXT_TUPLE = 1
+
+
+def _pack_default(obj):
+    # strict_types: subclass (OrderedDict, numpy scalar ฯลฯ) มาที่นี่ แปลงเป็นชนิดพื้นฐาน
+    if isinstance(obj, tuple):
+        return msgpack.ExtType(_EXT_TUPLE, pack_payload(list(obj)))
+    for base in (dict, list, bool, int, float, str, bytes):
+        if isinstance(obj, base):
+            return base(obj)
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Cannot send {type(obj).__name__} through the broker")
+
+
+def _unpack_ext(code: int, data: bytes):
+    if code == _EXT_TUPLE:
+        return tuple(unpack_payload(data))
+    return msgpack.ExtType(code, data)
+
+
+def pack_payload(payload) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True, strict_types=True, default=_pack_default)
+
+
+def unpack_payload(data: bytes):
+    return msgpack.unpackb(data, raw=False, ext_hook=_unpack_ext, strict_map_key=False)
+
+
+def _pack_frame(kind: str, topic: str, payload: bytes = b"") -> bytes:
+    # broker อ่านแค่ kind/topic, payload ส่งต่อเป็น bytes โดยไม่ decode
+    return msgpack.packb([kind, topic, payload], use_bin_type=True)
+
+
+def _unpack_frame(raw: bytes) -> Tuple[str, str, bytes]:
+    kind, topic, payload = msgpack.unpackb(raw, raw=False)
+    if not isinstance(kind, str) or not isinstance(topic, str) or not isinstance(payload, bytes):
+        raise ValueError("malformed broker frame")
+    return kind, topic, payload
+
+
+def parse_broker_url(url: str) -> Tuple[str, int]:
+    """'ipc://host:port' -> (host, port)"""
+    address = url.split("://", 1)[-1]
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _send_frame(sock: socket.socket, frame: bytes):
+    sock.sendall(_HEADER.pack(len(frame)) + frame)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("broker connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return _recv_exact(sock, size)
+
+
+class IPCBroker:
+    """Topic fan-out server. Frames are ``['sub', topic, b'']`` or ``['pub', topic, payload]``"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5600):
+        self.host = host
+        self.port = port
+        self._subscribers: Dict[str, Set[socket.socket]] = {}
+        self._send_locks: Dict[socket.socket, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self.forwarded = 0
+
+    def start(self):
+        self._server = socket.create_server((self.host, self.port))
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        logger.info(f"IPC broker listening on {self.host}:{self.port}")
+
+    def serve_forever(self):
+        self.start()
+        while True:
+            time.sleep(3600)
+
+    def _accept_loop(self):
+        while True:
+            conn, _ = self._server.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._send_locks[conn] = threading.Lock()
+            threading.Thread(target=self._serve_peer, args=(conn,), daemon=True).start()
+
+    def _serve_peer(self, conn: socket.socket):
+        try:
+            while True:
+                raw = _recv_frame(conn)
+                kind, topic, _ = _unpack_frame(raw)
+                if kind == "sub":
+                    with self._lock:
+                        self._subscribers.setdefault(topic, set()).add(conn)
+                elif kind == "pub":
+                    self._forward(topic, raw)
+        except (ConnectionError, OSError):
+            pass
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Dropping broker peer that sent a malformed frame: {e}")
+        finally:
+            with self._lock:
+                for peers in self._subscribers.values():
+                    peers.discard(conn)
+                self._send_locks.pop(conn, None)
+            conn.close()
+
+    def _forward(self, topic: str, raw: bytes):
+        with self._lock:
+            peers = [(peer, self._send_locks[peer]) for peer in self._subscribers.get(topic, ())]
+        for peer, lock in peers:
+            try:
+                with lock:
+                    _send_frame(peer, raw)
+                self.forwarded += 1
+            except OSError:
+                pass  # peer กำลังปิด -> _serve_peer จะลบออกเอง
+
+
+class BrokerClient:
+    """Connection to IPCBroker; ``publish`` from any thread, ``listen`` yields payloads"""
+
+    def __init__(self, url: str = DEFAULT_BROKER_URL, topics: Iterable[str] = ()):
+        self.url = url
+        self.topics = list(topics)
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def publish(self, topic: str, payload):
+        frame = _pack_frame("pub", topic, pack_payload(payload))
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    _send_frame(self._connect(), frame)
+                    return
+                except OSError as e:
+                    self._close()
+                    if attempt:
+                        logger.error(f"Failed to publish to broker {self.url}: {e}")
+
+    def listen(self) -> Iterator:
+        """Yield payloads of the subscribed topics forever, reconnecting on failure"""
+        while True:
+            try:
+                with self._lock:
+                    sock = self._connect()
+                while True:
+                    _, _, payload = _unpack_frame(_recv_frame(sock))
+                    yield unpack_payload(payload)
+            except (ConnectionError, OSError, ValueError, TypeError) as e:
+                logger.warning(f"Broker connection lost ({e}), reconnecting...")
+                with self._lock:
+                    self._close()
+                time.sleep(1)
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            sock = socket.create_connection(parse_broker_url(self.url))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for topic in self.topics:
+                _send_frame(sock, _pack_frame("sub", topic))
+            self._sock = sock
+        return self._sock
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+
+class IPCManager(PubSubManager):
+    """Socket.IO client manager backed by IPCBroker.
+
+    Use like the other message-queue managers::
+
+        SocketIO(app, client_manager=IPCManager("ipc://127.0.0.1:5600"))
+    """
+    name = "ipc"
+
+    def __init__(self, url: str = DEFAULT_BROKER_URL, channel: str = "socketio", write_only: bool = False,
+                 logger=None):
+        self.url = url
+        self._publisher = BrokerClient(url)
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        self._publisher.publish(self.channel, data)
+
+    def _listen(self):
+        yield from BrokerClient(self.url, topics=[self.channel]).listen()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    IPCBroker(*parse_broker_url(os.getenv("IPC_BROKER_URL", DEFAULT_BROKER_URL))).serve_forever()
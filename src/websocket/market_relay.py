@@ -0,0 +1,125 @@
+import os
+import logging
+from typing import Optional
+
+from src.websocket.ipc_broker import BrokerClient, IPCManager
+
+logger = logging.getLogger(__name__)
+
+# all      = process เดียวทำทุกอย่าง (ค่าเดิม)
+# ingester = ต่อ Binance, รัน background job, ส่งข้อมูลตลาดผ่าน broker
+# web      = รับ Socket.IO/HTTP, ส่งต่อข้อมูลตลาดให้ client ของตัวเอง
+PROCESS_ROLE = os.getenv("PROCESS_ROLE", "all")
+IPC_BROKER_URL = os.getenv("IPC_BROKER_URL")
+
+MARKET_TOPIC = "market"
+CONTROL_TOPIC = "control"
+
+
+def clustered() -> bool:
+    return bool(IPC_BROKER_URL) and PROCESS_ROLE in ("web", "ingester")
+
+
+def socketio_kwargs() -> dict:
+    """Extra SocketIO() arguments: share rooms/emits across processes through the broker"""
+    if not clustered():
+        return {}
+    return {'client_manager': IPCManager(IPC_BROKER_URL)}
+
+
+class MarketRelay:
+    """Market data and control messages between the ingester and web workers.
+
+    Price/candle and position updates are conflated and encoded per client,
+    so the ingester forwards the raw updates on MARKET_TOPIC and every web
+    worker runs them through its own broadcaster. Web workers send symbol
+    subscription requests back on CONTROL_TOPIC.
+    """
+
+    def __init__(self, url: str, role: str):
+        self.url = url
+        self.role = role
+        self._publisher = BrokerClient(url)
+
+    @property
+    def forwarding(self) -> bool:
+        """True in the ingester: local broadcasts go to the web workers instead"""
+        return self.role == "ingester"
+
+    def publish_price(self, symbol: str, price_data: dict):
+        self._publisher.publish(MARKET_TOPIC, ('price', symbol, price_data))
+
+    def publish_position(self, position_data: dict):
+        self._publisher.publish(MARKET_TOPIC, ('position', position_data))
+
+    def request_subscribe(self, symbol: str, timeframe: str = "1m"):
+        self._publisher.publish(CONTROL_TOPIC, ('subscribe_symbol', symbol, timeframe))
+
+    def request_unsubscribe(self, symbol: str):
+        self._publisher.publish(CONTROL_TOPIC, ('unsubscribe_symbol', symbol))
+
+    def start_web_worker(self, socketio):
+        """Deliver market updates from the ingester to this worker's clients"""
+        socketio.start_background_task(self._run_web_worker, socketio)
+
+    def start_ingester(self, binance_client, socketio):
+        """Apply subscription requests from the web workers to the Binance stream"""
+        socketio.start_background_task(self._run_ingester, binance_client)
+
+    def _run_web_worker(self, socketio):
+        from src.utils.price_bus import price_bus
+        from src.websocket.websocket_server import deliver_position_update, deliver_price_update
+
+        for message in BrokerClient(self.url, topics=[MARKET_TOPIC]).listen():
+            try:
+                if message[0] == 'price':
+                    _, symbol, price_data = message
+                    # ให้ route ใน worker นี้อ่านราคาจาก memory ได้เหมือน process เดียว
+                    price_bus.publish(symbol, price_data['price'], change_24h=price_data.get('change_24h'))
+                    deliver_price_update(socketio, symbol, price_data)
+                elif message[0] == 'position':
+                    deliver_position_update(socketio, message[1])
+            except Exception as e:
+                logger.error(f"Error delivering market update {message[0]}: {e}")
+
+    def _run_ingester(self, binance_client):
+        for message in BrokerClient(self.url, topics=[CONTROL_TOPIC]).listen():
+            try:
+                method, *args = message
+                if method == 'subscribe_symbol':
+                    binance_client.subscribe_symbol(*args)
+                elif method == 'unsubscribe_symbol':
+                    binance_client.unsubscribe_symbol(*args)
+            except Exception as e:
+                logger.error(f"Error handling control message {message}: {e}")
+
+
+class RemoteBinanceClient:
+    """Stand-in for BinanceWebSocketClient inside web workers: forwards subscriptions to the ingester"""
+
+    def __init__(self, relay: MarketRelay):
+        self.relay = relay
+        self.subscribed_symbols = set()
+
+    def subscribe_symbol(self, symbol: str, timeframe: str = "1m"):
+        self.subscribed_symbols.add(symbol)
+        self.relay.request_subscribe(symbol, timeframe)
+
+    def unsubscribe_symbol(self, symbol: str):
+        self.subscribed_symbols.discard(symbol)
+        self.relay.request_unsubscribe(symbol)
+
+    def connect(self):
+        pass  # ingester เป็นเจ้าของ connection ไป Binance
+
+
+# Global instance
+_market_relay = None
+
+
+def get_market_relay() -> Optional[MarketRelay]:
+    """Shared relay when running clustered, otherwise None"""
+    global _market_relay
+    if _market_relay is None and clustered():
+        _market_relay = MarketRelay(IPC_BROKER_URL, PROCESS_ROLE)
+    return _market_relay
@@ -1,9 +1,8 @@
-import time
-import threading
 import logging
 from datetime import datetime
 from src.utils.real_time_price import price_service
-from src.models.trading import Position
+from src.utils.price_bus import price_bus
+from src.websocket.websocket_server import broadcast_price_update
 
 logger = logging.getLogger(__name__)
 
@@ -11,9 +10,7 @@ class PriceStreamingService:
     def __init__(self, app, socketio):
         self.app = app
         self.socketio = socketio
-        self.running = False
         self.subscribed_symbols = set()
-        self.thread = None
         
         # Initialize price service with socketio
         price_service.socketio = socketio
@@ -28,53 +25,19 @@ class PriceStreamingService:
         self.subscribed_symbols.discard(symbol)
         logger.info(f"Removed {symbol} from price streaming")
         
-    def start(self):
-        """Start price streaming service"""
-        if not self.running:
-            self.running = True
-            self.thread = threading.Thread(target=self._stream_prices, daemon=True)
-            self.thread.start()
-            logger.info("Price streaming service started")
-            
-    def stop(self):
-        """Stop price streaming service"""
-        self.running = False
-        if self.thread:
-            self.thread.join()
-        logger.info("Price streaming service stopped")
-        
-    def _stream_prices(self):
-        """Main streaming loop"""
-        while self.running:
-            try:
-                # Get active symbols from positions
-                active_symbols = self._get_active_symbols()
-                
-                if active_symbols:
-                    # Broadcast price updates for active symbols
-                    price_service.broadcast_price_updates(list(active_symbols))
-                    
-                # Sleep for interval
-                time.sleep(2)  # Update every 2 seconds
-                
-            except Exception as e:
-                logger.error(f"Error in price streaming loop: {str(e)}")
-                time.sleep(1)  # Wait longer on error
-    
-    def _get_active_symbols(self):
-        try:
-            from src.models.user import db
-
-            with self.app.app_context():  # <- ใช้อันนี้แทน current_app
-                positions = Position.query.filter_by(status='OPEN').all()
-                symbols = {pos.symbol for pos in positions}
-            
-            symbols.update(self.subscribed_symbols)
-            return symbols
-
-        except Exception as e:
-            logger.error(f"Error getting active symbols: {e}")
-            return {'BTC/USDT', 'ETH/USDT', 'DOGE/USDT'}
+    def run_once(self, snapshot):
+        """Scheduler job: push REST-sourced prices for symbols the Binance socket is not streaming"""
+        prices = snapshot.prices(self.subscribed_symbols)
+        for symbol, price in prices.items():
+            entry = price_bus.get(symbol)
+            # ราคาจาก WebSocket ถูก broadcast ไปแล้วทุก tick ไม่ต้องส่งซ้ำ
+            if entry and entry['source'] == 'binance_ws':
+                continue
+            broadcast_price_update(self.socketio, symbol, {
+                'price': price,
+                'change_24h': (entry or {}).get('change_24h') or 0,
+                'timestamp': datetime.now().isoformat(),
+            })
 
 
 # Global instance
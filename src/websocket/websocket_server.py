@@ -1,7 +1,13 @@
 from flask_socketio import emit, join_room, leave_room
 from flask import request
+import os
+import threading
+import time
 import logging
 from datetime import datetime
+from src.websocket.broadcaster import ConflatingBroadcaster
+from src.websocket.wire_format import COMPACT_EVENT, DeltaEncoder, resolve_format
+from src.websocket.market_relay import get_market_relay
 # from src.utils.binance_websocket import get_binance_ws_client, BinanceWebSocketClient
 
 
@@ -11,8 +17,18 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 # Store connected clients and their subscriptions
+# subscribed_symbols ของแต่ละ client เป็น frozenset ที่ถูกแทนทั้งก้อนเมื่อเปลี่ยน
+# broadcaster thread จึงอ่านได้โดยไม่ต้องล็อก ส่วนการแก้ไขทำภายใต้ _subscriptions_lock
 connected_clients = {}
 symbol_subscriptions = {}
+_subscriptions_lock = threading.Lock()
+
+# ความถี่สูงสุดในการส่งราคาแบบรวมชุด (ครั้ง/วินาที)
+BROADCAST_MAX_RATE = float(os.getenv("BROADCAST_MAX_RATE", 4))
+_price_broadcaster = None
+
+# client ที่ใช้ payload JSON แบบเดิม
+JSON_CLIENTS_ROOM = 'format_json'
 
 def init_websocket(socketio):
     """Initialize WebSocket event handlers"""
@@ -21,12 +37,19 @@ def init_websocket(socketio):
     def handle_connect():
         """Handle client connection"""
         client_id = request.sid if 'request' in globals() else 'unknown'
-        connected_clients[client_id] = {
-            'subscribed_symbols': set(),
-            'connected_at': datetime.now()
-        }
-        logger.info(f"Client {client_id} connected")
-        emit('connected', {'status': 'success', 'message': 'Connected to WebSocket server'})
+        # client เลือก format ตอน connect เช่น io({query: {format: 'msgpack'}})
+        wire_format = resolve_format(request.args.get('format'))
+        with _subscriptions_lock:
+            connected_clients[client_id] = {
+                'subscribed_symbols': frozenset(),
+                'connected_at': datetime.now(),
+                'format': wire_format,
+                'encoder': DeltaEncoder(wire_format) if wire_format != 'json' else None,
+            }
+        if wire_format == 'json':
+            join_room(JSON_CLIENTS_ROOM)
+        logger.info(f"Client {client_id} connected ({wire_format})")
+        emit('connected', {'status': 'success', 'message': 'Connected to WebSocket server', 'format': wire_format})
 
     @socketio.on('disconnect')
     def handle_disconnect():
@@ -34,15 +57,10 @@ def init_websocket(socketio):
         client_id = request.sid if 'request' in globals() else 'unknown'
         
         # Clean up subscriptions
-        if client_id in connected_clients:
-            subscribed_symbols = connected_clients[client_id]['subscribed_symbols']
-            for symbol in subscribed_symbols:
-                if symbol in symbol_subscriptions:
-                    symbol_subscriptions[symbol].discard(client_id)
-                    if not symbol_subscriptions[symbol]:
-                        del symbol_subscriptions[symbol]
-            
-            del connected_clients[client_id]
+        with _subscriptions_lock:
+            info = connected_clients.pop(client_id, None)
+            for symbol in (info['subscribed_symbols'] if info else ()):
+                _drop_subscriber(symbol, client_id)
         
         logger.info(f"Client {client_id} disconnected")
 
@@ -58,14 +76,14 @@ def init_websocket(socketio):
                 emit('error', {'message': 'Symbol is required'})
                 return
 
-            # Add client to symbol subscription
-            if symbol not in symbol_subscriptions:
-                symbol_subscriptions[symbol] = set()
-            symbol_subscriptions[symbol].add(client_id)
+            with _subscriptions_lock:
+                # Add client to symbol subscription
+                symbol_subscriptions.setdefault(symbol, set()).add(client_id)
 
-            # Add symbol to client's subscriptions
-            if client_id in connected_clients:
-                connected_clients[client_id]['subscribed_symbols'].add(symbol)
+                # Add symbol to client's subscriptions
+                info = connected_clients.get(client_id)
+                if info is not None:
+                    info['subscribed_symbols'] = info['subscribed_symbols'] | {symbol}
 
             # Join room
             join_room(f"symbol_{symbol}")
@@ -95,15 +113,14 @@ def init_websocket(socketio):
                 emit('error', {'message': 'Symbol is required'})
                 return
             
-            # Remove client from symbol subscription
-            if symbol in symbol_subscriptions:
-                symbol_subscriptions[symbol].discard(client_id)
-                if not symbol_subscriptions[symbol]:
-                    del symbol_subscriptions[symbol]
-            
-            # Remove symbol from client's subscriptions
-            if client_id in connected_clients:
-                connected_clients[client_id]['subscribed_symbols'].discard(symbol)
+            with _subscriptions_lock:
+                # Remove client from symbol subscription
+                _drop_subscriber(symbol, client_id)
+
+                # Remove symbol from client's subscriptions
+                info = connected_clients.get(client_id)
+                if info is not None:
+                    info['subscribed_symbols'] = info['subscribed_symbols'] - {symbol}
             
             # Leave room for this symbol
             leave_room(f"symbol_{symbol}")
@@ -115,6 +132,11 @@ def init_websocket(socketio):
             logger.error(f"Error in unsubscribe_symbol: {str(e)}")
             emit('error', {'message': 'Failed to unsubscribe from symbol'})
 
+    @socketio.on('latency_ping')
+    def handle_latency_ping(data=None):
+        """Echo the client's timestamp back as an ack (used by the load test)"""
+        return {'t': (data or {}).get('t'), 'server_time': time.time(), 'worker': os.getpid()}
+
     @socketio.on('get_positions')
     def handle_get_positions():
         """Handle request for current positions"""
@@ -171,62 +193,113 @@ def init_websocket(socketio):
             logger.error(f"Error in get_alerts: {str(e)}")
             emit('error', {'message': 'Failed to get alerts'})
 
+def _drop_subscriber(symbol, client_id):
+    """Remove ``client_id`` from ``symbol``'s subscribers (caller holds _subscriptions_lock)"""
+    clients = symbol_subscriptions.get(symbol)
+    if clients is not None:
+        clients.discard(client_id)
+        if not clients:
+            del symbol_subscriptions[symbol]
+
+def get_price_broadcaster(socketio):
+    """Shared conflating broadcaster for price/candle updates (started on first use)"""
+    global _price_broadcaster
+    if _price_broadcaster is None:
+        _price_broadcaster = ConflatingBroadcaster(socketio, _client_subscriptions, max_rate=BROADCAST_MAX_RATE)
+        _price_broadcaster.start()
+    return _price_broadcaster
+
+def _client_subscriptions():
+    """sid -> (frozenset of subscribed symbols, delta encoder or None for JSON clients)"""
+    with _subscriptions_lock:
+        clients = list(connected_clients.items())
+    return {sid: (info['subscribed_symbols'], info.get('encoder')) for sid, info in clients}
+
+def _price_payload(symbol, price_data):
+    return {
+        'symbol': symbol,
+        'price': price_data.get('price'),
+        'change_24h': price_data.get('change_24h', 0),
+        'timestamp': price_data.get('tick_timestamp') or price_data.get('timestamp')
+    }
+
+def _candle_payload(symbol, price_data):
+    # ยังไม่มีแท่งเทียนจาก kline stream -> ส่งเฉพาะราคา
+    if price_data.get('open') is None:
+        return None
+
+    # แปลง timestamp เป็นวินาที (int) ใช้เวลาเปิดแท่งถ้ามี
+    ts = price_data.get('candle_timestamp') or price_data.get('timestamp')
+    if isinstance(ts, str):
+        try:
+            dt = datetime.fromisoformat(ts)
+        except ValueError:
+            dt = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S")
+        ts = int(dt.timestamp())
+    else:
+        ts = int(ts)
+    return {
+        'symbol': symbol,
+        'open': price_data.get('open'),
+        'high': price_data.get('high'),
+        'low': price_data.get('low'),
+        'close': price_data.get('close'),
+        'timestamp': ts,
+        'timeframe': price_data.get('timeframe'),
+    }
+
 def broadcast_price_update(socketio, symbol, price_data):
-    """Broadcast price and candle update to subscribed clients"""
-    # print(f"Broadcasting price update for {symbol}: {price_data}")
+    """Queue price and candle update for subscribed clients (sent batched by the broadcaster)"""
+    relay = get_market_relay()
+    if relay and relay.forwarding:
+        # ingester ไม่มี client เอง ส่งต่อให้ web worker ทุกตัว
+        relay.publish_price(symbol, price_data)
+        return
+    deliver_price_update(socketio, symbol, price_data)
+
+def deliver_price_update(socketio, symbol, price_data):
+    """Queue a price update for the clients connected to this process"""
     try:
-        # --- ส่งราคาปัจจุบัน ---
-        price_message = {
-            'type': 'price_update',
-            'data': {
-                'symbol': symbol,
-                'price': price_data.get('price'),
-                'change_24h': price_data.get('change_24h', 0),
-                'timestamp': price_data.get('tick_timestamp') or price_data.get('timestamp')
-            }
-        }
-        socketio.emit('price_update', price_message, room=f"symbol_{symbol}")
-
-        # --- ส่งแท่งเทียน ---
-        # แปลง timestamp เป็นวินาที (int)
-        ts = price_data.get('timestamp')
-        if isinstance(ts, str):
-            try:
-                dt = datetime.fromisoformat(ts)
-            except ValueError:
-                dt = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S")
-            ts = int(dt.timestamp())
-        else:
-            ts = int(ts)
-        candle_message = {
-            'type': 'candle_update',
-            'data': {
-                'symbol': symbol,
-                'open': price_data.get('open'),
-                'high': price_data.get('high'),
-                'low': price_data.get('low'),
-                'close': price_data.get('close'),
-                'timestamp': ts,
-                'timeframe': price_data.get('timeframe'),
-            }
-        }
-        # print(f"Broadcasting candle update for {symbol}: {candle_message}")
-        socketio.emit('candle_update', candle_message, room=f"symbol_{symbol}")
-
-        logger.debug(f"Broadcasted price and candle update for {symbol}")
-
+        get_price_broadcaster(socketio).publish(
+            symbol,
+            price=_price_payload(symbol, price_data),
+            candle=_candle_payload(symbol, price_data),
+        )
     except Exception as e:
         logger.error(f"Error broadcasting price update: {str(e)}")
 
 def broadcast_position_update(socketio, position_data):
     """Broadcast position update to all clients"""
+    relay = get_market_relay()
+    if relay and relay.forwarding:
+        relay.publish_position(position_data)
+        return
+    deliver_position_update(socketio, position_data)
+
+def deliver_position_update(socketio, position_data):
+    """Send a position update to the clients connected to this process"""
     try:
         message = {
             'type': 'position_update',
             'data': position_data
         }
         
-        socketio.emit('position_update', message)
+        socketio.emit('position_update', message, to=JSON_CLIENTS_ROOM, ignore_queue=True)
+
+        # compact client ได้เฉพาะ field ที่เปลี่ยน
+        for sid, info in list(connected_clients.items()):
+            encoder = info.get('encoder')
+            if encoder is None:
+                continue
+            frame = encoder.frame(positions=[position_data])
+            if not frame:
+                continue
+            try:
+                socketio.emit(COMPACT_EVENT, encoder.encode(frame), to=sid, ignore_queue=True)
+            except Exception as e:
+                # client ไม่ได้รับ delta นี้ -> รอบหน้าส่งเต็ม
+                encoder.reset()
+                logger.error(f"Error sending position update to {sid}: {e}")
         logger.debug(f"Broadcasted position update for position {position_data.get('position_id')}")
         
     except Exception as e:
@@ -266,7 +339,8 @@ def get_connected_clients_count():
 
 def get_symbol_subscriptions():
     """Get current symbol subscriptions"""
-    return {symbol: len(clients) for symbol, clients in symbol_subscriptions.items()}
+    with _subscriptions_lock:
+        return {symbol: len(clients) for symbol, clients in symbol_subscriptions.items()}
 
 
 def broadcast_clear_all(socketio):
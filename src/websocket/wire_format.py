@@ -0,0 +1,133 @@
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional: ถ้าไม่มี ใช้ compact JSON แทน
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# json    = payload เดิม (price_batch / position_update)
+# compact = event 'rt' คีย์สั้น + timestamp เป็น epoch ms + ส่งเฉพาะ field ที่เปลี่ยน
+# msgpack = เหมือน compact แต่ส่งเป็น binary frame
+FORMATS = ('json', 'compact', 'msgpack')
+COMPACT_EVENT = 'rt'
+
+
+def resolve_format(requested: Optional[str]) -> str:
+    """Wire format to use for a client asking for ``requested``"""
+    fmt = (requested or 'json').lower()
+    if fmt not in FORMATS:
+        return 'json'
+    if fmt == 'msgpack' and msgpack is None:
+        return 'compact'
+    return fmt
+
+
+def to_epoch_ms(ts) -> Optional[int]:
+    """ISO string / seconds / milliseconds -> integer epoch milliseconds"""
+    if ts is None:
+        return None
+    if isinstance(ts, str):
+        try:
+            return int(datetime.fromisoformat(ts).timestamp() * 1000)
+        except ValueError:
+            return None
+    ts = float(ts)
+    # ค่าที่น้อยกว่า 1e11 เป็นวินาที
+    return int(ts * 1000) if ts < 1e11 else int(ts)
+
+
+def compact_price(price: dict) -> dict:
+    return {
+        's': price['symbol'],
+        'p': price.get('price'),
+        'ch': price.get('change_24h'),
+        't': to_epoch_ms(price.get('timestamp')),
+    }
+
+
+def compact_candle(candle: dict) -> dict:
+    return {
+        's': candle['symbol'],
+        'f': candle.get('timeframe'),
+        't': to_epoch_ms(candle.get('timestamp')),
+        'o': candle.get('open'),
+        'h': candle.get('high'),
+        'l': candle.get('low'),
+        'c': candle.get('close'),
+    }
+
+
+def compact_position(position: dict) -> dict:
+    return {
+        'i': position['position_id'],
+        's': position.get('symbol'),
+        'd': position.get('direction'),
+        'e': position.get('entry_price'),
+        'p': position.get('current_price'),
+        'n': position.get('pnl_percentage'),
+        'st': position.get('status'),
+    }
+
+
+# field ที่ใช้ระบุ record ต้องส่งทุกครั้ง
+_KEY_FIELDS = {'p': ('s',), 'c': ('s', 'f'), 'o': ('i',)}
+
+
+class DeltaEncoder:
+    """Per-client state of the last frame sent for each record; emits only changed fields.
+
+    Frames are ``{'p': [...prices], 'c': [...candles], 'o': [...positions]}``
+    where each item carries its key fields plus the fields that differ
+    from what this client already has. ``frame()`` assumes the frame
+    reaches the client; if the emit fails, call ``reset()`` so every
+    record is sent in full next time.
+    """
+
+    def __init__(self, fmt: str = 'compact'):
+        self.fmt = fmt
+        self._last: Dict[Tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def frame(self, prices: List[dict] = (), candles: List[dict] = (), positions: List[dict] = ()) -> Optional[dict]:
+        """Compact delta frame for full payloads, or None when nothing changed"""
+        frame = {}
+        with self._lock:
+            for kind, items in (('p', [compact_price(p) for p in prices]),
+                                ('c', [compact_candle(c) for c in candles]),
+                                ('o', [compact_position(p) for p in positions])):
+                deltas = [d for d in (self._delta(kind, item) for item in items) if d]
+                if deltas:
+                    frame[kind] = deltas
+        return frame or None
+
+    def reset(self):
+        """Forget what the client has: the next frame of each record is a full keyframe"""
+        with self._lock:
+            self._last.clear()
+
+    def encode(self, frame: dict):
+        """Frame ready for socketio.emit (bytes for msgpack, dict otherwise)"""
+        if self.fmt == 'msgpack':
+            return msgpack.packb(frame, use_bin_type=True)
+        return frame
+
+    def _delta(self, kind: str, item: dict) -> Optional[dict]:
+        key_fields = _KEY_FIELDS[kind]
+        key = (kind,) + tuple(item[f] for f in key_fields)
+        last = self._last.get(key)
+        if last is None:
+            self._last[key] = item
+            return {k: v for k, v in item.items() if v is not None}
+
+        delta = {k: v for k, v in item.items() if k not in key_fields and last.get(k) != v}
+        if not delta:
+            return None
+        last.update(delta)
+        for f in key_fields:
+            delta[f] = item[f]
+        return delta
@@ -0,0 +1,60 @@
+import pytest
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from src.app import db
+from src.models.trading import Alert, Position
+from src.tasks import background_tasks
+from src.tasks.scheduler import CycleSnapshot
+from src.utils.risk_engine import RiskEngine
+
+
+class FixedPriceSnapshot(CycleSnapshot):
+    def __init__(self, prices):
+        super().__init__()
+        self._fixed = prices
+
+    def prices(self, extra_symbols=()):
+        return dict(self._fixed)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    monkeypatch.setattr(background_tasks, 'risk_engine', RiskEngine())
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def test_failed_commit_keeps_triggered_position_for_next_cycle(app, monkeypatch):
+    db.session.add(Position(symbol="BTC/USDT", timeframe="1h", position_type="LONG",
+                            entry_price=100.0, profit_target=5.0, loss_limit=5.0))
+    db.session.commit()
+
+    real_run_blocking = background_tasks.run_blocking
+    calls = {'n': 0}
+
+    def locked_once(fn, *args, **kwargs):
+        calls['n'] += 1
+        if calls['n'] == 1:
+            raise OperationalError("COMMIT", {}, Exception("database is locked"))
+        return real_run_blocking(fn, *args, **kwargs)
+
+    monkeypatch.setattr(background_tasks, 'run_blocking', locked_once)
+    with pytest.raises(OperationalError):
+        background_tasks.update_positions(FixedPriceSnapshot({'BTCUSDT': 110.0}))
+    db.session.remove()
+    assert Position.query.one().status == "ACTIVE"
+
+    # รอบถัดไปราคากลับมาต่ำกว่าเป้าแล้ว แต่ event ที่ค้างอยู่ต้องถูกเขียนซ้ำ
+    background_tasks.update_positions(FixedPriceSnapshot({'BTCUSDT': 101.0}))
+    db.session.remove()
+    position = Position.query.one()
+    assert position.status == "CLOSED"
+    assert position.current_price == 110.0
+    assert [a.alert_type for a in Alert.query.all()] == ["PROFIT_TARGET"]
+    assert background_tasks.risk_engine.drain_events() == []
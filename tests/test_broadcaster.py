@@ -0,0 +1,58 @@
+from src.websocket.broadcaster import ConflatingBroadcaster
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.down = False
+        self.sent = []
+
+    def emit(self, event, message, to=None, ignore_queue=False):
+        if self.down:
+            raise ConnectionError("transport closed")
+        self.sent.append((event, message, to))
+
+
+def make(socketio, recipients):
+    return ConflatingBroadcaster(socketio, lambda: recipients)
+
+
+def test_ticks_between_flushes_are_conflated_per_symbol():
+    socketio = FakeSocketIO()
+    broadcaster = make(socketio, {'a': (frozenset({'BTC', 'ETH'}), None), 'b': (frozenset({'ETH'}), None)})
+    broadcaster.publish('BTC', price={'price': 1})
+    broadcaster.publish('BTC', price={'price': 2})
+    broadcaster.publish('ETH', price={'price': 3})
+
+    assert broadcaster.flush() == 2
+    sent = {tuple(to): message['data']['prices'] for _, message, to in socketio.sent}
+    assert sorted(sent[('a',)], key=lambda p: p['price']) == [{'price': 2}, {'price': 3}]
+    assert sent[('b',)] == [{'price': 3}]
+    assert broadcaster.conflated == 1
+
+
+def test_failed_emit_keeps_the_update_for_the_next_flush():
+    socketio = FakeSocketIO()
+    broadcaster = make(socketio, {'a': (frozenset({'BTC'}), None)})
+    broadcaster.publish('BTC', price={'price': 1})
+    socketio.down = True
+    assert broadcaster.flush() == 0
+
+    socketio.down = False
+    broadcaster.publish('BTC', candle={'close': 1})
+    assert broadcaster.flush() == 1
+    _, message, _ = socketio.sent[0]
+    assert message['data'] == {'prices': [{'price': 1}], 'candles': [{'close': 1}]}
+    assert broadcaster.flush() == 0
+
+
+def test_newer_update_replaces_a_requeued_one():
+    socketio = FakeSocketIO()
+    broadcaster = make(socketio, {'a': (frozenset({'BTC'}), None)})
+    broadcaster.publish('BTC', price={'price': 1})
+    socketio.down = True
+    broadcaster.flush()
+    broadcaster.publish('BTC', price={'price': 2})
+
+    socketio.down = False
+    broadcaster.flush()
+    assert [message['data']['prices'] for _, message, _ in socketio.sent] == [[{'price': 2}]]
@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timezone
+
+from src.utils.candle_store import CandleStore, candle_close_ms, candle_open_ms
+
+HOUR_MS = 60 * 60 * 1000
+
+
+def utc_ms(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class FakeExchange:
+    """1h candles from ``first_ts`` up to and including the currently open one"""
+
+    def __init__(self, first_ts):
+        self.first_ts = first_ts
+        self.calls = []
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        self.calls.append(since)
+        now_open = candle_open_ms(timeframe, int(time.time() * 1000))
+        stamps = list(range(self.first_ts, now_open + 1, HOUR_MS))
+        stamps = [ts for ts in stamps if since is None or ts >= since]
+        stamps = stamps[:limit] if since is not None else stamps[-limit:]
+        return [[ts, 1.0, 2.0, 0.5, 1.5, 10.0] for ts in stamps]
+
+
+def make_store(tmp_path, exchange, **kwargs):
+    return CandleStore(base_dir=str(tmp_path), exchange_factory=lambda: exchange, **kwargs)
+
+
+def test_week_and_month_candles_align_like_binance():
+    wednesday = utc_ms(2024, 5, 15, 13)
+    assert candle_open_ms('1w', wednesday) == utc_ms(2024, 5, 13)
+    assert candle_close_ms('1w', wednesday) == utc_ms(2024, 5, 20)
+    assert candle_open_ms('1M', wednesday) == utc_ms(2024, 5, 1)
+    assert candle_close_ms('1M', utc_ms(2024, 2, 10)) == utc_ms(2024, 3, 1)
+
+
+def test_short_history_syncs_incrementally_after_the_first_load(tmp_path):
+    now_open = candle_open_ms('1h', int(time.time() * 1000))
+    exchange = FakeExchange(first_ts=now_open - 10 * HOUR_MS)
+    store = make_store(tmp_path, exchange, refresh_interval=0)
+
+    assert len(store.get_closed('BTC/USDT', '1h', limit=720)) == 10
+    store.get_closed('BTC/USDT', '1h', limit=720)
+    # ครั้งแรกโหลดเต็ม (since=None) ครั้งต่อไปขอเฉพาะแท่งหลังแท่งล่าสุด
+    assert exchange.calls[0] is None
+    assert exchange.calls[1] == now_open
+
+
+def test_open_candle_is_appended_after_closed_ones(tmp_path):
+    now_open = candle_open_ms('1h', int(time.time() * 1000))
+    store = make_store(tmp_path, FakeExchange(first_ts=now_open - 5 * HOUR_MS))
+    rows = store.get_ohlcv('BTCUSDT', '1h', limit=3)
+    assert [row[0] for row in rows] == [now_open - 2 * HOUR_MS, now_open - HOUR_MS, now_open]
+
+
+def test_map_is_reused_until_the_file_is_rewritten(tmp_path):
+    now_open = candle_open_ms('1h', int(time.time() * 1000))
+    store = make_store(tmp_path, FakeExchange(first_ts=now_open - 30 * HOUR_MS), max_rows=20)
+    key = ('BTC/USDT', '1h')
+    store.get_closed('BTC/USDT', '1h', limit=25)
+    first = store._maps[key]
+    assert store._read(key) is first
+    assert len(first) == 20
+
+    store._write(key, [[now_open - HOUR_MS, 1, 1, 1, 1, 1]], append=False)
+    assert first._mmap.closed
+    assert len(store._read(key)) == 1
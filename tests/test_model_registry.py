@@ -0,0 +1,42 @@
+import threading
+
+from src.utils.model_registry import ModelRegistry
+
+
+def test_concurrent_requests_train_once_and_release_the_lock():
+    registry = ModelRegistry()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def train():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "model", 0.9
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get_or_train("BTC/USDT", "1h", 1, train)))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(hit for _, _, hit in results) == [False, True, True]
+    assert registry._train_locks == {}
+
+
+def test_new_candle_replaces_the_pair_and_lru_evicts():
+    registry = ModelRegistry(max_entries=2)
+    registry.put("BTC/USDT", "1h", 1, "a", 0.5)
+    registry.put("BTC/USDT", "1h", 2, "b", 0.5)
+    assert registry.get("BTC/USDT", "1h", 1) is None
+
+    registry.put("ETH/USDT", "1h", 1, "c", 0.5)
+    registry.get("BTC/USDT", "1h", 2)
+    registry.put("SOL/USDT", "1h", 1, "d", 0.5)
+    assert registry.get("ETH/USDT", "1h", 1) is None
+    assert registry.get("BTC/USDT", "1h", 2) == ("b", 0.5)
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from src.app import db
+from src.models.trading import Alert, Position
+from src.routes import trading
+from src.utils.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, keyset_page, page_size
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    app.register_blueprint(trading.trading_bp, url_prefix="/api")
+    monkeypatch.setattr(trading.price_bus, 'get_prices', lambda symbols: {})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def add_alerts(position_id, count, start=datetime(2024, 1, 1)):
+    for i in range(count):
+        # เวลาซ้ำกันทีละคู่: id ต้องแยกลำดับให้
+        db.session.add(Alert(position_id=position_id, alert_type="REVERSAL", message=f"alert {i}",
+                             triggered_at=start + timedelta(minutes=i // 2)))
+    db.session.commit()
+
+
+def test_cursor_round_trips_datetimes():
+    columns = (Alert.triggered_at, Alert.id)
+    values = [datetime(2024, 1, 1, 12, 30), 42]
+    assert decode_cursor(encode_cursor(values), columns) == values
+
+
+@pytest.mark.parametrize("cursor", ["%%%", encode_cursor([1]), encode_cursor({'a': 1})])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, (Alert.triggered_at, Alert.id))
+
+
+def test_page_size_is_clamped():
+    assert page_size(None) == 50
+    assert page_size("0") == 1
+    assert page_size(str(MAX_PAGE_SIZE * 10)) == MAX_PAGE_SIZE
+
+
+def test_keyset_pages_cover_every_row_once_with_tied_timestamps(app):
+    add_alerts(1, 7)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(Alert.query, (Alert.triggered_at, Alert.id), cursor, 3)
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            break
+    assert seen == list(range(7, 0, -1))
+
+
+def test_position_alerts_unpaged_oldest_first_or_paged_newest_first(app):
+    add_alerts(1, 5)
+    add_alerts(2, 2)
+    client = app.test_client()
+
+    everything = client.get("/api/position/1/alerts").get_json()
+    assert [a['id'] for a in everything] == [1, 2, 3, 4, 5]
+
+    first = client.get("/api/position/1/alerts?limit=2")
+    assert [a['id'] for a in first.get_json()] == [5, 4]
+    second = client.get(f"/api/position/1/alerts?limit=2&cursor={first.headers['X-Next-Cursor']}")
+    assert [a['id'] for a in second.get_json()] == [3, 2]
+
+
+def test_positions_are_unpaged_unless_asked(app):
+    for i in range(5):
+        db.session.add(Position(symbol="BTCUSDT", timeframe="1h", position_type="LONG", entry_price=100.0,
+                                profit_target=1, loss_limit=1, created_at=datetime(2024, 1, 1) + timedelta(hours=i)))
+    db.session.commit()
+    client = app.test_client()
+
+    response = client.get("/api/positions")
+    assert len(response.get_json()) == 5
+    assert "X-Page" not in response.headers
+
+    response = client.get("/api/positions?page=2&per_page=2")
+    assert [p['id'] for p in response.get_json()] == [3, 2]
+    assert response.headers['X-Total-Count'] == "5"
+    assert client.get("/api/positions?page=x").status_code == 400
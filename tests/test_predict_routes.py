@@ -0,0 +1,72 @@
+import pytest
+from flask import Flask
+
+from src.routes import predict
+from src.utils.single_flight import CandleAlignedCache
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    def compute(symbol, timeframe):
+        calls.append((symbol, timeframe))
+        return {"symbol": symbol, "timeframe": timeframe}, 200
+
+    monkeypatch.setattr(predict, '_compute_prediction', compute)
+    monkeypatch.setattr(predict, 'predict_cache', CandleAlignedCache())
+    app = Flask(__name__)
+    app.register_blueprint(predict.predict_bp, url_prefix="/api")
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+@pytest.mark.parametrize("body", [
+    ["BTC/USDT", "1h"],
+    {"symbol": 123, "timeframe": "1h"},
+    {"symbol": "BTC/USDT", "timeframe": ["1h"]},
+    {"symbol": "BTC/USDT", "timeframe": "7x"},
+])
+def test_predict_rejects_malformed_input(client, body):
+    response = client.post("/api/predict", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    assert client.calls == []
+
+
+def test_predict_spellings_of_a_symbol_share_one_cache_entry(client):
+    first = client.post("/api/predict", json={"symbol": "BTCUSDT", "timeframe": "1h"}).get_json()
+    second = client.post("/api/predict", json={"symbol": "btc/usdt", "timeframe": "1h"}).get_json()
+    assert client.calls == [("BTC/USDT", "1h")]
+    assert first["cache"]["hit"] is False
+    assert second["cache"]["hit"] is True
+    assert second["symbol"] == "BTC/USDT"
+
+
+@pytest.mark.parametrize("body", [
+    ["BTC/USDT", "1h"],
+    {"pairs": "BTC/USDT"},
+    {"pairs": [42]},
+    {"pairs": [["BTC/USDT"]]},
+    {"pairs": [{"symbol": 1, "timeframe": "1h"}]},
+    {"pairs": [["BTC/USDT", 60]]},
+    {"pairs": [{"symbol": "BTC/USDT", "timeframe": "1y"}]},
+    {"pairs": [{"timeframe": "1h"}]},
+    {"pairs": []},
+    {"pairs": [["BTC/USDT", f"{n}m"] for n in range(1, predict.MAX_BATCH_PAIRS + 2)]},
+])
+def test_predict_batch_rejects_malformed_pairs(client, monkeypatch, body):
+    monkeypatch.setattr(predict, '_load_training_set', lambda *pair: pytest.fail("must not fetch"))
+    response = client.post("/api/predict/batch", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_parse_pairs_normalizes_and_deduplicates():
+    pairs = predict._parse_pairs([
+        {"symbol": "btcusdt"},
+        ["BTC/USDT", "1h"],
+        {"symbol": "ETHUSDT", "timeframe": "4h"},
+    ])
+    assert pairs == [("BTC/USDT", "1h"), ("ETH/USDT", "4h")]
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import ccxt
+import pytest
+
+from src.utils.rest_scheduler import (
+    BACKGROUND, INTERACTIVE, RestScheduler, ScheduledExchange, request_weight, rest_priority,
+)
+
+
+class FakeExchange:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def fetch_ticker(self, symbol):
+        self.calls += 1
+        self.release.wait(5)
+        return {'symbol': symbol, 'last': 1.0}
+
+    def fetch_trades(self, symbol):
+        raise ccxt.RateLimitExceeded("429")
+
+    def on_rest_response(self, code, reason, url, method, response_headers, *args):
+        return args[0] if args else None
+
+
+def test_request_weights_follow_binance():
+    assert request_weight('fetch_ticker', (), {}) == 2
+    assert request_weight('fetch_tickers', (), {}) == 80
+    assert request_weight('fetch_tickers', (['BTC/USDT'] * 50,), {}) == 40
+    assert request_weight('fetch_something_new', (), {}) == 5
+
+
+def test_background_calls_leave_the_interactive_reserve():
+    scheduler = RestScheduler(weight_per_minute=100, interactive_reserve=0.5)
+    scheduler._tokens = 52
+    scheduler.acquire(2, BACKGROUND)
+    assert scheduler._tokens == pytest.approx(50, abs=0.1)
+
+    waiter = threading.Thread(target=scheduler.acquire, args=(2, BACKGROUND))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()  # ต้องรอจน bucket เกิน reserve
+
+    scheduler.acquire(40, INTERACTIVE)  # interactive ใช้ส่วน reserve ได้
+    scheduler._tokens = 100
+    with scheduler._cond:
+        scheduler._cond.notify_all()
+    waiter.join(5)
+    assert not waiter.is_alive()
+
+
+def test_identical_calls_in_flight_run_once():
+    scheduler = RestScheduler()
+    exchange = FakeExchange()
+    exchange.release.clear()
+    client = ScheduledExchange(exchange, scheduler)
+    results = []
+
+    def fetch():
+        with rest_priority(BACKGROUND):
+            results.append(client.fetch_ticker('BTC/USDT'))
+
+    threads = [threading.Thread(target=fetch) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while sum(call.waiters for call in list(scheduler._flight._calls.values())) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    exchange.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert exchange.calls == 1
+    assert len(results) == 3
+    assert scheduler.lanes[BACKGROUND].deduplicated == 2
+
+
+def test_used_weight_header_corrects_the_bucket():
+    scheduler = RestScheduler(weight_per_minute=1000)
+    exchange = FakeExchange()
+    ScheduledExchange(exchange, scheduler)
+    exchange.on_rest_response(200, 'OK', 'url', 'GET', {'X-MBX-USED-WEIGHT-1M': '900'}, 'body')
+    assert scheduler.get_stats()['tokens'] <= 101
+
+
+def test_rate_limit_error_empties_the_bucket():
+    scheduler = RestScheduler(cooldown=30)
+    client = ScheduledExchange(FakeExchange(), scheduler)
+    with pytest.raises(ccxt.RateLimitExceeded):
+        client.fetch_trades('BTC/USDT')
+    stats = scheduler.get_stats()
+    assert stats['rate_limited'] == 1
+    assert stats['blocked_for'] > 25
@@ -0,0 +1,99 @@
+import math
+
+from src.utils.risk_engine import LOSS_LIMIT, PROFIT_TARGET, RiskEngine
+
+
+def row(position_id, position_type="LONG", entry_price=100.0, profit_target=2.0, loss_limit=1.0,
+        symbol="BTC/USDT"):
+    return {'id': position_id, 'symbol': symbol, 'timeframe': "1h", 'position_type': position_type,
+            'entry_price': entry_price, 'profit_target': profit_target, 'loss_limit': loss_limit}
+
+
+def fired(events):
+    return {e['position_id']: e['event'] for e in events}
+
+
+def test_crossing_targets_fires_once_per_position():
+    engine = RiskEngine()
+    engine.load([row(1), row(2, "SHORT")])
+    assert engine.evaluate("BTCUSDT", 100.5) == []
+    assert fired(engine.evaluate("BTCUSDT", 102.5)) == {1: PROFIT_TARGET, 2: LOSS_LIMIT}
+    assert engine.evaluate("BTCUSDT", 103.0) == []
+
+
+def test_null_targets_never_trigger():
+    engine = RiskEngine()
+    engine.load([row(1, profit_target=None, loss_limit=None),
+                 row(2, "SHORT", profit_target=None, loss_limit=None)])
+    assert engine.evaluate("BTCUSDT", 101.0) == []
+    assert engine.evaluate("BTCUSDT", 50.0) == []
+    assert engine.evaluate("BTCUSDT", 150.0) == []
+
+
+def test_null_target_keeps_the_other_trigger():
+    engine = RiskEngine()
+    engine.load([row(1, profit_target=None, loss_limit=5.0)])
+    assert engine.evaluate("BTCUSDT", 200.0) == []
+    assert fired(engine.evaluate("BTCUSDT", 94.0)) == {1: LOSS_LIMIT}
+
+
+def test_zero_or_missing_entry_price_is_not_evaluated():
+    engine = RiskEngine()
+    engine.load([row(1, entry_price=0.0), row(2, "SHORT", entry_price=None)])
+    assert engine.evaluate("BTCUSDT", 101.0) == []
+    pnl = engine.position_pnl()
+    assert {pid: state['pnl_percent'] for pid, state in pnl.items()} == {1: 0.0, 2: 0.0}
+    assert all(math.isfinite(state['pnl_percent']) for state in pnl.values())
+
+
+def test_events_stay_pending_until_acknowledged():
+    engine = RiskEngine()
+    engine.load([row(1)])
+    engine.evaluate("BTCUSDT", 103.0)
+    events = engine.drain_events()
+    assert fired(events) == {1: PROFIT_TARGET}
+    assert engine.drain_events() == events
+    engine.ack_events(events)
+    assert engine.drain_events() == []
+
+
+def test_reload_keeps_price_state_of_unchanged_books():
+    engine = RiskEngine()
+    positions = [row(1), row(2, symbol="ETH/USDT")]
+    engine.load(positions)
+    engine.evaluate("BTCUSDT", 101.0)
+    book = engine._books["BTCUSDT"]
+    engine.load(positions)
+    assert engine._books["BTCUSDT"] is book
+    assert book.prev_price == 101.0
+    # ราคาเดิม ไม่มีอะไรข้ามเป้า -> ไม่ต้องตรวจใหม่ทั้งหมด
+    assert engine.evaluate("BTCUSDT", 101.0) == []
+
+
+def test_added_position_is_checked_against_current_price():
+    engine = RiskEngine()
+    engine.load([row(1)])
+    engine.evaluate("BTCUSDT", 101.0)
+    # เปิดใหม่ที่ราคาปัจจุบันเกินเป้าไปแล้ว
+    engine.load([row(1), row(2, entry_price=90.0)])
+    assert engine._books["BTCUSDT"].prev_price == 101.0
+    assert fired(engine.evaluate("BTCUSDT", 101.0)) == {2: PROFIT_TARGET}
+
+
+def test_removed_and_edited_positions_are_updated():
+    engine = RiskEngine()
+    engine.load([row(1), row(2)])
+    engine.evaluate("BTCUSDT", 100.0)
+    engine.load([row(2, profit_target=10.0)])
+    assert engine.evaluate("BTCUSDT", 103.0) == []
+    assert fired(engine.evaluate("BTCUSDT", 111.0)) == {2: PROFIT_TARGET}
+    assert set(engine.position_pnl()) == set()
+
+
+def test_triggered_position_is_not_reloaded_while_still_active():
+    engine = RiskEngine()
+    engine.load([row(1)])
+    engine.evaluate("BTCUSDT", 103.0)
+    engine.load([row(1)])
+    assert engine.evaluate("BTCUSDT", 104.0) == []
+    assert fired(engine.drain_events()) == {1: PROFIT_TARGET}
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from src.utils.swr_cache import SWRCache
+
+
+class Source:
+    def __init__(self):
+        self.version = 1
+        self.requests = []
+
+    def fetch_many(self, keys):
+        self.requests.append(list(keys))
+        return {key: f"{key}-v{self.version}" for key in keys if key != 'missing'}
+
+
+@pytest.fixture
+def make_cache():
+    caches = []
+
+    def make(source, **kwargs):
+        cache = SWRCache(source.fetch_many, **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.running = False
+        cache._wakeup.set()
+
+
+def test_missing_keys_are_fetched_once_and_then_served_from_cache(make_cache):
+    source = Source()
+    cache = make_cache(source)
+    first = cache.get_many(['a', 'b', 'missing'])
+    assert {key: view['value'] for key, view in first.items()} == {'a': 'a-v1', 'b': 'b-v1'}
+
+    second = cache.get_many(['a', 'b'])
+    assert second['a']['value'] == 'a-v1'
+    assert second['a']['stale'] is False
+    assert source.requests == [['a', 'b', 'missing']]
+    assert cache.get_stats()['hits'] == 2
+
+
+def test_stale_value_is_served_while_refreshed_in_background(make_cache):
+    source = Source()
+    cache = make_cache(source, min_interval=0.05, max_interval=0.05)
+    cache.running = True  # refresher ยังไม่เริ่ม
+    cache.get_many(['a'])
+    source.version = 2
+    time.sleep(0.1)
+
+    view = cache.get_many(['a'])['a']
+    assert (view['value'], view['stale']) == ('a-v1', True)  # ไม่รอ network
+    assert len(source.requests) == 1
+
+    cache.running = False
+    deadline = time.time() + 5
+    while cache.get_many(['a'])['a']['value'] != 'a-v2' and time.time() < deadline:
+        time.sleep(0.02)
+    assert cache.get_many(['a'])['a']['value'] == 'a-v2'
+    assert cache.get_stats()['refreshes'] >= 1
+
+
+def test_values_older_than_max_stale_are_fetched_on_the_caller(make_cache):
+    source = Source()
+    cache = make_cache(source, max_stale=0.01)
+    cache.get_many(['a'])
+    cache.running = True  # ไม่ให้ refresher ทำงานแทรก
+    source.version = 2
+    time.sleep(0.05)
+    assert cache.get_many(['a'])['a']['value'] == 'a-v2'
+    assert len(source.requests) == 2
+
+
+def test_least_recently_used_keys_are_evicted(make_cache):
+    source = Source()
+    cache = make_cache(source, max_entries=2)
+    cache.get_many(['a', 'b'])
+    cache.get_many(['a'])
+    cache.get_many(['c'])
+    assert list(cache._entries) == ['a', 'c']
+    assert cache.get_stats()['evictions'] == 1
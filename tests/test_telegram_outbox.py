@@ -0,0 +1,138 @@
+import pytest
+from flask import Flask
+
+from src.app import db
+from src.models.trading import TelegramOutbox
+from src.utils import telegram_outbox
+from src.utils.telegram_outbox import MAX_MESSAGE_LENGTH, TelegramSender, enqueue_telegram_message
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self._body = body or {}
+        self.headers = {'content-type': 'application/json'}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    """Records sent texts; ``reply(text)`` decides the response"""
+
+    def __init__(self, reply=lambda text: FakeResponse()):
+        self.reply = reply
+        self.sent = []
+
+    def post(self, url, json, timeout):
+        self.sent.append(json['text'])
+        return self.reply(json['text'])
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    monkeypatch.setattr(telegram_outbox, 'TELEGRAM_CHAT_INTERVAL', 0)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def make_sender(app, session):
+    sender = TelegramSender(app, token="test")
+    sender.session = session
+    return sender
+
+
+def queue(*texts):
+    for text in texts:
+        enqueue_telegram_message(text, chat_id="1")
+    db.session.commit()
+
+
+def statuses():
+    return [row.status for row in TelegramOutbox.query.order_by(TelegramOutbox.id)]
+
+
+def test_pending_rows_of_a_chat_are_merged_into_one_message(app):
+    queue("a", "b", "c")
+    session = FakeSession()
+    assert make_sender(app, session).run_once() == 3
+    assert session.sent == ["a\n\nb\n\nc"]
+    assert statuses() == ["SENT"] * 3
+
+
+def test_batches_split_at_row_boundaries(app):
+    half = "x" * (MAX_MESSAGE_LENGTH // 2)
+    queue(half, half, "tail")
+    session = FakeSession()
+    sender = make_sender(app, session)
+    assert sender.run_once() == 1
+    assert sender.run_once() == 2
+    assert session.sent == [half, half + "\n\ntail"]
+
+
+def test_long_text_is_split_at_line_breaks(app):
+    line = "<b>" + "y" * 1000 + "</b>\n"
+    queue(line * 5)
+    texts = [row.text for row in TelegramOutbox.query.order_by(TelegramOutbox.id)]
+    assert len(texts) == 2
+    assert "".join(texts) == line * 5
+    assert all(len(text) <= MAX_MESSAGE_LENGTH and text.endswith("</b>\n") for text in texts)
+
+
+def test_long_single_line_is_not_cut_inside_a_tag(app):
+    text = "z" * (MAX_MESSAGE_LENGTH - 2) + "<b>bold</b>"
+    queue(text)
+    texts = [row.text for row in TelegramOutbox.query.order_by(TelegramOutbox.id)]
+    assert texts == ["z" * (MAX_MESSAGE_LENGTH - 2), "<b>bold</b>"]
+
+
+def test_rejected_batch_fails_only_the_bad_row(app):
+    def reply(text):
+        if "<bad>" in text:
+            return FakeResponse(400, {'description': "Bad Request: can't parse entities"})
+        return FakeResponse()
+
+    queue("ok 1", "<bad>", "ok 2")
+    session = FakeSession(reply)
+    sender = make_sender(app, session)
+    assert sender.run_once() == 0
+    assert statuses() == ["PENDING"] * 3
+
+    delivered = sum(sender.run_once() for _ in range(3))
+    assert delivered == 2
+    assert session.sent[1:] == ["ok 1", "<bad>", "ok 2"]
+    assert statuses() == ["SENT", "FAILED", "SENT"]
+    assert sender.failed == 1
+
+
+def test_rate_limit_defers_without_counting_an_attempt(app):
+    queue("a")
+    session = FakeSession(lambda text: FakeResponse(429, {'parameters': {'retry_after': 30}}))
+    sender = make_sender(app, session)
+    assert sender.run_once() == 0
+    row = TelegramOutbox.query.one()
+    assert row.status == "PENDING"
+    assert row.attempts == 0
+    assert sender.rate_limited == 1
+    # ยังไม่ถึงเวลา retry_after -> ไม่ส่งซ้ำ
+    assert sender.run_once() == 0
+    assert len(session.sent) == 1
+
+
+def test_server_errors_back_off_until_max_attempts(app, monkeypatch):
+    monkeypatch.setattr(telegram_outbox, 'OUTBOX_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(telegram_outbox, 'OUTBOX_BACKOFF_BASE', 0)
+    queue("a")
+    sender = make_sender(app, FakeSession(lambda text: FakeResponse(502)))
+    sender.run_once()
+    assert statuses() == ["PENDING"]
+    sender.run_once()
+    assert statuses() == ["FAILED"]
+    assert TelegramOutbox.query.one().attempts == 2
@@ -0,0 +1,52 @@
+import msgpack
+
+from src.websocket.wire_format import DeltaEncoder, resolve_format, to_epoch_ms
+
+
+def price(value, ts=1_700_000_000):
+    return {'symbol': 'BTCUSDT', 'price': value, 'change_24h': 1.5, 'timestamp': ts}
+
+
+def test_unknown_formats_fall_back_to_json():
+    assert resolve_format(None) == 'json'
+    assert resolve_format('XML') == 'json'
+    assert resolve_format('Compact') == 'compact'
+    assert resolve_format('msgpack') == 'msgpack'
+
+
+def test_timestamps_become_epoch_milliseconds():
+    assert to_epoch_ms(1_700_000_000) == 1_700_000_000_000
+    assert to_epoch_ms(1_700_000_000_123) == 1_700_000_000_123
+    assert to_epoch_ms('not a date') is None
+    assert to_epoch_ms(None) is None
+
+
+def test_first_frame_is_full_then_only_changed_fields():
+    encoder = DeltaEncoder()
+    assert encoder.frame(prices=[price(100.0)]) == {
+        'p': [{'s': 'BTCUSDT', 'p': 100.0, 'ch': 1.5, 't': 1_700_000_000_000}]
+    }
+    assert encoder.frame(prices=[price(100.0)]) is None
+    assert encoder.frame(prices=[price(101.0)]) == {'p': [{'s': 'BTCUSDT', 'p': 101.0}]}
+
+
+def test_reset_sends_a_keyframe_again():
+    encoder = DeltaEncoder()
+    encoder.frame(prices=[price(100.0)])
+    encoder.reset()
+    assert encoder.frame(prices=[price(100.0)])['p'][0]['ch'] == 1.5
+
+
+def test_records_are_keyed_per_symbol_and_timeframe():
+    encoder = DeltaEncoder()
+    candle = {'symbol': 'BTCUSDT', 'timeframe': '1m', 'timestamp': 60, 'open': 1, 'high': 2, 'low': 1, 'close': 2}
+    encoder.frame(candles=[candle])
+    frame = encoder.frame(candles=[{**candle, 'timeframe': '5m'}, {**candle, 'close': 3}])
+    assert frame['c'][0]['o'] == 1  # timeframe ใหม่ได้ keyframe
+    assert frame['c'][1] == {'s': 'BTCUSDT', 'f': '1m', 'c': 3}
+
+
+def test_msgpack_frames_round_trip():
+    encoder = DeltaEncoder('msgpack')
+    frame = encoder.frame(positions=[{'position_id': 7, 'symbol': 'BTCUSDT', 'pnl_percentage': 2.5}])
+    assert msgpack.unpackb(encoder.encode(frame), raw=False) == frame